@@ -0,0 +1,101 @@
+"""
+Accuracy and latency of the offline captcha solver.
+
+Images in --corpus are labelled by their file name, e.g. ``A2KM_0001.png``.
+Without a corpus, synthetic THSR-like captchas are generated.
+
+Usage: python -m benchmarks.captcha_solver [--corpus DIR] [--save MODEL_PATH]
+"""
+
+from typing import List, Tuple
+import argparse
+import os
+import random
+import statistics
+import time
+
+from PIL import Image, ImageDraw, ImageFilter, ImageFont
+from rich.console import Console
+from rich.table import Table
+
+from thsr_helper.booking.captcha import CaptchaModel
+from thsr_helper.booking.constants import CAPTCHA_CHARS, CAPTCHA_LENGTH
+
+Sample = Tuple[Image.Image, str]
+
+
+def synthetic_captcha(rng: random.Random, font: ImageFont.ImageFont) -> Sample:
+    code = "".join(rng.choice(CAPTCHA_CHARS) for _ in range(CAPTCHA_LENGTH))
+    image = Image.new("L", (140, 48), color=rng.randint(200, 255))
+    draw = ImageDraw.Draw(image)
+    for _ in range(180):
+        xy = (rng.randrange(140), rng.randrange(48))
+        draw.point(xy, fill=rng.randint(0, 160))
+    for idx, char in enumerate(code):
+        x = 14 + idx * 29 + rng.randint(-3, 3)
+        y = 6 + rng.randint(-3, 3)
+        draw.text((x, y), char, fill=rng.randint(0, 60), font=font)
+    top = rng.randint(-20, 10)
+    draw.arc((-10, top, 150, top + 70), 200, 340, fill=30, width=2)
+    return image.filter(ImageFilter.SMOOTH), code
+
+
+def load_corpus(path: str) -> List[Sample]:
+    samples = []
+    for file_name in sorted(os.listdir(path)):
+        label = os.path.splitext(file_name)[0].split("_")[0].upper()
+        with Image.open(os.path.join(path, file_name)) as image:
+            samples.append((image.copy(), label))
+    return samples
+
+
+def run(corpus: str | None, size: int, save: str | None) -> None:
+    if corpus:
+        samples = load_corpus(corpus)
+    else:
+        rng = random.Random(0)
+        font = ImageFont.load_default(size=30)
+        samples = [synthetic_captcha(rng, font) for _ in range(size)]
+    split = int(len(samples) * 0.8)
+    train, test = samples[:split], samples[split:]
+
+    started = time.perf_counter()
+    model = CaptchaModel.train(train)
+    train_seconds = time.perf_counter() - started
+
+    latencies, correct, correct_chars, confidences = [], 0, 0, []
+    for image, label in test:
+        started = time.perf_counter()
+        result = model.predict(image)
+        latencies.append((time.perf_counter() - started) * 1000)
+        correct += result.code == label
+        correct_chars += sum(a == b for a, b in zip(result.code, label))
+        confidences.append(result.confidence)
+
+    table = Table(title="Captcha solver", header_style="bold dark_magenta")
+    table.add_column("metric")
+    table.add_column("value", justify="right")
+    table.add_row("train / test images", f"{len(train)} / {len(test)}")
+    table.add_row("train time (s)", f"{train_seconds:.2f}")
+    table.add_row("code accuracy", f"{correct / len(test):.1%}")
+    table.add_row(
+        "char accuracy", f"{correct_chars / (len(test) * CAPTCHA_LENGTH):.1%}"
+    )
+    table.add_row("mean confidence", f"{statistics.mean(confidences):.2f}")
+    table.add_row("latency mean (ms)", f"{statistics.mean(latencies):.2f}")
+    table.add_row(
+        "latency p95 (ms)", f"{statistics.quantiles(latencies, n=20)[-1]:.2f}"
+    )
+    Console().print(table)
+
+    if save:
+        model.save(save)
+
+
+if __name__ == "__main__":
+    arg_parser = argparse.ArgumentParser(description=__doc__)
+    arg_parser.add_argument("--corpus", help="Directory of labelled captcha images")
+    arg_parser.add_argument("--size", type=int, default=500)
+    arg_parser.add_argument("--save", help="Save the trained model to this path")
+    args = arg_parser.parse_args()
+    run(args.corpus, args.size, args.save)
@@ -0,0 +1,134 @@
+"""
+Cost of building the S1/S2/S3 form params for one attempt.
+
+The pydantic path builds and validates the model, does the JSON round trip
+the flows used to do and lets requests encode the dict; the template path
+only encodes the dynamic fields into a query string. Both give the same URL.
+
+Usage: python -m benchmarks.form_encoding [--rounds 2000]
+"""
+
+from typing import Callable, Tuple
+import argparse
+import json
+import statistics
+import timeit
+import warnings
+
+from requests.models import RequestEncodingMixin
+from rich.console import Console
+from rich.table import Table
+
+from thsr_helper.booking.constants import STATION_MAP, PassengerType
+from thsr_helper.booking.forms import (
+    booking_form,
+    convert_ticket_num,
+    ticket_form,
+    train_form,
+)
+from thsr_helper.booking.schema import (
+    BookingModel,
+    ConfirmTicketModel,
+    ConfirmTrainModel,
+)
+from thsr_helper.config.settings import ConditionSettings, UserSettings
+
+CONDITIONS = ConditionSettings(
+    adult_ticket_num=2,
+    child_ticket_num=1,
+    date="2024-03-20",
+    thsr_time="600A",
+    start_station="Taipei",
+    dest_station="Zuouing",
+)
+USER = UserSettings(personal_id="A123456789", phone_number="0912345678")
+
+
+def pydantic_booking() -> str:
+    model = BookingModel(
+        start_station=STATION_MAP.get(CONDITIONS.start_station),
+        dest_station=STATION_MAP.get(CONDITIONS.dest_station),
+        outbound_time=CONDITIONS.thsr_time,
+        outbound_date=CONDITIONS.date,
+        **{
+            f"{pass_type.value}_ticket_num": convert_ticket_num(
+                getattr(CONDITIONS, f"{pass_type.value}_ticket_num") or 0, pass_type
+            )
+            for pass_type in PassengerType
+        },
+        seat_prefer="radio17",
+        types_of_trip=0,
+        search_by="radio31",
+        train_requirement=int(CONDITIONS.train_requirement) or 0,
+        security_code="A2KM",
+    )
+    return RequestEncodingMixin._encode_params(json.loads(model.json(by_alias=True)))
+
+
+def pydantic_train() -> str:
+    model = ConfirmTrainModel(selected_train="radio18")
+    return RequestEncodingMixin._encode_params(json.loads(model.json(by_alias=True)))
+
+
+def pydantic_ticket() -> str:
+    model = ConfirmTicketModel(
+        personal_id=USER.personal_id,
+        phone_num=USER.phone_number,
+        member_radio="radio56",
+    )
+    return RequestEncodingMixin._encode_params(json.loads(model.json(by_alias=True)))
+
+
+FORMS: list[Tuple[str, Callable[[], str], Callable[[], str]]] = [
+    (
+        "S1 booking",
+        pydantic_booking,
+        lambda: booking_form(CONDITIONS).render(
+            seat_prefer="radio17",
+            types_of_trip=0,
+            search_by="radio31",
+            security_code="A2KM",
+        ),
+    ),
+    (
+        "S2 train",
+        pydantic_train,
+        lambda: train_form().render(selected_train="radio18"),
+    ),
+    (
+        "S3 ticket",
+        pydantic_ticket,
+        lambda: ticket_form(USER).render(member_radio="radio56"),
+    ),
+]
+
+
+def median_us(func: Callable[[], str], rounds: int) -> float:
+    timings = timeit.repeat(func, number=1, repeat=rounds)
+    return statistics.median(timings) * 1_000_000
+
+
+def run(rounds: int) -> None:
+    table = Table(title="Form params (median µs)", header_style="bold dark_magenta")
+    table.add_column("form")
+    for col in ("pydantic", "template", "speedup"):
+        table.add_column(col, justify="right")
+
+    with warnings.catch_warnings():
+        # BaseModel.json is deprecated in pydantic v2.
+        warnings.simplefilter("ignore", DeprecationWarning)
+        for name, pydantic_path, template_path in FORMS:
+            if pydantic_path() != template_path():
+                raise SystemExit(f"{name}: the two paths encode differently")
+            old, new = (
+                median_us(pydantic_path, rounds),
+                median_us(template_path, rounds),
+            )
+            table.add_row(name, f"{old:.1f}", f"{new:.1f}", f"{old / new:.1f}x")
+    Console().print(table)
+
+
+if __name__ == "__main__":
+    arg_parser = argparse.ArgumentParser(description=__doc__)
+    arg_parser.add_argument("--rounds", type=int, default=2000)
+    run(arg_parser.parse_args().rounds)
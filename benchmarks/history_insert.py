@@ -0,0 +1,88 @@
+"""
+Cost of TinyDBManager.save as the history grows.
+
+A duplicate is caught by the fingerprint index without loading the history,
+so its cost stays flat; the full scan it replaced is shown for reference.
+A new record still makes TinyDB rewrite history.json, so the SQLite backend
+is shown next to it.
+
+Usage: python -m benchmarks.history_insert [--sizes 100 1000 10000 100000]
+"""
+
+from contextlib import redirect_stdout
+from typing import List
+import argparse
+import os
+import random
+import statistics
+import tempfile
+import timeit
+
+from rich.console import Console
+from rich.table import Table
+from tinydb import Query, TinyDB
+
+from benchmarks.suite import make_record
+from thsr_helper.booking.models import SQLiteManager, TinyDBManager
+from thsr_helper.booking.schema import Record
+
+
+def scan_for_duplicate(db_path: str, record: Record) -> bool:
+    """The duplicate check TinyDBManager.save did before the index."""
+    data = record._asdict()
+    with TinyDB(db_path, sort_keys=True, indent=4) as db:
+        hist = db.search(Query().personal_id == record.personal_id)
+        return any(all(h[k] == data[k] for k in data) for h in hist)
+
+
+def median_ms(func, rounds: int) -> float:
+    timings = timeit.repeat(func, number=1, repeat=rounds)
+    return statistics.median(timings) * 1000
+
+
+def run(sizes: List[int]) -> None:
+    table = Table(title="History save (median ms)", header_style="bold dark_magenta")
+    for col in (
+        "records",
+        "scan check",
+        "duplicate save",
+        "new save (tinydb)",
+        "new save (sqlite)",
+    ):
+        table.add_column(col, justify="right")
+
+    rng = random.Random(0)
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        for size in sizes:
+            db_path = os.path.join(tmp_dir, f"history_{size}.json")
+            records = [make_record(i, rng) for i in range(size)]
+            with TinyDB(db_path, sort_keys=True, indent=4) as db:
+                db.insert_multiple(record._asdict() for record in records)
+            tinydb = TinyDBManager(db_path)
+            with open(os.devnull, mode="wt") as devnull, redirect_stdout(devnull):
+                sqlite = SQLiteManager(
+                    os.path.join(tmp_dir, f"history_{size}.sqlite3"), db_path
+                )
+            # Build the fingerprint index up front, as a first save would.
+            with tinydb.index.connect():
+                pass
+
+            rounds = 20 if size <= 10000 else 3
+            duplicate = records[size // 2]
+            new_records = iter([make_record(size + i, rng) for i in range(2 * rounds)])
+            timings = [
+                median_ms(lambda: scan_for_duplicate(db_path, duplicate), rounds),
+                median_ms(lambda: tinydb.save(duplicate), rounds),
+                median_ms(lambda: tinydb.save(next(new_records)), rounds),
+                median_ms(lambda: sqlite.save(next(new_records)), rounds),
+            ]
+            table.add_row(str(size), *(f"{ms:.2f}" for ms in timings))
+    Console().print(table)
+
+
+if __name__ == "__main__":
+    arg_parser = argparse.ArgumentParser(description=__doc__)
+    arg_parser.add_argument(
+        "--sizes", type=int, nargs="+", default=[100, 1000, 10000, 100000]
+    )
+    run(arg_parser.parse_args().sizes)
@@ -0,0 +1,109 @@
+"""
+Start-up budget of the CLI, from `python -X importtime`.
+
+Each command runs in a fresh interpreter; the import time is the sum of the
+top-level imports, interpreter start-up included. A command fails when its
+median is over budget or it loads one of the heavy modules it doesn't use.
+Exits with status 1 on a failure, so it can gate a change.
+
+Usage: python -m benchmarks.import_budget [--runs 5] [--scale 1.5]
+"""
+
+from collections import namedtuple
+from typing import List, Set, Tuple
+import argparse
+import os
+import re
+import statistics
+import subprocess
+import sys
+import tempfile
+
+from rich.console import Console
+from rich.table import Table
+
+Budget = namedtuple("Budget", "args budget_ms forbidden")
+
+# Imported by the booking flow and the ticket history, none of which the light
+# commands need.
+HEAVY_MODULES = (
+    "bs4",
+    "PIL",
+    "numpy",
+    "pydantic",
+    "requests",
+    "tinydb",
+    "sqlite3",
+)
+
+# About 1.5x a typical run; loading the booking flow alone takes ~400 ms more.
+BUDGETS = [
+    Budget(["--version"], 350, HEAVY_MODULES),
+    Budget(["--help"], 350, HEAVY_MODULES),
+    Budget(["config", "ls"], 350, HEAVY_MODULES),
+    Budget(["booking", "--help"], 350, HEAVY_MODULES),
+]
+
+# "import time: self [us] | cumulative | imported package"
+IMPORT_LINE = re.compile(r"import time:\s+\d+ \|\s+(\d+) \|( +)(\S+)")
+
+
+def import_time(args: List[str], env: dict[str, str]) -> Tuple[float, Set[str]]:
+    """Total import time in ms and the modules imported by one run."""
+    result = subprocess.run(
+        [sys.executable, "-X", "importtime", "-m", "thsr_helper", *args],
+        capture_output=True,
+        text=True,
+        env=env,
+    )
+    total_us, modules = 0, set()
+    for line in result.stderr.splitlines():
+        if matched := IMPORT_LINE.match(line):
+            cumulative, indent, module = matched.groups()
+            modules.add(module)
+            if len(indent) == 1:
+                total_us += int(cumulative)
+    return total_us / 1000, modules
+
+
+def run(runs: int, scale: float) -> bool:
+    table = Table(title="CLI import time", header_style="bold dark_magenta")
+    table.add_column("command")
+    for col in ("median ms", "budget ms"):
+        table.add_column(col, justify="right")
+    table.add_column("unexpected imports")
+
+    passed = True
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        # `config ls` creates a default config when there is none.
+        env = {**os.environ, "CONFIG_FILE_PATH": os.path.join(tmp_dir, "config.toml")}
+        for budget in BUDGETS:
+            timings, loaded = [], set()
+            for _ in range(runs):
+                elapsed, modules = import_time(budget.args, env)
+                timings.append(elapsed)
+                loaded |= modules
+            median = statistics.median(timings)
+            limit = budget.budget_ms * scale
+            unexpected = sorted(set(budget.forbidden) & loaded)
+            ok = median <= limit and not unexpected
+            passed &= ok
+            color = "green" if ok else "red"
+            table.add_row(
+                " ".join(budget.args),
+                f"[{color}]{median:.1f}[/]",
+                f"{limit:.0f}",
+                ", ".join(unexpected),
+            )
+    Console().print(table)
+    return passed
+
+
+if __name__ == "__main__":
+    arg_parser = argparse.ArgumentParser(description=__doc__)
+    arg_parser.add_argument("--runs", type=int, default=5)
+    arg_parser.add_argument(
+        "--scale", type=float, default=1.0, help="Multiply the budgets, for slow hosts"
+    )
+    args = arg_parser.parse_args()
+    sys.exit(0 if run(args.runs, args.scale) else 1)
@@ -0,0 +1,120 @@
+"""
+Throughput and peak memory of `config import` over generated job files.
+
+Rows are validated and written one at a time, so the peak memory should
+stay flat as the file grows. The time is measured without tracemalloc,
+the peak memory in a second run with it. A share of the rows is made
+invalid, to include the cost of reporting them.
+
+Usage: python -m benchmarks.job_import [--sizes 1000 10000 100000] [--bad 0.01]
+"""
+
+from typing import List
+import argparse
+import csv
+import json
+import os
+import random
+import tempfile
+import time
+import tracemalloc
+
+from rich.console import Console
+from rich.table import Table
+
+from thsr_helper.booking.constants import ImportFormat, Stations, ThsrTime
+from thsr_helper.config.importer import import_jobs
+
+COLUMNS = (
+    "name",
+    "priority",
+    "personal_id",
+    "phone_number",
+    "email",
+    "start_station",
+    "dest_station",
+    "date",
+    "thsr_time",
+    "time_range",
+    "adult_ticket_num",
+)
+
+
+def make_row(idx: int, rng: random.Random, bad: bool) -> dict[str, str]:
+    start, dest = rng.sample([station.value for station in Stations], 2)
+    start_hour = rng.randrange(6, 20)
+    row = {
+        "name": f"job-{idx}",
+        "priority": str(rng.randrange(10)),
+        "personal_id": f"{rng.choice('ABCDEFGH')}{rng.randrange(10**9):09d}",
+        "phone_number": f"09{rng.randrange(10**8):08d}",
+        "email": f"user{idx}@example.com",
+        "start_station": start,
+        "dest_station": dest,
+        "date": f"2024-{rng.randrange(1, 13):02d}-{rng.randrange(1, 29):02d}",
+        "thsr_time": rng.choice(list(ThsrTime)).value,
+        "time_range": f"{start_hour}-{start_hour + rng.randrange(1, 5)}",
+        "adult_ticket_num": str(rng.randrange(1, 4)),
+    }
+    if bad:
+        row[rng.choice(("personal_id", "phone_number", "date", "dest_station"))] = "?"
+    return row
+
+
+def write_rows(path: str, input_format: ImportFormat, size: int, bad: float) -> None:
+    rng = random.Random(0)
+    with open(path, mode="wt", encoding="utf-8", newline="") as fp:
+        if input_format == ImportFormat.CSV:
+            writer = csv.writer(fp)
+            writer.writerow(COLUMNS)
+        for idx in range(size):
+            row = make_row(idx, rng, rng.random() < bad)
+            if input_format == ImportFormat.CSV:
+                writer.writerow(row.values())
+            else:
+                fp.write(json.dumps(row) + "\n")
+
+
+def run(sizes: List[int], bad: float) -> None:
+    table = Table(title="Job import", header_style="bold dark_magenta")
+    for col in ("format", "rows", "bad rows", "seconds", "rows/s", "peak KB"):
+        table.add_column(col, justify="right")
+
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        store = os.path.join(tmp_dir, "jobs.jsonl")
+        for input_format in ImportFormat:
+            for size in sizes:
+                path = os.path.join(tmp_dir, f"jobs_{size}.{input_format.value}")
+                write_rows(path, input_format, size, bad)
+                errors = []
+
+                started = time.perf_counter()
+                summary = import_jobs(path, store, input_format, {}, errors.append)
+                elapsed = time.perf_counter() - started
+
+                tracemalloc.start()
+                import_jobs(path, store, input_format, {}, lambda error: None)
+                peak = tracemalloc.get_traced_memory()[1]
+                tracemalloc.stop()
+
+                table.add_row(
+                    input_format.value,
+                    str(summary.rows),
+                    str(summary.errors),
+                    f"{elapsed:.2f}",
+                    f"{summary.rows / elapsed:,.0f}",
+                    f"{peak / 1024:,.0f}",
+                )
+    Console().print(table)
+
+
+if __name__ == "__main__":
+    arg_parser = argparse.ArgumentParser(description=__doc__)
+    arg_parser.add_argument(
+        "--sizes", type=int, nargs="+", default=[1000, 10000, 100000]
+    )
+    arg_parser.add_argument(
+        "--bad", type=float, default=0.01, help="Share of invalid rows"
+    )
+    args = arg_parser.parse_args()
+    run(args.sizes, args.bad)
@@ -0,0 +1,71 @@
+"""
+Compare full and partial (strained) parsing of the booking pages.
+
+Usage: python -m benchmarks.partial_parse [--rounds 200]
+"""
+
+import argparse
+import os
+import timeit
+
+from rich.console import Console
+from rich.table import Table
+
+from thsr_helper.booking.parser import (
+    BaseParser,
+    ConfirmTicketParser,
+    ConfirmTrainParser,
+    InitPageParser,
+    get_parser_backend,
+)
+
+PAGES_DIR = os.path.join(os.path.dirname(__file__), "fixtures", "pages")
+
+CASES = [
+    ("S1 booking page", "s1_booking.html", InitPageParser),
+    ("S2 train list", "s2_trains.html", ConfirmTrainParser),
+    ("S2 sold out", "s2_sold_out.html", ConfirmTrainParser),
+    ("S3 ticket form", "s3_ticket.html", ConfirmTicketParser),
+]
+
+
+def load_page(file_name: str) -> bytes:
+    with open(os.path.join(PAGES_DIR, file_name), mode="rb") as fp:
+        return fp.read()
+
+
+def tree_size(content: bytes, parser: type[BaseParser], partial: bool) -> int:
+    return len(parser.html_to_soup(content, partial=partial).find_all(True))
+
+
+def run(rounds: int) -> None:
+    table = Table(
+        title=f"Partial parsing ({get_parser_backend().value}, {rounds} rounds)",
+        header_style="bold dark_magenta",
+    )
+    for col in ("page", "bytes", "tags full", "tags partial", "ms full", "ms partial"):
+        table.add_column(col, justify="right")
+
+    for label, file_name, parser in CASES:
+        content = load_page(file_name)
+        timings = {}
+        for partial in (False, True):
+            seconds = timeit.timeit(
+                lambda: parser.html_to_soup(content, partial=partial), number=rounds
+            )
+            timings[partial] = seconds / rounds * 1000
+        table.add_row(
+            label,
+            str(len(content)),
+            str(tree_size(content, parser, partial=False)),
+            str(tree_size(content, parser, partial=True)),
+            f"{timings[False]:.2f}",
+            f"{timings[True]:.2f}",
+        )
+    Console().print(table)
+
+
+if __name__ == "__main__":
+    arg_parser = argparse.ArgumentParser(description=__doc__)
+    arg_parser.add_argument("--rounds", type=int, default=200)
+    run(arg_parser.parse_args().rounds)
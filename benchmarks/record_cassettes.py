@@ -0,0 +1,80 @@
+"""
+Record the replay cassettes in fixtures/cassettes from the stand-in server.
+
+The base URL has to point at the stand-in so the recorded requests go there.
+
+Usage: THSR_BASE_URL=http://127.0.0.1:8765 python -m benchmarks.record_cassettes
+"""
+
+from urllib.parse import urlsplit
+import os
+import threading
+
+from benchmarks.standin_server import SCENARIOS, create_server
+from thsr_helper.booking.booking_flow import (
+    ConfirmTicketFlow,
+    ConfirmTrainFlow,
+    InitPageFlow,
+)
+from thsr_helper.booking.requests import HTTPRequest
+from thsr_helper.booking.transport import Cassette, RecordingAdapter
+from thsr_helper.config.settings import ConditionSettings, UserSettings
+from thsr_helper.settings import settings
+
+CASSETTES_DIR = os.path.join(os.path.dirname(__file__), "fixtures", "cassettes")
+SAMPLE_CONFIG = {
+    "user": {"personal_id": "A123456789", "phone_number": "0912345678"},
+    "conditions": {
+        "adult_ticket_num": 1,
+        "adult_ids": "A123456789",
+        "date": "2024-03-20",
+        "thsr_time": "600A",
+        "time_range": [6, 12],
+        "start_station": "Taipei",
+        "dest_station": "Zuouing",
+        "is_manual": False,
+    },
+}
+
+
+def record(scenario: str) -> Cassette:
+    cassette = Cassette(os.path.join(CASSETTES_DIR, f"{scenario}.json"))
+    client = HTTPRequest(transport=RecordingAdapter(cassette))
+    conditions = ConditionSettings(**SAMPLE_CONFIG["conditions"])
+    user_settings = UserSettings(**SAMPLE_CONFIG["user"])
+
+    # Same steps as BookingFlow.run, without saving the ticket.
+    train_list_page, passenger_info = InitPageFlow(client, conditions).run()
+    if train_list_page.errors:
+        return cassette
+    ticket_form_page, train = ConfirmTrainFlow(
+        client, conditions, train_list_page
+    ).run()
+    if not train or ticket_form_page.errors:
+        return cassette
+    ConfirmTicketFlow(
+        client, conditions, user_settings, ticket_form_page, passenger_info, train
+    ).run()
+    return cassette
+
+
+def run() -> None:
+    base_url = urlsplit(settings.base_url)
+    if base_url.hostname != "127.0.0.1":
+        raise SystemExit(
+            "Set THSR_BASE_URL to the stand-in, e.g. http://127.0.0.1:8765"
+        )
+    for scenario in SCENARIOS:
+        server = create_server(base_url.port, scenario=scenario)
+        thread = threading.Thread(target=server.serve_forever, daemon=True)
+        thread.start()
+        try:
+            cassette = record(scenario)
+        finally:
+            server.shutdown()
+            server.server_close()
+        print(f"{cassette.path}: {len(cassette.interactions)} interactions")
+
+
+if __name__ == "__main__":
+    run()
@@ -0,0 +1,122 @@
+"""
+A local stand-in for the THSR booking site, serving the fixture pages.
+
+Point the CLI at it with THSR_BASE_URL=http://127.0.0.1:8765.
+
+Usage: python -m benchmarks.standin_server [--port 8765] [--clock-offset 2.5]
+                                           [--open-at 2024-03-01T00:00:00+08:00]
+                                           [--scenario sold_out]
+"""
+
+from datetime import datetime
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import unquote
+import argparse
+import io
+import os
+import random
+import time
+import uuid
+
+from PIL import ImageFont
+
+from benchmarks.captcha_solver import synthetic_captcha
+
+PAGES_DIR = os.path.join(os.path.dirname(__file__), "fixtures", "pages")
+# The page answering the S1, S2 and S3 submits in each scenario.
+SCENARIOS = {
+    "booking": ("s2_trains.html", "s3_ticket.html", "result.html"),
+    "early_bird": ("s2_early_bird.html", "s3_ticket.html", "result.html"),
+    "sold_out": ("s2_sold_out.html", "s3_ticket.html", "result.html"),
+    "wrong_captcha": ("s1_wrong_captcha.html", "s3_ticket.html", "result.html"),
+    "busy": ("s2_trains.html", "s3_busy.html", "result.html"),
+}
+
+
+def load_page(file_name: str) -> bytes:
+    with open(os.path.join(PAGES_DIR, file_name), mode="rb") as fp:
+        return fp.read()
+
+
+class StandInHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+    # Seconds the stand-in clock is ahead of the local one.
+    clock_offset: float = 0.0
+    # Server time (epoch) before which every search is sold out.
+    open_at: float = 0.0
+    latency: float = 0.0
+    scenario: str = "booking"
+
+    def date_time_string(self, timestamp=None) -> str:
+        return super().date_time_string(time.time() + self.clock_offset)
+
+    def log_message(self, format, *args) -> None:
+        return
+
+    def send_body(self, body: bytes, content_type: str = "text/html") -> None:
+        time.sleep(self.latency)
+        self.send_response(200)
+        self.send_header("Content-Type", content_type)
+        self.send_header("Content-Length", str(len(body)))
+        if "JSESSIONID" not in self.headers.get("Cookie", ""):
+            self.send_header("Set-Cookie", f"JSESSIONID={uuid.uuid4().hex}; Path=/")
+        self.end_headers()
+        if self.command != "HEAD":
+            self.wfile.write(body)
+
+    def do_HEAD(self) -> None:
+        self.send_body(b"")
+
+    def do_GET(self) -> None:
+        if "homeCaptcha" in self.path:
+            image, _ = synthetic_captcha(random.Random(), ImageFont.load_default(30))
+            buf = io.BytesIO()
+            image.save(buf, format="JPEG")
+            return self.send_body(buf.getvalue(), "image/jpeg")
+        self.send_body(load_page("s1_booking.html"))
+
+    def do_POST(self) -> None:
+        if length := int(self.headers.get("Content-Length") or 0):
+            self.rfile.read(length)
+        path = unquote(self.path)
+        s1_page, s2_page, s3_page = SCENARIOS[self.scenario]
+        if "BookingS1Form" in path:
+            opened = time.time() + self.clock_offset >= self.open_at
+            page = s1_page if opened else "s2_sold_out.html"
+        elif "BookingS2Form" in path:
+            page = s2_page
+        else:
+            page = s3_page
+        self.send_body(load_page(page))
+
+
+def create_server(
+    port: int,
+    clock_offset: float = 0.0,
+    open_at: float = 0.0,
+    latency: float = 0.0,
+    scenario: str = "booking",
+) -> ThreadingHTTPServer:
+    StandInHandler.clock_offset = clock_offset
+    StandInHandler.open_at = open_at
+    StandInHandler.latency = latency
+    StandInHandler.scenario = scenario
+    return ThreadingHTTPServer(("127.0.0.1", port), StandInHandler)
+
+
+if __name__ == "__main__":
+    arg_parser = argparse.ArgumentParser(description=__doc__)
+    arg_parser.add_argument("--port", type=int, default=8765)
+    arg_parser.add_argument("--clock-offset", type=float, default=0.0)
+    arg_parser.add_argument("--latency", type=float, default=0.0)
+    arg_parser.add_argument("--scenario", choices=SCENARIOS, default="booking")
+    arg_parser.add_argument(
+        "--open-at", type=datetime.fromisoformat, help="Sold out before this time"
+    )
+    args = arg_parser.parse_args()
+    open_at = args.open_at.timestamp() if args.open_at else 0.0
+    server = create_server(
+        args.port, args.clock_offset, open_at, args.latency, args.scenario
+    )
+    print(f"Serving on http://127.0.0.1:{args.port}")
+    server.serve_forever()
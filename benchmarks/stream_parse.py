@@ -0,0 +1,164 @@
+"""
+Compare reading the whole page with streaming it and stopping once the
+parser has what it needs, over replayed fixture pages at a simulated
+bandwidth. The time is from sending the request to the parsed page.
+
+Usage: python -m benchmarks.stream_parse [--bandwidth 256] [--rounds 5]
+"""
+
+from collections import namedtuple
+from typing import Any
+import argparse
+import os
+import statistics
+import time
+
+from rich.console import Console
+from rich.table import Table
+
+from thsr_helper.booking.constants import HTTPConfig
+from thsr_helper.booking.parser import (
+    BookingFlowParser,
+    ConfirmTicketParser,
+    ConfirmTrainParser,
+    InitPageParser,
+    ParsedPage,
+)
+from thsr_helper.booking.rate_limit import use_rate_limiter
+from thsr_helper.booking.requests import HTTPRequest
+from thsr_helper.booking.transport import Cassette, ReplayAdapter
+
+PAGES_DIR = os.path.join(os.path.dirname(__file__), "fixtures", "pages")
+
+Case = namedtuple("Case", "label file_name method url parser send read")
+
+CASES = [
+    Case(
+        "S1 booking page",
+        "s1_booking.html",
+        "GET",
+        HTTPConfig.BOOKING_PAGE_URL,
+        InitPageParser,
+        lambda client: client.booking_page(),
+        lambda page: InitPageParser.parse_captcha_img_url(page.soup),
+    ),
+    Case(
+        "S2 train list",
+        "s2_trains.html",
+        "POST",
+        HTTPConfig.SUBMIT_FORM_URL.format("bench"),
+        ConfirmTrainParser,
+        lambda client: client.submit_booking_form(""),
+        lambda page: ConfirmTrainParser.parse_trains(page.soup),
+    ),
+    Case(
+        "S2 sold out",
+        "s2_sold_out.html",
+        "POST",
+        HTTPConfig.SUBMIT_FORM_URL.format("bench"),
+        ConfirmTrainParser,
+        lambda client: client.submit_booking_form(""),
+        lambda page: page.errors,
+    ),
+    Case(
+        "S3 ticket form",
+        "s3_ticket.html",
+        "POST",
+        HTTPConfig.CONFIRM_TRAIN_URL,
+        ConfirmTicketParser,
+        lambda client: client.submit_train(""),
+        lambda page: ConfirmTicketParser.parse_member_radio(page.soup),
+    ),
+    Case(
+        "S3 busy",
+        "s3_busy.html",
+        "POST",
+        HTTPConfig.CONFIRM_TRAIN_URL,
+        ConfirmTicketParser,
+        lambda client: client.submit_train(""),
+        lambda page: page.errors,
+    ),
+    Case(
+        "Booking result",
+        "result.html",
+        "POST",
+        HTTPConfig.CONFIRM_TICKET_URL,
+        BookingFlowParser,
+        lambda client: client.submit_ticket(""),
+        lambda page: BookingFlowParser.parse_booking_result(page.soup),
+    ),
+]
+
+
+def load_page(file_name: str) -> str:
+    with open(os.path.join(PAGES_DIR, file_name), mode="rt", encoding="utf-8") as fp:
+        return fp.read()
+
+
+def replay_client(case: Case, bandwidth: float, stream: bool) -> HTTPRequest:
+    cassette = Cassette(
+        None,
+        [
+            {
+                "request": {"method": case.method, "url": case.url},
+                "response": {
+                    "status": 200,
+                    "headers": [["Content-Type", "text/html;charset=UTF-8"]],
+                    "body": load_page(case.file_name),
+                },
+            }
+        ],
+    )
+    client = HTTPRequest(transport=ReplayAdapter(cassette, bandwidth=bandwidth))
+    client.session.cookies.set("JSESSIONID", "bench")
+    client.stream = stream
+    return client
+
+
+def fetch(client: HTTPRequest, case: Case) -> tuple[float, int, Any]:
+    """Seconds to the parsed page, bytes read and what the flow reads of it."""
+    started = time.perf_counter()
+    content = case.send(client).content
+    page = ParsedPage(content, case.parser)
+    return time.perf_counter() - started, len(content), case.read(page)
+
+
+def run(bandwidth: float, rounds: int) -> None:
+    use_rate_limiter(None)
+    table = Table(
+        title=f"Streamed parsing at {bandwidth:g} KB/s ({rounds} rounds)",
+        header_style="bold dark_magenta",
+    )
+    for col in ("page", "bytes full", "bytes streamed", "ms full", "ms streamed"):
+        table.add_column(col, justify="right")
+    table.add_column("same result")
+
+    for case in CASES:
+        results = {}
+        for stream in (False, True):
+            client = replay_client(case, bandwidth * 1024, stream)
+            runs = [fetch(client, case) for _ in range(rounds)]
+            results[stream] = (
+                statistics.median(run[0] for run in runs) * 1000,
+                runs[0][1],
+                runs[0][2],
+            )
+        table.add_row(
+            case.label,
+            str(results[False][1]),
+            str(results[True][1]),
+            f"{results[False][0]:.1f}",
+            f"{results[True][0]:.1f}",
+            "yes" if results[False][2] == results[True][2] else "[red]no[/]",
+        )
+    Console().print(table)
+
+
+if __name__ == "__main__":
+    arg_parser = argparse.ArgumentParser(description=__doc__)
+    arg_parser.add_argument(
+        "--bandwidth", type=float, default=256, help="KB per second"
+    )
+    arg_parser.add_argument("--rounds", type=int, default=5)
+    args = arg_parser.parse_args()
+    run(args.bandwidth, args.rounds)
@@ -0,0 +1,298 @@
+"""
+Micro-benchmarks of the booking hot paths, saved as JSON so that runs of
+different versions can be compared.
+
+Covers the parser methods on the fixture pages, the form model serialization
+and the compiled form templates, save/get_history of both history backends at several sizes and the CLI cold
+start.
+
+Usage: python -m benchmarks.suite [--output results.json] [--compare old.json]
+                                  [--sizes 10 10000 100000] [--only history]
+"""
+
+from collections import namedtuple
+from contextlib import redirect_stdout
+from datetime import datetime, timezone
+from typing import Callable, Iterator, List
+import argparse
+import json
+import os
+import platform
+import random
+import statistics
+import subprocess
+import sys
+import tempfile
+import timeit
+import warnings
+
+from rich.console import Console
+from rich.markup import escape
+from rich.table import Table
+from tinydb import TinyDB
+
+from benchmarks.form_encoding import FORMS
+from thsr_helper.booking.constants import OutputFormat
+from thsr_helper.booking.models import SQLiteManager, TinyDBManager
+from thsr_helper.booking.parser import (
+    BookingFlowParser,
+    ConfirmTicketParser,
+    ConfirmTrainParser,
+    InitPageParser,
+    ParsedPage,
+    get_parser_backend,
+)
+from thsr_helper.booking.schema import (
+    BookingModel,
+    ConfirmTicketModel,
+    ConfirmTrainModel,
+    Record,
+)
+
+PAGES_DIR = os.path.join(os.path.dirname(__file__), "fixtures", "pages")
+DAY = 24 * 60 * 60
+# Deltas beyond this share of the baseline are highlighted.
+THRESHOLD = 0.1
+
+Case = namedtuple("Case", "name func rounds")
+
+
+def load_page(file_name: str) -> bytes:
+    with open(os.path.join(PAGES_DIR, file_name), mode="rb") as fp:
+        return fp.read()
+
+
+def parser_cases() -> Iterator[Case]:
+    pages = [
+        ("s1_booking.html", InitPageParser),
+        ("s2_trains.html", ConfirmTrainParser),
+        ("s2_sold_out.html", ConfirmTrainParser),
+        ("s3_ticket.html", ConfirmTicketParser),
+        ("result.html", BookingFlowParser),
+    ]
+    for file_name, parser in pages:
+        content = load_page(file_name)
+        yield Case(
+            f"parser.ParsedPage[{os.path.splitext(file_name)[0]}]",
+            lambda content=content, parser=parser: ParsedPage(content, parser),
+            50,
+        )
+
+    s1 = ParsedPage(load_page("s1_booking.html"), InitPageParser).soup
+    s2 = ParsedPage(load_page("s2_trains.html"), ConfirmTrainParser).soup
+    s3 = ParsedPage(load_page("s3_ticket.html"), ConfirmTicketParser).soup
+    result = ParsedPage(load_page("result.html"), BookingFlowParser).soup
+    sold_out = BookingFlowParser.html_to_soup(load_page("s2_sold_out.html"))
+    methods = [
+        (InitPageParser.parse_captcha_img_url, s1),
+        (InitPageParser.parse_seat_prefer_value, s1),
+        (InitPageParser.parse_types_of_trip_value, s1),
+        (InitPageParser.parse_search_by, s1),
+        (ConfirmTrainParser.parse_trains, s2),
+        (ConfirmTicketParser.parse_member_radio, s3),
+        (BookingFlowParser.parse_booking_result, result),
+        (BookingFlowParser.parse_response_error, sold_out),
+    ]
+    for method, soup in methods:
+        yield Case(
+            f"parser.{method.__qualname__}",
+            lambda method=method, soup=soup: method(soup),
+            200,
+        )
+
+
+def model_cases() -> Iterator[Case]:
+    # The same round trip the flows do to build their form params.
+    models = [
+        lambda: BookingModel(
+            start_station=1,
+            dest_station=12,
+            outbound_time="600A",
+            outbound_date="2024-03-20",
+            seat_prefer="radio17",
+            types_of_trip=0,
+            search_by="radio31",
+            security_code="A2KM",
+        ),
+        lambda: ConfirmTrainModel(selected_train="radio18"),
+        lambda: ConfirmTicketModel(
+            personal_id="A123456789", phone_num="0912345678", member_radio="radio56"
+        ),
+    ]
+    for build in models:
+        yield Case(
+            f"models.{type(build()).__name__}",
+            lambda build=build: json.loads(build().json(by_alias=True)),
+            2000,
+        )
+
+
+def form_cases() -> Iterator[Case]:
+    for name, _, template_path in FORMS:
+        yield Case(f"forms.{name.replace(' ', '_')}", template_path, 2000)
+
+
+def make_record(idx: int, rng: random.Random) -> Record:
+    return Record(
+        id=f"{idx:08d}",
+        price="TWD 1,490",
+        start_station="台北",
+        dest_station="左營",
+        train_id=str(rng.choice([803, 805, 1203, 1205, 609])),
+        depart_time="06:30",
+        arrival_time="08:15",
+        date="03/20",
+        payment_deadline="2024/03/19",
+        ticket_num_info="全票 1張",
+        personal_id=f"A{rng.randrange(50):09d}",
+        date_ts=int(datetime(2024, 1, 1).timestamp()) + rng.randrange(365) * DAY,
+    )
+
+
+def history_cases(sizes: List[int], tmp_dir: str) -> Iterator[Case]:
+    rng = random.Random(0)
+    window_start = int(datetime(2024, 6, 1).timestamp())
+    query = {"start_ts": window_start, "end_ts": window_start + 7 * DAY}
+    for size in sizes:
+        db_path = os.path.join(tmp_dir, f"history_{size}.json")
+        with TinyDB(db_path, sort_keys=True, indent=4) as db:
+            db.insert_multiple(make_record(i, rng)._asdict() for i in range(size))
+        with open(os.devnull, mode="wt") as devnull, redirect_stdout(devnull):
+            managers = {
+                "tinydb": TinyDBManager(db_path),
+                "sqlite": SQLiteManager(
+                    os.path.join(tmp_dir, f"history_{size}.sqlite3"), db_path
+                ),
+            }
+        rounds = 50 if size <= 1000 else 10 if size <= 10000 else 3
+
+        for backend, manager in managers.items():
+            new_records = (make_record(size + i, rng) for i in range(1_000_000))
+
+            def get_history(manager=manager, output_format=OutputFormat.TABLE) -> None:
+                with open(os.devnull, mode="wt") as devnull, redirect_stdout(devnull):
+                    manager.get_history(query, output_format)
+
+            yield Case(
+                f"history.{backend}.save[{size}]",
+                lambda manager=manager, new_records=new_records: manager.save(
+                    next(new_records)
+                ),
+                rounds,
+            )
+            yield Case(f"history.{backend}.get_history[{size}]", get_history, rounds)
+            yield Case(
+                f"history.{backend}.export_jsonl[{size}]",
+                lambda get_history=get_history: get_history(
+                    output_format=OutputFormat.JSONL
+                ),
+                rounds,
+            )
+
+
+def cli_cases() -> Iterator[Case]:
+    yield Case(
+        "cli.cold_start",
+        lambda: subprocess.run(
+            [sys.executable, "-m", "thsr_helper", "--help"],
+            check=True,
+            capture_output=True,
+        ),
+        5,
+    )
+
+
+def measure(func: Callable[[], object], rounds: int) -> dict[str, float]:
+    func()  # Warm up caches (parser backend, strainers, pydantic validators).
+    timings = [t * 1000 for t in timeit.repeat(func, number=1, repeat=rounds)]
+    return {
+        "rounds": rounds,
+        "mean_ms": statistics.mean(timings),
+        "median_ms": statistics.median(timings),
+        "min_ms": min(timings),
+        "stdev_ms": statistics.stdev(timings) if rounds > 1 else 0.0,
+    }
+
+
+def run(
+    output: str | None, compare: str | None, sizes: List[int], only: str | None
+) -> None:
+    baseline = {}
+    if compare:
+        with open(compare, mode="rt", encoding="utf-8") as fp:
+            baseline = json.load(fp)["results"]
+
+    table = Table(
+        title=f"Benchmarks ({get_parser_backend().value})",
+        header_style="bold dark_magenta",
+    )
+    table.add_column("case")
+    for col in ("rounds", "median ms", "min ms"):
+        table.add_column(col, justify="right")
+    if baseline:
+        table.add_column("vs baseline", justify="right")
+
+    results = {}
+    with tempfile.TemporaryDirectory() as tmp_dir, warnings.catch_warnings():
+        # BaseModel.json is deprecated in pydantic v2 but is what the flows call.
+        warnings.simplefilter("ignore", DeprecationWarning)
+        groups = {
+            "parser": parser_cases,
+            "models": model_cases,
+            "forms": form_cases,
+            "history": lambda: history_cases(sizes, tmp_dir),
+            "cli": cli_cases,
+        }
+        # Skip whole groups up front so no fixtures are built for them.
+        cases = (
+            case
+            for prefix, group in groups.items()
+            if not only or only.startswith(prefix) or prefix.startswith(only)
+            for case in group()
+        )
+        for case in cases:
+            if only and not case.name.startswith(only):
+                continue
+            result = results[case.name] = measure(case.func, case.rounds)
+            row = [
+                escape(case.name),
+                str(result["rounds"]),
+                f"{result['median_ms']:.3f}",
+                f"{result['min_ms']:.3f}",
+            ]
+            if baseline:
+                row.append(format_delta(result, baseline.get(case.name)))
+            table.add_row(*row)
+    Console().print(table)
+
+    if output:
+        report = {
+            "created_at": datetime.now(timezone.utc).isoformat(),
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "html_parser": get_parser_backend().value,
+            "results": results,
+        }
+        with open(output, mode="wt", encoding="utf-8") as fp:
+            json.dump(report, fp, indent=2)
+
+
+def format_delta(result: dict[str, float], base: dict[str, float] | None) -> str:
+    if not base:
+        return "-"
+    delta = result["median_ms"] / base["median_ms"] - 1
+    color = "red" if delta > THRESHOLD else "green" if delta < -THRESHOLD else ""
+    text = f"{delta:+.1%}"
+    return f"[{color}]{text}[/]" if color else text
+
+
+if __name__ == "__main__":
+    arg_parser = argparse.ArgumentParser(description=__doc__)
+    arg_parser.add_argument("--output", help="Save the results to this JSON file")
+    arg_parser.add_argument("--compare", help="Results JSON file to compare against")
+    arg_parser.add_argument(
+        "--sizes", type=int, nargs="+", default=[10, 10_000, 100_000]
+    )
+    arg_parser.add_argument("--only", help="Only run cases starting with this prefix")
+    args = arg_parser.parse_args()
+    run(args.output, args.compare, args.sizes, args.only)
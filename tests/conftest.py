@@ -0,0 +1,33 @@
+import os
+
+import pytest
+
+from thsr_helper.booking import models
+from thsr_helper.booking.transport import (
+    Cassette,
+    ReplayAdapter,
+    ReplayedCaptchas,
+    use_transport,
+)
+from thsr_helper.booking.utils import use_captcha_solver
+
+FIXTURES_DIR = os.path.join(
+    os.path.dirname(__file__), os.pardir, "benchmarks", "fixtures"
+)
+
+
+@pytest.fixture
+def replay(tmp_path, monkeypatch):
+    """Run the flows offline from a fixture cassette, saving to a scratch history."""
+    monkeypatch.setattr(models, "MODULE_DIR", str(tmp_path))
+
+    def use_cassette(name: str) -> None:
+        cassette = Cassette.load(
+            os.path.join(FIXTURES_DIR, "cassettes", f"{name}.json")
+        )
+        use_transport(ReplayAdapter(cassette))
+        use_captcha_solver(ReplayedCaptchas(cassette.captcha_codes()))
+
+    yield use_cassette
+    use_captcha_solver(None)
+    use_transport(None)
@@ -0,0 +1,85 @@
+import pytest
+from typer import BadParameter
+
+from thsr_helper.booking.batch import BatchRunner, load_jobs
+from thsr_helper.booking.constants import JobStatus
+from thsr_helper.booking.schema import JobResult
+
+CONFIG = {
+    "user": {"personal_id": "A123456789", "phone_number": "0912345678"},
+    "conditions": {
+        "date": "2024-03-20",
+        "thsr_time": "600A",
+        "start_station": "Taipei",
+        "dest_station": "Zuouing",
+        "is_manual": False,
+    },
+}
+
+
+def test_jobs_override_the_defaults():
+    config = {
+        **CONFIG,
+        "jobs": [
+            {"name": "morning"},
+            {
+                "priority": "2",
+                "execution_times": 3,
+                "user": {"phone_number": "0987654321"},
+                "conditions": {"thsr_time": "600P", "dest_station": "Taichung"},
+            },
+        ],
+    }
+    morning, evening = load_jobs(config, execution_times=5)
+
+    assert (morning.name, morning.priority, morning.execution_times) == (
+        "morning",
+        0,
+        5,
+    )
+    assert morning.config.conditions.dest_station == "Zuouing"
+    assert (evening.name, evening.priority, evening.execution_times) == (
+        "job-2",
+        2,
+        3,
+    )
+    assert evening.config.user.personal_id == "A123456789"
+    assert evening.config.user.phone_number == "0987654321"
+    assert evening.config.conditions.thsr_time == "600P"
+    assert evening.config.conditions.dest_station == "Taichung"
+    assert evening.config.conditions.date == "2024-03-20"
+
+
+@pytest.mark.parametrize(
+    "job,message",
+    [
+        ({"priority": "high"}, "Not a number: high"),
+        ({"priority": None}, "Not a number: None"),
+        ({"execution_times": -1}, "Must not be negative: -1"),
+    ],
+)
+def test_bad_job_numbers_name_the_job(job, message):
+    with pytest.raises(BadParameter, match=f"Invalid job night: {message}"):
+        load_jobs({**CONFIG, "jobs": [{"name": "night", **job}]})
+
+
+def test_runner_books_higher_priority_first(monkeypatch):
+    order = []
+
+    def run_job(self, job):
+        order.append(job.name)
+        return JobResult(job, JobStatus.BOOKED, 1, 0.0, None)
+
+    monkeypatch.setattr(BatchRunner, "run_job", run_job)
+    priorities = {"a": 0, "b": 2, "c": -1, "d": 2, "e": 1}
+    jobs = load_jobs(
+        {
+            **CONFIG,
+            "jobs": [{"name": n, "priority": p} for n, p in priorities.items()],
+        }
+    )
+    results = BatchRunner(jobs, workers=1).run()
+
+    # Equal priorities keep the config order.
+    assert order == ["b", "d", "e", "a", "c"]
+    assert [result.job.name for result in results] == order
@@ -0,0 +1,198 @@
+import asyncio
+import logging
+import os
+
+import pytest
+
+from thsr_helper.booking import models
+from thsr_helper.booking.async_booking_flow import (
+    AsyncConfirmTrainFlow,
+    BookingCoordinator,
+)
+from thsr_helper.booking.booking_flow import BookingFlow, SlotSearchFlow
+from thsr_helper.booking.constants import PassengerType, ThsrTime
+from thsr_helper.booking.forms import train_form
+from thsr_helper.booking.parser import ConfirmTrainParser, ParsedPage
+from thsr_helper.booking.requests import AsyncHTTPRequest
+from thsr_helper.booking.schema import SlotResult
+from thsr_helper.booking.snapshot import load_snapshot
+from thsr_helper.config.settings import ConditionSettings
+
+PAGES_DIR = os.path.join(
+    os.path.dirname(__file__), os.pardir, "benchmarks", "fixtures", "pages"
+)
+ERROR_PANEL = (
+    b'<main class="uk-container"><ul class="feedbackPanel"><li>'
+    b'<span class="feedbackPanelERROR">Train sold out</span></li></ul>'
+)
+
+# A time range four search slots cover.
+RANGE_CONFIG = {
+    "user": {"personal_id": "A123456789", "phone_number": "0912345678"},
+    "conditions": {
+        "adult_ticket_num": 1,
+        "adult_ids": "A123456789",
+        "date": "2024-03-20",
+        "thsr_time": "600A",
+        "time_range": [6, 12],
+        "start_station": "Taipei",
+        "dest_station": "Zuouing",
+        "is_manual": False,
+    },
+}
+
+
+def conditions(**kwargs) -> ConditionSettings:
+    return ConditionSettings(**{"thsr_time": "600A", "is_manual": False, **kwargs})
+
+
+@pytest.mark.parametrize(
+    "thsr_time,time_range,expected",
+    [
+        ("600A", [18, 23], ["600P", "800P", "1000P"]),
+        ("600P", [18, 23], ["600P", "800P", "1000P"]),
+        ("1000A", [8, 14], ["1000A", "800A", "1200N", "200P"]),
+        ("600A", [0, 24], ["600A"]),
+    ],
+)
+def test_slots_stay_in_time_range(thsr_time, time_range, expected):
+    flow = SlotSearchFlow(None, conditions(thsr_time=thsr_time, time_range=time_range))
+    assert [slot.value for slot in flow.slots()] == expected
+
+
+def test_failed_slot_search_keeps_the_others(monkeypatch):
+    def search(self, slot, client, session):
+        if slot == ThsrTime.P800:
+            raise TimeoutError("read timed out")
+        return SlotResult(slot, client, ParsedPage(b"<main></main>"), {}, [])
+
+    monkeypatch.setattr(SlotSearchFlow, "search", search)
+    flow = SlotSearchFlow(None, conditions(time_range=[18, 23]))
+    results = flow.run([ThsrTime.P600, ThsrTime.P800, ThsrTime.P1000])
+    assert [result.slot for result in results] == [
+        ThsrTime.P600,
+        ThsrTime.P800,
+        ThsrTime.P1000,
+    ]
+    assert [bool(result.page.errors) for result in results] == [False, True, False]
+    assert "read timed out" in results[1].page.errors[0].msg
+
+
+def load_page(file_name: str) -> bytes:
+    with open(os.path.join(PAGES_DIR, file_name), mode="rb") as fp:
+        return fp.read()
+
+
+class Response:
+    def __init__(self, content: bytes) -> None:
+        self.content = content
+
+
+class FakeClient:
+    """Answers the S2 and S3 submits with the given pages, in order."""
+
+    def __init__(self, train_pages, ticket_page: bytes) -> None:
+        self.train_pages = list(train_pages)
+        self.ticket_page = ticket_page
+        self.submitted_trains = []
+
+    def submit_train(self, params: str) -> Response:
+        self.submitted_trains.append(params)
+        return Response(self.train_pages.pop(0))
+
+    def submit_ticket(self, params: str) -> Response:
+        return Response(self.ticket_page)
+
+
+def rejected_train_list() -> bytes:
+    # The first train is gone by the time it is submitted; S2 lists the
+    # trains again with an error, then takes the next one.
+    train_list = load_page("s2_trains.html")
+    return train_list.replace(b'<main class="uk-container">', ERROR_PANEL)
+
+
+def test_book_falls_back_to_the_next_ranked_train(tmp_path, monkeypatch):
+    monkeypatch.setattr(models, "MODULE_DIR", str(tmp_path))
+    train_list = load_page("s2_trains.html")
+    trains = ConfirmTrainParser.parse_trains(
+        ParsedPage(train_list, ConfirmTrainParser).soup
+    )
+    client = FakeClient(
+        [rejected_train_list(), load_page("s3_ticket.html")], load_page("result.html")
+    )
+
+    def search(self, slot, slot_client, session):
+        page = ParsedPage(train_list, ConfirmTrainParser)
+        return SlotResult(slot, client, page, {PassengerType.ADULT: 1}, trains)
+
+    monkeypatch.setattr(SlotSearchFlow, "search", search)
+    snapshot = load_snapshot(
+        {
+            "user": {"personal_id": "A123456789", "phone_number": "0912345678"},
+            "conditions": {
+                "adult_ticket_num": 1,
+                "adult_ids": "A123456789",
+                "date": "2024-03-20",
+                "thsr_time": "600A",
+                "start_station": "Taipei",
+                "dest_station": "Zuouing",
+                "is_manual": False,
+            },
+        }
+    )
+    flow = BookingFlow(snapshot, client=client)
+    assert flow.book()
+
+    # Earliest departure first, as the default selection ranks them.
+    assert client.submitted_trains == [
+        train_form().render(selected_train=train.form_value) for train in trains[:2]
+    ]
+
+
+def test_async_confirm_falls_back_to_the_next_ranked_train():
+    client = FakeClient([rejected_train_list(), load_page("s3_ticket.html")], b"")
+    train_list_page = ParsedPage(load_page("s2_trains.html"), ConfirmTrainParser)
+    flow = AsyncConfirmTrainFlow(
+        AsyncHTTPRequest(client), conditions(), train_list_page
+    )
+
+    ticket_form_page, selected_train = asyncio.run(flow.run())
+
+    assert not ticket_form_page.errors
+    assert selected_train == flow.ranked[1]
+    assert client.submitted_trains == [
+        train_form().render(selected_train=train.form_value)
+        for train in flow.ranked[:2]
+    ]
+
+
+def test_async_booking_searches_the_slots_of_the_time_range(replay, monkeypatch):
+    replay("booking")
+    searched = []
+    search = SlotSearchFlow.search
+
+    def record_search(self, slot, client, session):
+        searched.append(slot)
+        return search(self, slot, client, session)
+
+    monkeypatch.setattr(SlotSearchFlow, "search", record_search)
+
+    assert asyncio.run(BookingCoordinator(RANGE_CONFIG, concurrency=1).run())
+    # The same slots as `order` without --concurrency searches.
+    assert sorted(searched, key=lambda slot: slot.minutes) == [
+        ThsrTime.A600,
+        ThsrTime.A800,
+        ThsrTime.A1000,
+        ThsrTime.N1200,
+    ]
+
+
+def test_connect_time_counts_the_sessions_of_every_slot(replay, caplog):
+    replay("booking")
+    caplog.set_level(logging.INFO, logger="thsr_helper.booking.requests")
+    flow = BookingFlow(load_snapshot(RANGE_CONFIG))
+    assert flow.run()
+
+    # The booking page, captcha and S1 of 4 slots, then S2 and S3.
+    assert len(flow.clients) == 4
+    assert "14 requests on 4 sessions" in caplog.text
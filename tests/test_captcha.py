@@ -0,0 +1,47 @@
+from concurrent.futures import ThreadPoolExecutor
+from unittest import mock
+
+from PIL import Image, ImageDraw
+import numpy as np
+import pytest
+
+from thsr_helper.booking import captcha
+from thsr_helper.booking.captcha import GLYPH_SIZE, CaptchaModel
+from thsr_helper.settings import settings
+
+
+def captcha_image() -> Image.Image:
+    image = Image.new("L", (140, 48), 255)
+    draw = ImageDraw.Draw(image)
+    for left in range(15, 125, 28):
+        draw.rectangle((left, 14, left + 14, 34), fill=0)
+    return image
+
+
+@pytest.fixture
+def model_path(tmp_path, monkeypatch):
+    path = str(tmp_path / "captcha.npz")
+    monkeypatch.setattr(settings, "captcha_model_path", path)
+    captcha._load_captcha_model.cache_clear()
+    yield path
+    captcha._load_captcha_model.cache_clear()
+
+
+def test_predict_with_a_single_label():
+    model = CaptchaModel(np.ones((1, GLYPH_SIZE[0] * GLYPH_SIZE[1])), "A")
+    result = model.predict(captcha_image())
+    assert set(result.code) == {"A"}
+
+
+def test_missing_model_raises(model_path):
+    with pytest.raises(FileNotFoundError, match="Captcha model not found"):
+        captcha.solve_captcha(b"")
+
+
+def test_model_is_loaded_once(model_path):
+    CaptchaModel(np.ones((2, GLYPH_SIZE[0] * GLYPH_SIZE[1])), "AB").save(model_path)
+    with mock.patch.object(CaptchaModel, "load", wraps=CaptchaModel.load) as load:
+        with ThreadPoolExecutor(max_workers=4) as executor:
+            models = list(executor.map(lambda _: captcha.get_captcha_model(), range(8)))
+    assert load.call_count == 1
+    assert all(model is models[0] for model in models)
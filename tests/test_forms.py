@@ -0,0 +1,107 @@
+from datetime import date
+import json
+
+import pytest
+from requests.models import RequestEncodingMixin
+
+from thsr_helper.booking import schema
+from thsr_helper.booking.constants import STATION_MAP, PassengerType
+from thsr_helper.booking.forms import (
+    booking_form,
+    convert_ticket_num,
+    ticket_form,
+    train_form,
+)
+from thsr_helper.booking.schema import (
+    BookingModel,
+    ConfirmTicketModel,
+    ConfirmTrainModel,
+)
+from thsr_helper.config.settings import ConditionSettings, UserSettings
+
+BOOKING_VALUES = {
+    "seat_prefer": "radio17",
+    "types_of_trip": 0,
+    "search_by": "radio31",
+    "security_code": "A2KM",
+}
+
+
+def encode(model) -> str:
+    """The params the flows built before the templates, as requests sends them."""
+    return RequestEncodingMixin._encode_params(json.loads(model.json(by_alias=True)))
+
+
+@pytest.mark.parametrize(
+    "conditions",
+    [
+        ConditionSettings(
+            adult_ticket_num=2,
+            child_ticket_num=1,
+            date="2024-03-20",
+            thsr_time="600A",
+            start_station="Taipei",
+            dest_station="Zuouing",
+        ),
+        ConditionSettings(
+            adult_ticket_num=1,
+            elder_ticket_num=1,
+            date="20240101",
+            thsr_time="1000P",
+            train_requirement="1",
+            start_station="Nangang",
+            dest_station="Taichung",
+        ),
+    ],
+)
+def test_booking_form_encodes_like_the_model(conditions):
+    model = BookingModel(
+        start_station=STATION_MAP.get(conditions.start_station),
+        dest_station=STATION_MAP.get(conditions.dest_station),
+        outbound_time=conditions.thsr_time,
+        outbound_date=conditions.date,
+        train_requirement=int(conditions.train_requirement) or 0,
+        **{
+            f"{pass_type.value}_ticket_num": convert_ticket_num(
+                getattr(conditions, f"{pass_type.value}_ticket_num") or 0, pass_type
+            )
+            for pass_type in PassengerType
+        },
+        **BOOKING_VALUES,
+    )
+    assert booking_form(conditions).render(**BOOKING_VALUES) == encode(model)
+
+
+def test_train_form_encodes_like_the_model():
+    model = ConfirmTrainModel(selected_train="radio18")
+    assert train_form().render(selected_train="radio18") == encode(model)
+
+
+@pytest.mark.parametrize("email", ["", "someone@example.com"])
+def test_ticket_form_encodes_like_the_model(email):
+    user = UserSettings(
+        personal_id="A123456789", phone_number="0912345678", email=email
+    )
+    model = ConfirmTicketModel(
+        personal_id=user.personal_id,
+        phone_num=user.phone_number,
+        member_radio="radio56",
+    )
+    if email:
+        model.email = email
+    assert ticket_form(user).render(member_radio="radio56") == encode(model)
+
+
+def test_booking_form_without_date_follows_today(monkeypatch):
+    conditions = ConditionSettings(
+        thsr_time="600A", start_station="Taipei", dest_station="Zuouing"
+    )
+
+    def rendered_date(today: date) -> str:
+        monkeypatch.setattr(
+            schema, "date", type("Today", (date,), {"today": lambda: today})
+        )
+        return booking_form(conditions).render(**BOOKING_VALUES)
+
+    assert "2024%2F03%2F20" in rendered_date(date(2024, 3, 20))
+    assert "2024%2F03%2F21" in rendered_date(date(2024, 3, 21))
@@ -0,0 +1,39 @@
+import json
+import os
+import subprocess
+import sys
+
+import pytest
+
+from benchmarks.import_budget import BUDGETS
+
+# Run the CLI like `python -m thsr_helper` and write down what it imported,
+# however the command exits.
+RUN_CLI = """
+import atexit, json, os, runpy, sys
+
+def dump():
+    with open(os.environ["MODULES_PATH"], mode="wt") as fp:
+        json.dump(sorted(sys.modules), fp)
+
+atexit.register(dump)
+sys.argv[0] = "thsr_helper"
+runpy.run_module("thsr_helper", run_name="__main__")
+"""
+
+
+@pytest.mark.parametrize("budget", BUDGETS, ids=lambda budget: " ".join(budget.args))
+def test_light_commands_skip_the_heavy_modules(budget, tmp_path):
+    modules_path = tmp_path / "modules.json"
+    env = {
+        **os.environ,
+        "CONFIG_FILE_PATH": str(tmp_path / "config.toml"),
+        "MODULES_PATH": str(modules_path),
+    }
+    result = subprocess.run(
+        [sys.executable, "-c", RUN_CLI, *budget.args], env=env, capture_output=True
+    )
+    assert result.returncode == 0, result.stderr.decode()
+    loaded = {module.split(".")[0] for module in json.loads(modules_path.read_text())}
+    assert "thsr_helper" in loaded
+    assert not loaded & set(budget.forbidden)
@@ -0,0 +1,97 @@
+import json
+
+import pytest
+from typer import BadParameter
+
+from thsr_helper.booking.constants import ImportFormat
+from thsr_helper.booking.schema import ImportSummary, RowError
+from thsr_helper.config.importer import import_jobs, read_job_store
+
+DEFAULTS = {"user": {"personal_id": "A123456789", "phone_number": "0912345678"}}
+CSV_HEADER = "name,priority,start_station,dest_station,date,thsr_time,time_range\n"
+
+
+def run_import(tmp_path, content: str, input_format: ImportFormat):
+    source = tmp_path / f"jobs.{input_format.value}"
+    source.write_text(content, encoding="utf-8")
+    store = str(tmp_path / "jobs.jsonl")
+    errors = []
+    summary = import_jobs(str(source), store, input_format, DEFAULTS, errors.append)
+    return summary, errors, store
+
+
+@pytest.mark.parametrize(
+    "date_str", ["2024-03-20", "2024-3-20", "2024/03/20", "20240320"]
+)
+def test_import_takes_the_dates_the_config_takes(tmp_path, date_str):
+    content = CSV_HEADER + f"morning,2,Taipei,Zuouing,{date_str},600a,6-12\n"
+    summary, errors, store = run_import(tmp_path, content, ImportFormat.CSV)
+
+    assert (summary, errors) == (ImportSummary(1, 1, 0), [])
+    assert list(read_job_store(store)) == [
+        {
+            "name": "morning",
+            "priority": 2,
+            "conditions": {
+                "start_station": "Taipei",
+                "dest_station": "Zuouing",
+                "date": "2024-03-20",
+                "thsr_time": "600A",
+                "time_range": [6, 12],
+            },
+        }
+    ]
+
+
+def test_import_reads_jsonl(tmp_path):
+    rows = [
+        {"name": "a", "start_station": "Taipei", "dest_station": "Taichung"},
+        {"name": "b", "time_range": [18, 23], "is_manual": "no"},
+    ]
+    defaults = {"date": "2024/03/20", "thsr_time": "600P"}
+    content = "\n".join(json.dumps({**defaults, **row}) for row in rows) + "\n\n"
+    summary, errors, store = run_import(tmp_path, content, ImportFormat.JSONL)
+
+    assert errors == [RowError(2, "start_station: missing; dest_station: missing")]
+    assert summary == ImportSummary(2, 1, 1)
+
+
+def test_import_reports_every_bad_row(tmp_path):
+    content = (
+        CSV_HEADER
+        + "ok,1,Taipei,Zuouing,2024-03-20,600A,6-12\n"
+        + "bad,x,Taipei,Taipei,2024-02-30,600A,12-6\n"
+        + "short,1,Taipei\n"
+    )
+    summary, errors, store = run_import(tmp_path, content, ImportFormat.CSV)
+
+    assert summary == ImportSummary(3, 1, 2)
+    assert [error.line for error in errors] == [3, 4]
+    assert errors[0].message.split("; ") == [
+        "priority: Not a number: x",
+        "date: Wrong date, use YYYY-MM-DD, YYYY/MM/DD or YYYYMMDD: 2024-02-30",
+        "time_range: Time range must be two hours 0-24, start first: 12-6",
+        "date: missing",
+        "dest_station: same as start_station",
+    ]
+    assert errors[1].message == "Expected 7 columns, got 3"
+
+
+def test_import_keeps_the_store_unless_every_row_is_valid(tmp_path):
+    good = CSV_HEADER + "ok,1,Taipei,Zuouing,2024-03-20,600A,6-12\n"
+    run_import(tmp_path, good, ImportFormat.CSV)
+    summary, errors, store = run_import(
+        tmp_path, good + "bad,1,Taipei,Nowhere,2024-03-20,600A,6-12\n", ImportFormat.CSV
+    )
+
+    assert summary.errors == 1
+    assert [job["name"] for job in read_job_store(store)] == ["ok"]
+    assert sorted(path.name for path in tmp_path.iterdir()) == [
+        "jobs.csv",
+        "jobs.jsonl",
+    ]
+
+
+def test_import_rejects_unknown_columns(tmp_path):
+    with pytest.raises(BadParameter, match="Unknown columns: seat"):
+        run_import(tmp_path, "name,seat\na,window\n", ImportFormat.CSV)
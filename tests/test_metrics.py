@@ -0,0 +1,55 @@
+import asyncio
+import json
+
+import pytest
+
+from thsr_helper.booking.async_booking_flow import BookingCoordinator
+from thsr_helper.booking.constants import MetricsFormat
+from thsr_helper.booking.metrics import PREFIX, export_metrics
+
+CONFIG = {
+    "user": {"personal_id": "A123456789", "phone_number": "0912345678"},
+    "conditions": {
+        "adult_ticket_num": 1,
+        "adult_ids": "A123456789",
+        "date": "2024-03-20",
+        "thsr_time": "600A",
+        "start_station": "Taipei",
+        "dest_station": "Zuouing",
+        "is_manual": False,
+    },
+}
+FLOW_STAGES = (
+    "flow.BookingFlow",
+    "flow.prepare",
+    "flow.InitPageFlow",
+    "flow.ConfirmTrainFlow",
+    "flow.ConfirmTicketFlow",
+)
+
+
+def exported_counts(path: str, output_format: MetricsFormat) -> dict[str, int]:
+    with open(path, mode="rt", encoding="utf-8") as fp:
+        if output_format == MetricsFormat.JSON:
+            stages = json.load(fp)["stages"]
+            return {stage: data["count"] for stage, data in stages.items()}
+        prefix = f'{PREFIX}_seconds_count{{stage="'
+        return {
+            line[len(prefix) :].split('"')[0]: int(line.rsplit(" ", 1)[1])
+            for line in fp
+            if line.startswith(prefix)
+        }
+
+
+@pytest.mark.parametrize("output_format", list(MetricsFormat))
+def test_async_booking_exports_every_flow_step(replay, tmp_path, output_format):
+    replay("booking")
+    path = str(tmp_path / "metrics")
+    with export_metrics(path, output_format, interval=60):
+        assert asyncio.run(BookingCoordinator(CONFIG, concurrency=1).run())
+
+    counts = exported_counts(path, output_format)
+    assert {stage: counts.get(stage) for stage in FLOW_STAGES} == dict.fromkeys(
+        FLOW_STAGES, 1
+    )
+    assert counts["http.s1"] == 1
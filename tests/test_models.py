@@ -0,0 +1,171 @@
+import json
+import os
+
+import pytest
+from tinydb import TinyDB
+
+from thsr_helper.booking import models
+from thsr_helper.booking.models import FingerprintIndex, SQLiteManager, TinyDBManager
+from thsr_helper.booking.schema import Record
+
+DAY = 24 * 60 * 60
+
+
+def record(ticket_id: str = "12345678", day: int = 0, **kwargs) -> Record:
+    return Record(
+        **{
+            "id": ticket_id,
+            "payment_deadline": "3月20日",
+            "ticket_num_info": "全票 1張",
+            "price": "TWD 1,490",
+            "train_id": "803",
+            "depart_time": "06:30",
+            "arrival_time": "08:15",
+            "start_station": "台北",
+            "dest_station": "左營",
+            "date": "03/20",
+            "personal_id": "A123456789",
+            "date_ts": 1710864000.0 + day * DAY,
+            **kwargs,
+        }
+    )
+
+
+def search(manager, **params) -> list[Record]:
+    return list(
+        manager.search({"start_ts": 0, "end_ts": 1710864000.0 + 365 * DAY, **params})
+    )
+
+
+def test_sqlite_migrates_a_tinydb_history_once(tmp_path):
+    tinydb_path = str(tmp_path / "history.json")
+    with TinyDB(tinydb_path) as db:
+        db.insert(record("1")._asdict())
+        db.insert(record("2", day=1)._asdict())
+        # The same booking saved twice only counts once.
+        db.insert(record("2", day=1)._asdict())
+
+    db_path = str(tmp_path / "history.sqlite3")
+    assert search(SQLiteManager(db_path, tinydb_path)) == [record("1"), record("2", 1)]
+
+    # Reopening an existing database doesn't migrate again.
+    with TinyDB(tinydb_path) as db:
+        db.insert(record("3", day=2)._asdict())
+    assert len(search(SQLiteManager(db_path, tinydb_path))) == 2
+
+
+def test_sqlite_ignores_a_record_saved_twice(tmp_path):
+    manager = SQLiteManager(str(tmp_path / "history.sqlite3"), str(tmp_path / "none"))
+    manager.save(record())
+    manager.save(record())
+    # The date_ts of an older history may be an int; it is the same record.
+    manager.save(record(date_ts=1710864000))
+    assert search(manager) == [record()]
+
+
+@pytest.mark.parametrize(
+    "params,expected",
+    [
+        ({"ticket_id": "2"}, ["2"]),
+        ({"station": "台中"}, ["2", "3"]),
+        ({"train_id": "805"}, ["3"]),
+        ({"start_ts": 1710864000.0 + DAY / 2}, ["2", "3"]),
+        ({"end_ts": 1710864000.0 + DAY / 2}, ["1"]),
+    ],
+)
+def test_sqlite_filters_like_tinydb(tmp_path, params, expected):
+    records = [
+        record("1"),
+        record("2", day=1, dest_station="台中"),
+        record("3", day=2, start_station="台中", train_id="805"),
+    ]
+    sqlite = SQLiteManager(str(tmp_path / "history.sqlite3"), str(tmp_path / "none"))
+    tinydb = TinyDBManager(str(tmp_path / "history.json"))
+    for item in records:
+        sqlite.save(item)
+        tinydb.save(item)
+
+    assert [item.id for item in search(sqlite, **params)] == expected
+    assert [item.id for item in search(tinydb, **params)] == expected
+
+
+@pytest.mark.parametrize(
+    "where,index",
+    [
+        ("date_ts > 0", "history_date_ts"),
+        ("id = '1'", "history_id"),
+        ("train_id = '803'", "history_train_id"),
+    ],
+)
+def test_sqlite_filters_use_an_index(tmp_path, where, index):
+    manager = SQLiteManager(str(tmp_path / "history.sqlite3"), str(tmp_path / "none"))
+    with manager.connect() as conn:
+        plan = conn.execute(
+            f"EXPLAIN QUERY PLAN SELECT * FROM history WHERE {where}"
+        ).fetchall()
+    assert index in str(plan)
+
+
+@pytest.mark.parametrize(
+    "backend,manager",
+    [("sqlite", SQLiteManager), ("tinydb", TinyDBManager), ("mongo", TinyDBManager)],
+)
+def test_get_history_manager_follows_the_setting(
+    tmp_path, monkeypatch, backend, manager
+):
+    monkeypatch.setattr(models, "MODULE_DIR", str(tmp_path))
+    monkeypatch.setattr(models.settings, "history_backend", backend)
+    assert type(models.get_history_manager()) is manager
+
+
+def saved_ids(manager: TinyDBManager) -> list[str]:
+    with TinyDB(manager.db_path) as db:
+        return [doc["id"] for doc in db.all()]
+
+
+def test_tinydb_rejects_a_duplicate_after_a_restart(tmp_path):
+    db_path = str(tmp_path / "history.json")
+    TinyDBManager(db_path).save(record("1"))
+
+    manager = TinyDBManager(db_path)
+    manager.save(record("1"))
+    manager.save(record("2"))
+    assert saved_ids(manager) == ["1", "2"]
+
+
+def test_tinydb_index_rebuilds_after_an_outside_edit(tmp_path):
+    manager = TinyDBManager(str(tmp_path / "history.json"))
+    manager.save(record("1"))
+    manager.save(record("2"))
+
+    # Another program drops the first booking and adds a third.
+    with TinyDB(manager.db_path) as db:
+        db.truncate()
+        db.insert(record("2")._asdict())
+        db.insert(record("3")._asdict())
+
+    manager = TinyDBManager(manager.db_path)
+    for ticket_id in ("1", "2", "3"):
+        manager.save(record(ticket_id))
+    assert saved_ids(manager) == ["2", "3", "1"]
+
+
+def test_tinydb_index_rebuilds_when_the_file_is_replaced(tmp_path):
+    manager = TinyDBManager(str(tmp_path / "history.json"))
+    manager.save(record("1"))
+    stat = os.stat(manager.db_path)
+
+    # Saved by replacing the file, with the same size and mtime.
+    with open(manager.db_path, mode="rt", encoding="utf-8") as fp:
+        content = json.load(fp)
+    content["_default"]["1"]["id"] = "9"
+    replacement = f"{manager.db_path}.tmp"
+    with open(replacement, mode="wt", encoding="utf-8") as fp:
+        json.dump(content, fp, sort_keys=True, indent=4)
+    os.utime(replacement, ns=(stat.st_atime_ns, stat.st_mtime_ns))
+    os.replace(replacement, manager.db_path)
+    assert os.path.getsize(manager.db_path) == stat.st_size
+
+    with FingerprintIndex(manager.db_path).connect() as conn:
+        fingerprints = {row[0] for row in conn.execute("SELECT * FROM fingerprints")}
+    assert fingerprints == {record("9").fingerprint}
@@ -0,0 +1,98 @@
+import os
+
+import pytest
+
+from thsr_helper.booking import parser
+from thsr_helper.booking.constants import HTMLParserBackend
+from thsr_helper.booking.parser import (
+    BookingFlowParser,
+    ConfirmTicketParser,
+    ConfirmTrainParser,
+    InitPageParser,
+    ParsedPage,
+)
+from thsr_helper.settings import settings
+
+PAGES_DIR = os.path.join(
+    os.path.dirname(__file__), os.pardir, "benchmarks", "fixtures", "pages"
+)
+
+# Every parse_* method, on the saved pages it reads.
+CASES = [
+    ("s1_booking.html", InitPageParser, "parse_captcha_img_url"),
+    ("s1_booking.html", InitPageParser, "parse_seat_prefer_value"),
+    ("s1_booking.html", InitPageParser, "parse_types_of_trip_value"),
+    ("s1_booking.html", InitPageParser, "parse_search_by"),
+    ("s2_trains.html", ConfirmTrainParser, "parse_trains"),
+    ("s2_early_bird.html", ConfirmTrainParser, "parse_trains"),
+    ("s3_ticket.html", ConfirmTicketParser, "parse_member_radio"),
+    ("result.html", BookingFlowParser, "parse_booking_result"),
+] + [
+    (file_name, BookingFlowParser, "parse_response_error")
+    for file_name in sorted(os.listdir(PAGES_DIR))
+]
+
+# The parser the flows read each page with, and so the strainer it gets.
+PAGE_PARSERS = {
+    "result.html": BookingFlowParser,
+    "s1_booking.html": InitPageParser,
+    "s1_wrong_captcha.html": ConfirmTrainParser,
+    "s2_early_bird.html": ConfirmTrainParser,
+    "s2_sold_out.html": ConfirmTrainParser,
+    "s2_trains.html": ConfirmTrainParser,
+    "s3_busy.html": ConfirmTicketParser,
+    "s3_ticket.html": ConfirmTicketParser,
+}
+
+
+def load_page(file_name: str) -> bytes:
+    with open(os.path.join(PAGES_DIR, file_name), mode="rb") as fp:
+        return fp.read()
+
+
+def parse(backend: HTMLParserBackend, content: bytes, page_parser, method, partial):
+    original, settings.html_parser = settings.html_parser, backend.value
+    parser.get_parser_backend.cache_clear()
+    try:
+        assert parser.get_parser_backend() == backend
+        soup = page_parser.html_to_soup(content, partial=partial)
+        return getattr(page_parser, method)(soup)
+    finally:
+        settings.html_parser = original
+        parser.get_parser_backend.cache_clear()
+
+
+@pytest.mark.parametrize("partial", [False, True])
+@pytest.mark.parametrize("file_name,page_parser,method", CASES)
+def test_backends_parse_the_same(file_name, page_parser, method, partial):
+    pytest.importorskip("lxml")
+    content = load_page(file_name)
+    expected = parse(
+        HTMLParserBackend.HTML_PARSER, content, page_parser, method, partial
+    )
+    assert parse(HTMLParserBackend.LXML, content, page_parser, method, partial) == (
+        expected
+    )
+
+
+def test_every_page_has_a_parser():
+    assert sorted(PAGE_PARSERS) == sorted(os.listdir(PAGES_DIR))
+
+
+@pytest.mark.parametrize(
+    "file_name,page_parser,method",
+    [case for case in CASES if case[2] != "parse_response_error"],
+)
+def test_strained_page_reads_like_the_full_page(file_name, page_parser, method):
+    content = load_page(file_name)
+    full = page_parser.html_to_soup(content, partial=False)
+    page = ParsedPage(content, page_parser)
+    assert getattr(page_parser, method)(page.soup) == getattr(page_parser, method)(full)
+
+
+@pytest.mark.parametrize("file_name", sorted(PAGE_PARSERS))
+def test_strained_page_keeps_the_errors(file_name):
+    content = load_page(file_name)
+    full = BookingFlowParser.html_to_soup(content, partial=False)
+    page = ParsedPage(content, PAGE_PARSERS[file_name])
+    assert page.errors == BookingFlowParser.parse_response_error(full)
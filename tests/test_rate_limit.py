@@ -0,0 +1,53 @@
+from thsr_helper.booking.constants import Endpoint
+from thsr_helper.booking.metrics import Metrics
+from thsr_helper.booking.rate_limit import (
+    RateLimiter,
+    burst_budgets,
+    get_rate_limiter,
+    use_rate_limiter,
+)
+
+
+class FakeClock:
+    def __init__(self) -> None:
+        self.now = 0.0
+        self.waits = []
+
+    def __call__(self) -> float:
+        return self.now
+
+    def sleep(self, seconds: float) -> None:
+        self.waits.append(seconds)
+
+
+def test_shared_budget_spreads_a_burst():
+    clock = FakeClock()
+    rate_limiter = RateLimiter(clock=clock, sleep=clock.sleep)
+    for _ in range(8):
+        rate_limiter.acquire(Endpoint.S2)
+    assert len(clock.waits) == 6
+
+
+def test_burst_budgets_let_every_session_through():
+    clock = FakeClock()
+    rate_limiter = RateLimiter(burst_budgets(8), clock=clock, sleep=clock.sleep)
+    for endpoint in (Endpoint.S1, Endpoint.S2, Endpoint.S3):
+        for _ in range(8):
+            rate_limiter.acquire(endpoint)
+    assert clock.waits == []
+
+
+def test_metrics_export_the_rate_limiter():
+    clock = FakeClock()
+    rate_limiter = RateLimiter(clock=clock, sleep=clock.sleep)
+    rate_limiter.acquire(Endpoint.S1)
+    shared = get_rate_limiter()
+    use_rate_limiter(rate_limiter)
+    try:
+        metrics = Metrics()
+        state = metrics.snapshot()["rate_limiter"]
+        prometheus = metrics.to_prometheus()
+    finally:
+        use_rate_limiter(shared)
+    assert state["endpoints"]["s1"]["requests"] == 1
+    assert 'thsr_helper_rate_limit_requests_total{endpoint="s1"} 1' in prometheus
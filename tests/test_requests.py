@@ -0,0 +1,33 @@
+import io
+
+import pytest
+from requests.models import Response
+from urllib3 import HTTPResponse
+
+from thsr_helper.booking.parser import PageScanner
+from thsr_helper.booking.requests import STREAM_CHUNK_SIZE, read_until
+
+
+def streamed(body: bytes) -> Response:
+    response = Response()
+    response.raw = HTTPResponse(body=io.BytesIO(body), preload_content=False)
+    return response
+
+
+def test_read_until_cuts_the_body_after_the_element():
+    tail = b"<footer>" + b"x" * STREAM_CHUNK_SIZE * 2 + b"</footer>"
+    response = streamed(b"<html><main><p>Trains</p></main>" + tail)
+
+    assert read_until(response, PageScanner({"name": "main"}))
+    assert b"</main>" in response.content
+    assert not response.content.endswith(b"</footer>")
+
+
+@pytest.mark.parametrize("chunks", [1, 3])
+def test_read_until_keeps_a_body_without_the_element(chunks):
+    # An error or maintenance page has no <main>; it is read to the end.
+    body = b"<html><p>" + b"x" * STREAM_CHUNK_SIZE * chunks + b"</p></html>"
+    response = streamed(body)
+
+    assert not read_until(response, PageScanner({"name": "main"}))
+    assert response.content == body
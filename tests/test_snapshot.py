@@ -0,0 +1,92 @@
+import os
+
+import pytest
+from tomli import TOMLDecodeError
+
+from thsr_helper.booking.snapshot import ConfigReloader
+from thsr_helper.config.utils import ConfigManager
+
+CONFIG = """
+[user]
+personal_id = "A123456789"
+phone_number = "0912345678"
+
+[conditions]
+adult_ticket_num = 1
+date = "{date}"
+thsr_time = "600A"
+start_station = "Taipei"
+dest_station = "Zuouing"
+is_manual = false
+"""
+
+
+@pytest.fixture
+def config_file(tmp_path, monkeypatch):
+    path = tmp_path / "config.toml"
+    monkeypatch.setattr(
+        ConfigManager, "_get_config_path", classmethod(lambda cls: str(path))
+    )
+    monkeypatch.setattr(ConfigManager, "_cache", None)
+    mtime = [1_700_000_000_000_000_000]
+
+    def write(content: str) -> None:
+        # A new mtime on every write, however coarse the filesystem clock.
+        path.write_text(content, encoding="utf-8")
+        mtime[0] += 1_000_000_000
+        os.utime(path, ns=(mtime[0], mtime[0]))
+
+    return write
+
+
+def test_config_is_parsed_again_only_when_it_changes(config_file):
+    config_file(CONFIG.format(date="2024-03-20"))
+    config = ConfigManager.get_config()
+    assert ConfigManager.get_config() is config
+
+    # Touched but unchanged: the hash matches, the same dict comes back.
+    config_file(CONFIG.format(date="2024-03-20"))
+    assert ConfigManager.get_config() is config
+
+    config_file(CONFIG.format(date="2024-03-21"))
+    changed = ConfigManager.get_config()
+    assert changed is not config
+    assert changed["conditions"]["date"] == "2024-03-21"
+
+
+def test_reloader_picks_up_changes(config_file):
+    config_file(CONFIG.format(date="2024-03-20"))
+    reloader = ConfigReloader()
+    snapshot = reloader.get()
+    assert snapshot.conditions.date == "2024-03-20"
+    assert reloader.get() is snapshot
+
+    config_file(CONFIG.format(date="2024-03-21"))
+    assert reloader.get().conditions.date == "2024-03-21"
+
+
+@pytest.mark.parametrize(
+    "broken",
+    [
+        CONFIG.format(date="2024-03-21").replace("[conditions]", "[conditions"),
+        CONFIG.format(date="2024-02-30"),
+        CONFIG.format(date="2024-03-21").replace('"Zuouing"', '"Nowhere"'),
+    ],
+)
+def test_reloader_keeps_the_last_snapshot_when_broken(config_file, caplog, broken):
+    config_file(CONFIG.format(date="2024-03-20"))
+    reloader = ConfigReloader()
+    snapshot = reloader.get()
+
+    config_file(broken)
+    assert reloader.get() is snapshot
+    assert "Failed to reload the config" in caplog.text
+
+    config_file(CONFIG.format(date="2024-03-22"))
+    assert reloader.get().conditions.date == "2024-03-22"
+
+
+def test_reloader_raises_without_a_snapshot(config_file):
+    config_file("[user")
+    with pytest.raises(TOMLDecodeError):
+        ConfigReloader().get()
@@ -0,0 +1,112 @@
+from datetime import datetime
+from email.utils import formatdate
+import math
+
+import pytest
+import typer
+
+from thsr_helper.booking.booking_flow import InitPageFlow
+from thsr_helper.booking.constants import TIMEZONE, HTTPConfig
+from thsr_helper.booking import sniper as sniper_module
+from thsr_helper.booking.sniper import (
+    Sniper,
+    booking_window_opens,
+    estimate_clock_offset,
+)
+from thsr_helper.booking.transport import get_connection_pool
+
+
+@pytest.mark.parametrize(
+    "date_str", ["2024-03-20", "2024-3-20", "2024/03/20", "20240320"]
+)
+def test_booking_window_opens_takes_config_dates(date_str):
+    assert booking_window_opens(date_str).isoformat() == "2024-02-21T00:00:00+08:00"
+
+
+@pytest.mark.parametrize("date_str", ["2024-02-30", "03/20/2024", ""])
+def test_booking_window_opens_rejects_unknown_dates(date_str):
+    with pytest.raises(typer.BadParameter, match="Unknown date"):
+        booking_window_opens(date_str)
+
+
+def test_staged_sessions_have_their_own_connections(monkeypatch):
+    monkeypatch.setattr(InitPageFlow, "prepare", lambda self: (None, "ABCD"))
+    conditions = {"thsr_time": "600A", "is_manual": False}
+    sniper = Sniper({"conditions": conditions}, datetime.now(TIMEZONE), sessions=3)
+    sessions = sniper.stage()
+    adapters = {
+        session.client.session.get_adapter(HTTPConfig.BASE_URL) for session in sessions
+    }
+    assert len(adapters) == 3
+    assert get_connection_pool(3) not in adapters
+
+
+class FakeClock:
+    def __init__(self, now: float) -> None:
+        self.now = now
+        self.sleeps = []
+
+    def __call__(self) -> float:
+        return self.now
+
+    def sleep(self, seconds: float) -> None:
+        self.sleeps.append(seconds)
+        self.now += seconds
+
+
+class Response:
+    def __init__(self, headers: dict[str, str]) -> None:
+        self.headers = headers
+
+
+class SkewedServer:
+    """Answers after `latency` seconds with a Date header `skew` seconds ahead."""
+
+    def __init__(self, clock: FakeClock, skew: float, latency: float) -> None:
+        self.clock = clock
+        self.skew = skew
+        self.latency = latency
+
+    def ping(self) -> Response:
+        self.clock.now += self.latency / 2
+        # The Date header drops the fraction of the second.
+        date = formatdate(math.floor(self.clock.now + self.skew), usegmt=True)
+        self.clock.now += self.latency / 2
+        return Response({"Date": date})
+
+
+@pytest.mark.parametrize("skew", [-1.7, 0.0, 0.4, 2.3])
+def test_estimate_clock_offset_finds_the_skew(skew):
+    clock = FakeClock(1710000000.25)
+    server = SkewedServer(clock, skew, latency=0.02)
+    offset = estimate_clock_offset(server, clock=clock, sleep=clock.sleep)
+    assert offset == pytest.approx(skew, abs=0.1)
+    assert len(clock.sleeps) == 4
+
+
+def test_estimate_clock_offset_without_a_date_header():
+    clock = FakeClock(1710000000.0)
+    server = SkewedServer(clock, 0, latency=0.02)
+    server.ping = lambda: Response({})
+    assert estimate_clock_offset(server, clock=clock, sleep=clock.sleep) == 0.0
+
+
+def test_sniper_estimates_the_offset_with_its_clock(monkeypatch):
+    clock = FakeClock(1710000000.0)
+    calls = []
+
+    def estimate(client, clock, sleep):
+        calls.append((clock, sleep))
+        raise RuntimeError("stop")
+
+    monkeypatch.setattr(sniper_module, "estimate_clock_offset", estimate)
+    conditions = {"thsr_time": "600A", "is_manual": False}
+    sniper = Sniper(
+        {"conditions": conditions},
+        datetime.now(TIMEZONE),
+        clock=clock,
+        sleep=clock.sleep,
+    )
+    with pytest.raises(RuntimeError, match="stop"):
+        sniper.run()
+    assert calls == [(clock, clock.sleep)]
@@ -0,0 +1,47 @@
+import asyncio
+
+from thsr_helper.booking.async_booking_flow import BookingCoordinator
+from thsr_helper.booking.tracing import Tracer, use_tracer
+
+CONFIG = {
+    "user": {"personal_id": "A123456789", "phone_number": "0912345678"},
+    "conditions": {
+        "adult_ticket_num": 1,
+        "adult_ids": "A123456789",
+        "date": "2024-03-20",
+        "thsr_time": "600A",
+        "start_station": "Taipei",
+        "dest_station": "Zuouing",
+        "is_manual": False,
+    },
+}
+
+
+def test_async_trace_nests_requests_under_flow_steps(replay):
+    replay("booking")
+    tracer = Tracer()
+    use_tracer(tracer)
+    try:
+        assert asyncio.run(BookingCoordinator(CONFIG, concurrency=1).run())
+    finally:
+        use_tracer(None)
+
+    spans = {span.span_id: span for span in tracer.spans}
+    parents = {
+        (span.name, spans[span.parent_id].name if span.parent_id else None)
+        for span in tracer.spans
+    }
+    assert {(name, parent) for name, parent in parents if name.startswith("http.")} == {
+        ("http.booking_page", "flow.prepare"),
+        ("http.captcha", "flow.prepare"),
+        ("http.s1", "flow.InitPageFlow"),
+        ("http.s2", "flow.ConfirmTrainFlow"),
+        ("http.s3", "flow.ConfirmTicketFlow"),
+    }
+    assert {(name, parent) for name, parent in parents if name.startswith("flow.")} == {
+        ("flow.BookingFlow", None),
+        ("flow.prepare", "flow.BookingFlow"),
+        ("flow.InitPageFlow", "flow.BookingFlow"),
+        ("flow.ConfirmTrainFlow", "flow.BookingFlow"),
+        ("flow.ConfirmTicketFlow", "flow.BookingFlow"),
+    }
@@ -0,0 +1,118 @@
+import pytest
+from requests import Session
+from requests.exceptions import ConnectionError
+
+from thsr_helper.booking import transport
+from thsr_helper.booking.transport import (
+    Cassette,
+    ReplayAdapter,
+    ReplayedCaptchas,
+    _ThrottledStream,
+    interaction_key,
+)
+from thsr_helper.booking.utils import fill_code, use_captcha_solver
+
+BASE_URL = "http://127.0.0.1:8765/IMINT/"
+S1_URL = (
+    f"{BASE_URL};jsessionid=0a1b?wicket:interface=:0:BookingS1Form::"
+    "IFormSubmitListener&toTimeTable=600A&homeCaptcha%3AsecurityCode={}"
+)
+S2_URL = (
+    f"{BASE_URL}?wicket:interface=:1:BookingS2Form::IFormSubmitListener"
+    "&TrainQueryDataViewPanel%3ATrainGroup={}"
+)
+
+
+def interaction(url: str, method: str = "GET", **body) -> dict[str, any]:
+    return {
+        "request": {"method": method, "url": url},
+        "response": {
+            "status": 200,
+            "headers": [["Content-Type", "text/html;charset=UTF-8"]],
+            **(body or {"body": "<html></html>"}),
+        },
+    }
+
+
+def replay_session(cassette: Cassette, **kwargs) -> Session:
+    session = Session()
+    session.mount("http://", ReplayAdapter(cassette, **kwargs))
+    return session
+
+
+def test_cassette_round_trips_through_a_replay(tmp_path):
+    interactions = [
+        interaction(f"{BASE_URL}?locale=tw", body="<html>訂票</html>"),
+        interaction(f"{BASE_URL}?wicket:interface=:0:captcha", body_base64="iVBORw=="),
+    ]
+    session = replay_session(Cassette("source.json", interactions))
+    recorded = Cassette(str(tmp_path / "cassettes" / "booking.json"))
+    for item in interactions:
+        response = session.get(item["request"]["url"])
+        recorded.append(response.request, response)
+    recorded.save()
+
+    assert Cassette.load(recorded.path).interactions == interactions
+
+
+def test_interaction_key_matches_on_wicket_interface_and_locale():
+    key = interaction_key("post", S2_URL.format("radio17"))
+    # The session id and the form fields differ between runs.
+    assert key == interaction_key(
+        "POST", S2_URL.format("radio19").replace("/IMINT/", "/IMINT/;jsessionid=9z")
+    )
+    assert key != interaction_key("GET", S2_URL.format("radio17"))
+    assert key != interaction_key("POST", S2_URL.replace(":1:", ":2:").format(""))
+    assert interaction_key("GET", f"{BASE_URL}?locale=tw") != interaction_key(
+        "GET", f"{BASE_URL}?locale=en"
+    )
+
+
+def test_replay_repeats_the_last_response_of_an_endpoint():
+    session = replay_session(
+        Cassette(
+            "s2.json",
+            [
+                interaction(S2_URL.format("radio17"), "POST", body="first"),
+                interaction(S2_URL.format("radio17"), "POST", body="second"),
+            ],
+        )
+    )
+    bodies = [session.post(S2_URL.format("radio19")).text for _ in range(3)]
+    assert bodies == ["first", "second", "second"]
+
+
+def test_replay_misses_an_unrecorded_endpoint():
+    session = replay_session(Cassette("s2.json", [interaction(S2_URL.format(""))]))
+    with pytest.raises(ConnectionError, match="No recorded response"):
+        session.get(f"{BASE_URL}?locale=tw")
+
+
+def test_throttled_stream_reads_at_the_bandwidth(monkeypatch):
+    waits = []
+    monkeypatch.setattr(transport.time, "sleep", waits.append)
+    stream = _ThrottledStream(b"x" * 1500, bandwidth=1000)
+
+    assert stream.read(1000) == b"x" * 1000
+    buffer = bytearray(1000)
+    assert stream.readinto(buffer) == 500
+    assert waits == [1.0, 0.5]
+
+
+def test_replayed_captchas_repeat_the_recorded_codes():
+    cassette = Cassette(
+        "s1.json",
+        [
+            interaction(S1_URL.format("AB12"), "POST"),
+            interaction(S2_URL.format("radio17"), "POST"),
+            interaction(S1_URL.format("CD34"), "POST"),
+        ],
+    )
+    assert cassette.captcha_codes() == ["AB12", "CD34"]
+
+    use_captcha_solver(ReplayedCaptchas(cassette.captcha_codes()))
+    try:
+        codes = [fill_code(b"", manual=True) for _ in range(3)]
+    finally:
+        use_captcha_solver(None)
+    assert codes == ["AB12", "CD34", "CD34"]
@@ -0,0 +1,85 @@
+from datetime import datetime
+import itertools
+import os
+
+import pytest
+
+from thsr_helper.booking import models, watch
+from thsr_helper.booking.booking_flow import BookingFlow
+from thsr_helper.booking.constants import TIMEZONE, PassengerType, ThsrTime
+from thsr_helper.booking.parser import ConfirmTrainParser, ParsedPage
+from thsr_helper.booking.schema import SlotResult
+from thsr_helper.booking.snapshot import ConfigReloader
+from thsr_helper.booking.watch import Watcher
+
+PAGES_DIR = os.path.join(
+    os.path.dirname(__file__), os.pardir, "benchmarks", "fixtures", "pages"
+)
+CONFIG = {
+    "user": {"personal_id": "A123456789", "phone_number": "0912345678"},
+    "conditions": {
+        "adult_ticket_num": 1,
+        "date": "2024-03-20",
+        "thsr_time": "600A",
+        "start_station": "Taipei",
+        "dest_station": "Zuouing",
+        "is_manual": False,
+    },
+}
+
+
+def test_watch_retries_the_list_after_a_failed_booking(tmp_path, monkeypatch):
+    monkeypatch.setattr(models, "MODULE_DIR", str(tmp_path))
+    with open(os.path.join(PAGES_DIR, "s2_trains.html"), mode="rb") as fp:
+        page = ParsedPage(fp.read(), ConfirmTrainParser)
+    trains = ConfirmTrainParser.parse_trains(page.soup)
+
+    def search(self):
+        return [
+            SlotResult(
+                ThsrTime.P600, self.client, page, {PassengerType.ADULT: 1}, trains
+            )
+        ]
+
+    # The same list on every poll: the first booking raises, the second is
+    # rejected and the third goes through.
+    outcomes = iter([RuntimeError("Connection reset"), None, True])
+    confirmed = []
+
+    def confirm(self, result, ranked):
+        confirmed.append(ranked[0].id)
+        if isinstance(outcome := next(outcomes), Exception):
+            raise outcome
+        self.record = outcome
+        return outcome
+
+    monkeypatch.setattr(BookingFlow, "search", search)
+    monkeypatch.setattr(BookingFlow, "confirm", confirm)
+    clock = itertools.count()
+    watcher = Watcher(
+        ConfigReloader(lambda: CONFIG),
+        until=10,
+        clock=lambda: next(clock),
+        sleep=lambda seconds: None,
+    )
+
+    assert watcher.run() is True
+    assert watcher.polls == 3
+    assert confirmed == [trains[0].id] * 3
+
+
+@pytest.mark.parametrize("hour,interval", [(3, 40), (12, 10)])
+def test_quiet_hours_follow_the_watchers_clock(monkeypatch, hour, interval):
+    monkeypatch.setattr(watch.random, "uniform", lambda low, high: 1.0)
+    now = TIMEZONE.localize(datetime(2024, 3, 20, hour)).timestamp()
+    sleeps = []
+    watcher = Watcher(
+        ConfigReloader(lambda: CONFIG),
+        min_interval=5,
+        max_interval=10,
+        clock=lambda: now,
+        sleep=sleeps.append,
+    )
+    watcher.interval = 10
+    watcher.wait(changed=False)
+    assert sleeps == [interval]
@@ -0,0 +1,254 @@
+from typing import Tuple, Dict, List
+import asyncio
+import logging
+
+from bs4 import BeautifulSoup
+
+from .booking_flow import (
+    BookingFlow,
+    InitPageFlow,
+    ConfirmTrainFlow,
+    ConfirmTicketFlow,
+    SlotSearchFlow,
+    error_messages,
+    record_page,
+)
+from .constants import PassengerType
+from .metrics import timed
+from .parser import (
+    BookingFlowParser,
+    ConfirmTrainParser,
+    ParsedPage,
+)
+from .schema import (
+    ConfirmTrainModel,
+    Error,
+    Record,
+    PreparedSession,
+    SlotResult,
+    Train,
+)
+from .session_pool import SessionPool
+from .utils import fill_code
+from thsr_helper.booking.requests import AsyncHTTPRequest, log_connect_time
+from thsr_helper.config.settings import ConditionSettings
+
+logger = logging.getLogger(__name__)
+
+
+class AsyncInitPageFlow(InitPageFlow):
+    def __init__(
+        self,
+        client: AsyncHTTPRequest,
+        conditions: ConditionSettings,
+        captcha_lock: asyncio.Lock,
+    ) -> None:
+        super().__init__(client, conditions)
+        self.captcha_lock = captcha_lock
+
+    async def run(
+        self, session: PreparedSession = None
+    ) -> Tuple[ParsedPage, Dict[PassengerType, int]]:
+        if session:
+            page, security_code = session.page, session.security_code
+        else:
+            page, security_code = await self.prepare()
+
+        with timed("flow.InitPageFlow") as timer:
+            passenger_info = self.get_passenger_info()
+            dict_params = self.build_params(page, passenger_info, security_code)
+            train_list_page = ParsedPage(
+                (await self.client.submit_booking_form(dict_params)).content,
+                ConfirmTrainParser,
+            )
+            record_page(timer, train_list_page, thsr_time=self.conditions.thsr_time)
+        return train_list_page, passenger_info
+
+    async def prepare(self) -> Tuple[BeautifulSoup, str]:
+        with timed("flow.prepare"):
+            init_response: bytes = (await self.client.booking_page()).content
+            page = self.parser.html_to_soup(init_response, partial=True)
+            image_url = self.parser.parse_captcha_img_url(page)
+            img: bytes = (await self.client.get_captcha_img(image_url)).content
+            return page, await self.solve_captcha(img)
+
+    async def solve_captcha(self, img: bytes) -> str:
+        if not self.conditions.is_manual:
+            return await asyncio.to_thread(fill_code, img, manual=False)
+        # Only one worker may prompt the user at a time.
+        async with self.captcha_lock:
+            return await asyncio.to_thread(fill_code, img, manual=True)
+
+
+class AsyncConfirmTrainFlow(ConfirmTrainFlow):
+    async def run(
+        self, train: Train = None
+    ) -> Tuple[ParsedPage, ConfirmTrainModel | None]:
+        selected_train = train or self.select_train()
+        if not selected_train:
+            return None, None
+        with timed("flow.ConfirmTrainFlow") as timer:
+            # The fallbacks submit one after another, on the blocking client.
+            ticket_form_page, selected_train = await asyncio.to_thread(
+                self.confirm, selected_train, self.client.client
+            )
+            record_page(timer, ticket_form_page, train=selected_train.id)
+        return ticket_form_page, selected_train
+
+
+class AsyncConfirmTicketFlow(ConfirmTicketFlow):
+    async def run(self) -> Tuple[ParsedPage, Error | None]:
+        if error := self.build_params():
+            return None, error
+        with timed("flow.ConfirmTicketFlow") as timer:
+            result_page = ParsedPage(
+                (await self.client.submit_ticket(self.params)).content,
+                BookingFlowParser,
+            )
+            record_page(timer, result_page)
+        return result_page, None
+
+
+class AsyncBookingFlow(BookingFlow):
+    def __init__(
+        self,
+        config: dict[str, any],
+        coordinator: "BookingCoordinator",
+        session: PreparedSession = None,
+    ):
+        client = AsyncHTTPRequest(session.client if session else None)
+        super().__init__(config, client=client)
+        self.clients = [client.client]
+        self.session = session
+        self.coordinator = coordinator
+
+    async def run(self) -> Record | None:
+        try:
+            with timed("flow.BookingFlow", root=True) as timer:
+                record = await self.book()
+                timer.outcome = self.outcome(record)
+                if self.errors:
+                    timer.set("errors", error_messages(self.errors))
+                return record
+        finally:
+            log_connect_time(self.clients)
+
+    async def book(self) -> Record | None:
+        # First page to get booking options, for every time slot needed.
+        result, ranked = self.choose(await self.search())
+        if self.check_error(result.page):
+            return
+
+        # Second page. Train confirmation, on the session that listed the best
+        # train; the rest of the ranking is its fallbacks.
+        client = AsyncHTTPRequest(result.client)
+        ticket_form_page, selected_train = await AsyncConfirmTrainFlow(
+            client,
+            self.condition_settings,
+            result.page,
+            result.trains,
+            ranked=ranked,
+        ).run(ranked[0] if ranked else None)
+        if not selected_train or self.check_error(ticket_form_page):
+            return
+
+        # Final page. Ticket confirmation. Only one worker may submit at a time,
+        # and nobody submits once a ticket has been booked.
+        async with self.coordinator.submit_lock:
+            if self.coordinator.booked.is_set():
+                return
+            result_page, error = await AsyncConfirmTicketFlow(
+                client,
+                self.condition_settings,
+                self.user_settings,
+                ticket_form_page,
+                result.passenger_info,
+                selected_train,
+            ).run()
+            if error or self.check_error(result_page):
+                return
+            self.coordinator.booked.set()
+
+        return self.save_ticket(result_page)
+
+    async def search(self) -> List[SlotResult]:
+        """
+        The S1 search of BookingFlow, so that every engine chooses from the
+        same trains. A single slot goes through this flow's session, with the
+        captcha prompt shared by the workers; several slots are searched at
+        once in threads, each extra slot on a session of its own.
+        """
+        slot_search = SlotSearchFlow(self.client.client, self.condition_settings)
+        slots = slot_search.slots()
+        if len(slots) > 1:
+            return self.keep_clients(
+                await asyncio.to_thread(slot_search.run, slots, self.session)
+            )
+        conditions = self.condition_settings.model_copy(
+            update={"thsr_time": slots[0].value}
+        )
+        page, passenger_info = await AsyncInitPageFlow(
+            self.client, conditions, self.coordinator.captcha_lock
+        ).run(self.session)
+        trains = [] if page.errors else ConfirmTrainParser.parse_trains(page.soup)
+        return [SlotResult(slots[0], self.client.client, page, passenger_info, trains)]
+
+
+class BookingCoordinator:
+    """Run several independent booking sessions at once.
+
+    The first worker that gets a ticket cancels the others.
+    """
+
+    def __init__(
+        self,
+        config: dict[str, any],
+        concurrency: int,
+        execution_times: int = 1,
+        pool: SessionPool = None,
+        retry_interval: float = 1,
+    ) -> None:
+        self.config = config
+        self.concurrency = concurrency
+        self.execution_times = execution_times
+        self.pool = pool
+        self.retry_interval = retry_interval
+
+    async def run(self) -> bool:
+        self.booked = asyncio.Event()
+        self.submit_lock = asyncio.Lock()
+        self.captcha_lock = asyncio.Lock()
+
+        workers = [
+            asyncio.create_task(self.worker(idx)) for idx in range(self.concurrency)
+        ]
+        try:
+            for finished in asyncio.as_completed(workers):
+                if await finished:
+                    return True
+            return False
+        finally:
+            for worker in workers:
+                worker.cancel()
+            await asyncio.gather(*workers, return_exceptions=True)
+
+    async def worker(self, idx: int) -> bool:
+        for attempt in range(self.execution_times):
+            if self.booked.is_set():
+                return False
+            if attempt:
+                await asyncio.sleep(self.retry_interval)
+            try:
+                session = await self.acquire_session()
+                if await AsyncBookingFlow(self.config, self, session).run():
+                    return True
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logger.warning(f"Worker {idx}: {e}")
+        return False
+
+    async def acquire_session(self) -> PreparedSession | None:
+        if self.pool is None:
+            return None
+        return await asyncio.to_thread(self.pool.acquire)
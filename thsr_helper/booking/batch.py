@@ -0,0 +1,120 @@
+from concurrent.futures import ThreadPoolExecutor
+from itertools import chain
+from typing import List
+import logging
+import time
+
+from pydantic import ValidationError
+from rich.console import Console
+from rich.table import Table
+import typer
+
+from .booking_flow import BookingFlow
+from .constants import JobStatus
+from .schema import Job, JobResult
+from .snapshot import load_snapshot
+from thsr_helper.config.importer import (
+    job_store_path,
+    read_job_store,
+    to_count,
+    to_int,
+)
+
+logger = logging.getLogger(__name__)
+
+
+def load_jobs(config: dict[str, any], execution_times: int = 1) -> List[Job]:
+    """
+    Read the `[[jobs]]` array of a config, then the job store `jobs_file`
+    names, if any. The top-level `[user]` and `[conditions]` tables, if any,
+    are defaults each job can override.
+    """
+    job_configs = config.get("jobs", [])
+    if jobs_file := config.get("jobs_file"):
+        job_configs = chain(job_configs, read_job_store(job_store_path(jobs_file)))
+    jobs = []
+    for idx, job_config in enumerate(job_configs):
+        name = job_config.get("name", f"job-{idx + 1}")
+        merged = {
+            section: {**config.get(section, {}), **job_config.get(section, {})}
+            for section in ("user", "conditions")
+        }
+        try:
+            # Priorities are compared when sorting, so a stray string has to
+            # fail here rather than abort the whole batch.
+            priority = to_int(job_config.get("priority", 0))
+            times = to_count(job_config.get("execution_times", execution_times))
+            snapshot = load_snapshot(merged)
+        except (ValidationError, typer.BadParameter) as e:
+            raise typer.BadParameter(f"Invalid job {name}: {e}")
+        jobs.append(
+            Job(name=name, priority=priority, execution_times=times, config=snapshot)
+        )
+    return jobs
+
+
+class BatchRunner:
+    """
+    Run booking jobs over a bounded pool of workers, higher priority first.
+
+    Every attempt books with its own HTTP session, so jobs don't share
+    cookies or Wicket state and one job failing leaves the others alone.
+    """
+
+    def __init__(
+        self, jobs: List[Job], workers: int, retry_interval: float = 1
+    ) -> None:
+        self.jobs = jobs
+        self.workers = workers
+        self.retry_interval = retry_interval
+
+    def run(self) -> List[JobResult]:
+        # sorted() is stable, so equal priorities keep the config order.
+        jobs = sorted(self.jobs, key=lambda job: -job.priority)
+        workers = self.workers
+        if any(job.config.conditions.is_manual for job in jobs):
+            # Manual captchas have to be typed one after another.
+            workers = 1
+        with ThreadPoolExecutor(
+            max_workers=workers, thread_name_prefix="batch"
+        ) as executor:
+            return list(executor.map(self.run_job, jobs))
+
+    def run_job(self, job: Job) -> JobResult:
+        started = time.monotonic()
+        detail = None
+        for attempt in range(job.execution_times):
+            if attempt:
+                time.sleep(self.retry_interval)
+            try:
+                flow = BookingFlow(job.config)
+                if flow.run():
+                    elapsed = time.monotonic() - started
+                    return JobResult(
+                        job, JobStatus.BOOKED, attempt + 1, elapsed, flow.record.id
+                    )
+                detail = flow.errors[-1].msg if flow.errors else "No ticket"
+            except Exception as e:
+                logger.warning(f"Job {job.name}: {e}")
+                detail = str(e)
+        elapsed = time.monotonic() - started
+        return JobResult(job, JobStatus.FAILED, job.execution_times, elapsed, detail)
+
+
+def show_job_results(results: List[JobResult]) -> None:
+    table = Table(
+        title="Batch summary", show_header=True, header_style="bold dark_magenta"
+    )
+    for col in ("job", "priority", "status", "attempts", "seconds", "detail"):
+        table.add_column(col)
+    for result in results:
+        color = "green" if result.status == JobStatus.BOOKED else "red"
+        table.add_row(
+            result.job.name,
+            str(result.job.priority),
+            f"[{color}]{result.status.value}[/]",
+            str(result.attempts),
+            f"{result.elapsed:.1f}",
+            result.detail or "",
+        )
+    Console().print(table)
@@ -1,42 +1,65 @@
+from concurrent.futures import Future, ThreadPoolExecutor
+from contextvars import copy_context
 from datetime import datetime
 from typing import Tuple, Dict, List
-import json
 import logging
+import operator
 
 
-from requests.models import Response
+from bs4 import BeautifulSoup
 import typer
 
+from .forms import booking_form, ticket_form, train_form
+from .metrics import Timer, timed
+from .selection import TrainSelector
+from .snapshot import load_snapshot
 from .utils import fill_code, show_ticket
 from .parser import (
     BookingFlowParser,
     ConfirmTrainParser,
     InitPageParser,
     ConfirmTicketParser,
+    ParsedPage,
 )
 from .schema import (
-    BookingModel,
     ConfirmTrainModel,
     Train,
-    ConfirmTicketModel,
     Error,
     Ticket,
     Record,
+    PreparedSession,
+    SlotResult,
+    ConfigSnapshot,
 )
 from .constants import (
-    STATION_MAP,
+    MAX_SEARCH_SLOTS,
+    MAX_TRAIN_FALLBACKS,
+    SEARCH_SLOT_MINUTES,
     PassengerType,
-    PASSENGER_TYPE_MAP,
     EARLY_BIRD_KEY,
     CHECK_ID_TYPE,
+    ThsrTime,
 )
-from thsr_helper.booking.requests import HTTPRequest
-from thsr_helper.booking.models import TinyDBManager
+from thsr_helper.booking.requests import HTTPRequest, log_connect_time
+from thsr_helper.booking.models import get_history_manager
 from thsr_helper.config.settings import UserSettings, ConditionSettings
 
 logger = logging.getLogger(__name__)
 
 
+def error_messages(errors: List[Error]) -> str:
+    return "; ".join(error.msg for error in errors)
+
+
+def record_page(timer: Timer, page: ParsedPage, **attributes) -> None:
+    """Close a flow step on the page it got back: rejected if it has errors."""
+    for key, value in attributes.items():
+        timer.set(key, value)
+    if page.errors:
+        timer.outcome = "rejected"
+        timer.set("errors", error_messages(page.errors))
+
+
 class BaseFlow:
     def __init__(self, client: HTTPRequest, conditions: ConditionSettings) -> None:
         self.client = client
@@ -45,43 +68,96 @@ class BaseFlow:
 
 
 class BookingFlow:
-    def __init__(self, config: dict[str, any] = None) -> None:
-        self.client = HTTPRequest()
-        self.user_settings = UserSettings(**config.get("user"))
-        self.condition_settings = ConditionSettings(**config.get("conditions"))
+    def __init__(
+        self,
+        config: dict[str, any] | ConfigSnapshot = None,
+        client: HTTPRequest = None,
+        session: PreparedSession = None,
+    ) -> None:
+        self.session = session
+        self.client = session.client if session else client or HTTPRequest()
+        if not isinstance(config, ConfigSnapshot):
+            config = load_snapshot(config)
+        self.user_settings = config.user
+        self.condition_settings = config.conditions
         self.parser = BookingFlowParser
-        self.db = TinyDBManager()
+        self.db = get_history_manager()
         self.errors: list[Error] = []
+        self.record: Record | None = None
+        # Every session the attempt used, for its connect time.
+        self.clients: List[HTTPRequest] = [self.client]
 
     def run(self) -> None:
-        # First page to get booking options.
-        booking_response, passenger_info = InitPageFlow(
-            self.client, self.condition_settings
-        ).run()
-        if self.check_error(booking_response):
+        try:
+            with timed("flow.BookingFlow", root=True) as timer:
+                booked = self.book()
+                timer.outcome = self.outcome(booked)
+                if self.errors:
+                    timer.set("errors", error_messages(self.errors))
+                return booked
+        finally:
+            log_connect_time(self.clients)
+
+    def outcome(self, booked: any) -> str:
+        if booked:
+            return "booked"
+        return "rejected" if self.errors else "no_train"
+
+    def book(self) -> None:
+        # First page to get booking options, for every time slot needed.
+        result, ranked = self.choose(self.search())
+        if self.check_error(result.page):
             return
+        return self.confirm(result, ranked)
 
-        # Second page. Train confirmation.
-        train_response, selected_train = ConfirmTrainFlow(
-            self.client, self.condition_settings, booking_response
-        ).run()
-        if not selected_train or self.check_error(train_response):
+    def confirm(self, result: SlotResult, ranked: List[Train]) -> None:
+        # Second page. Train confirmation, on the session that listed the best
+        # train; the rest of the ranking is its fallbacks.
+        ticket_form_page, selected_train = ConfirmTrainFlow(
+            result.client,
+            self.condition_settings,
+            result.page,
+            result.trains,
+            ranked=ranked,
+        ).run(ranked[0] if ranked else None)
+        if not selected_train or self.check_error(ticket_form_page):
             return
 
         # Final page. Ticket confirmation.
-        ticket_response, error = ConfirmTicketFlow(
-            self.client,
+        result_page, error = ConfirmTicketFlow(
+            result.client,
             self.condition_settings,
             self.user_settings,
-            train_response,
-            passenger_info,
+            ticket_form_page,
+            result.passenger_info,
             selected_train,
         ).run()
-        if error or self.check_error(ticket_response):
+        if error or self.check_error(result_page):
             return
 
-        page = self.parser.html_to_soup(ticket_response)
-        ticket: Ticket = self.parser.parse_booking_result(page)
+        self.record = self.save_ticket(result_page)
+        return True
+
+    def search(self) -> List[SlotResult]:
+        """
+        Submit the S1 search. When `time_range` needs more than the configured
+        slot, all the slots are searched at once.
+        """
+        slot_search = SlotSearchFlow(self.client, self.condition_settings)
+        return self.keep_clients(slot_search.run(slot_search.slots(), self.session))
+
+    def keep_clients(self, results: List[SlotResult]) -> List[SlotResult]:
+        """Count the sessions of the slots searched in the attempt's connect time."""
+        self.clients += [
+            result.client for result in results if result.client not in self.clients
+        ]
+        return results
+
+    def choose(self, results: List[SlotResult]) -> Tuple[SlotResult, List[Train]]:
+        return SlotSearchFlow(self.client, self.condition_settings).choose(results)
+
+    def save_ticket(self, result_page: ParsedPage) -> Record:
+        ticket: Ticket = self.parser.parse_booking_result(result_page.soup)
 
         date_ts = datetime.strptime(
             self.condition_settings.date, "%Y-%m-%d"
@@ -96,12 +172,11 @@ class BookingFlow:
             "-------------- 訂位結果 --------------", fg=typer.colors.BRIGHT_YELLOW
         )
         show_ticket(record)
-        return True
+        return record
 
-    def check_error(self, resp: Response) -> None:
-        page = self.parser.html_to_soup(resp)
-        if errors := self.parser.parse_response_error(page):
-            self.errors.extend(errors)
+    def check_error(self, page: ParsedPage) -> None:
+        if page.errors:
+            self.errors.extend(page.errors)
             self.show_error()
             return True
 
@@ -115,13 +190,37 @@ class InitPageFlow(BaseFlow):
         super().__init__(client, conditions)
         self.parser = InitPageParser
 
-    def run(self) -> Tuple[bytes, Dict[PassengerType, int]]:
-        init_response: bytes = self.client.booking_page().content
-        page = self.parser.html_to_soup(init_response)
-        image_url = self.parser.parse_captcha_img_url(page)
-        img: bytes = self.client.get_captcha_img(image_url).content
-
-        passenger_info = {
+    def run(
+        self, session: PreparedSession = None
+    ) -> Tuple[ParsedPage, Dict[PassengerType, int]]:
+        if session:
+            page, security_code = session.page, session.security_code
+        else:
+            page, security_code = self.prepare()
+
+        with timed("flow.InitPageFlow") as timer:
+            passenger_info = self.get_passenger_info()
+            dict_params = self.build_params(page, passenger_info, security_code)
+            train_list_page = ParsedPage(
+                self.client.submit_booking_form(dict_params).content,
+                ConfirmTrainParser,
+            )
+            record_page(timer, train_list_page, thsr_time=self.conditions.thsr_time)
+        return train_list_page, passenger_info
+
+    def prepare(self) -> Tuple[BeautifulSoup, str]:
+        """
+        Fetch the booking page and solve its captcha, ready for the S1 submit.
+        """
+        with timed("flow.prepare"):
+            init_response: bytes = self.client.booking_page().content
+            page = self.parser.html_to_soup(init_response, partial=True)
+            image_url = self.parser.parse_captcha_img_url(page)
+            img: bytes = self.client.get_captcha_img(image_url).content
+            return page, fill_code(img, manual=self.conditions.is_manual)
+
+    def get_passenger_info(self) -> Dict[PassengerType, int]:
+        return {
             PassengerType.ADULT: self.conditions.adult_ticket_num or 0,
             PassengerType.CHILD: self.conditions.child_ticket_num or 0,
             PassengerType.DISABLED: self.conditions.disabled_ticket_num or 0,
@@ -129,38 +228,145 @@ class InitPageFlow(BaseFlow):
             PassengerType.COLLEGE: self.conditions.college_ticket_num or 0,
         }
 
-        booking_model = BookingModel(
-            start_station=STATION_MAP.get(self.conditions.start_station),
-            dest_station=STATION_MAP.get(self.conditions.dest_station),
-            outbound_time=self.conditions.thsr_time,
-            outbound_date=self.conditions.date,
-            adult_ticket_num=self.convert_ticket_num(
-                passenger_info.get(PassengerType.ADULT), PassengerType.ADULT
-            ),
-            child_ticket_num=self.convert_ticket_num(
-                passenger_info.get(PassengerType.CHILD), PassengerType.CHILD
-            ),
-            disabled_ticket_num=self.convert_ticket_num(
-                passenger_info.get(PassengerType.DISABLED), PassengerType.DISABLED
-            ),
-            elder_ticket_num=self.convert_ticket_num(
-                passenger_info.get(PassengerType.ELDER), PassengerType.ELDER
-            ),
-            college_ticket_num=self.convert_ticket_num(
-                passenger_info.get(PassengerType.COLLEGE), PassengerType.COLLEGE
-            ),
+    def build_params(
+        self,
+        page: BeautifulSoup,
+        passenger_info: Dict[PassengerType, int],
+        security_code: str,
+    ) -> str:
+        # The ticket numbers come from the conditions, like passenger_info.
+        return booking_form(self.conditions).render(
             seat_prefer=self.parser.parse_seat_prefer_value(page),
             types_of_trip=self.parser.parse_types_of_trip_value(page),
             search_by=self.parser.parse_search_by(page),
-            train_requirement=int(self.conditions.train_requirement) or 0,
-            security_code=fill_code(img, manual=self.conditions.is_manual),
+            security_code=security_code,
         )
-        dict_params = json.loads(booking_model.json(by_alias=True))
-        booking_response = self.client.submit_booking_form(dict_params).content
-        return booking_response, passenger_info
 
-    def convert_ticket_num(self, ticket_num: int, passenger_type: PassengerType) -> str:
-        return f"{ticket_num}{PASSENGER_TYPE_MAP.get(passenger_type)}"
+
+class SlotSearchFlow(BaseFlow):
+    """
+    S1 search over every time slot needed to cover `time_range`, each slot on
+    its own session and all at once. The trains they list are merged, and
+    each has to be booked through the session that listed it.
+    """
+
+    def __init__(self, client: HTTPRequest, conditions: ConditionSettings) -> None:
+        super().__init__(client, conditions)
+        self.parser = ConfirmTrainParser
+
+    def slots(self) -> List[ThsrTime]:
+        """
+        The configured slot if it lists part of `time_range`, then the slots
+        for the parts not covered yet. A full-day range, or typing the
+        captchas by hand, keeps the configured slot only.
+        """
+        first = ThsrTime(self.conditions.thsr_time)
+        start_hour, end_hour = self.conditions.time_range
+        # The end hour is inclusive, as in choose_train.
+        start, end = start_hour * 60, min(end_hour + 1, 24) * 60
+        if self.conditions.is_manual or end - start >= 24 * 60:
+            return [first]
+
+        in_range = start < first.minutes + SEARCH_SLOT_MINUTES and first.minutes < end
+        slots, target = [first] if in_range else [], start
+        while target < end:
+            covering = [
+                slot
+                for slot in slots
+                if slot.minutes <= target < slot.minutes + SEARCH_SLOT_MINUTES
+            ]
+            if covering:
+                target = max(slot.minutes for slot in covering) + SEARCH_SLOT_MINUTES
+                continue
+            # The latest slot still listing the target, else the next one,
+            # as there are no slots between 00:30 and 06:00.
+            earlier = [
+                slot
+                for slot in ThsrTime
+                if target - SEARCH_SLOT_MINUTES < slot.minutes <= target
+            ]
+            later = [slot for slot in ThsrTime if target < slot.minutes < end]
+            by_minutes = operator.attrgetter("minutes")
+            slot = (
+                max(earlier, key=by_minutes)
+                if earlier
+                else min(later, key=by_minutes, default=None)
+            )
+            if slot is None:
+                break
+            if slot in slots:
+                target = slot.minutes
+                continue
+            if len(slots) == MAX_SEARCH_SLOTS:
+                logger.warning(
+                    f"[gray37]Search {MAX_SEARCH_SLOTS} time slots only, up to "
+                    f"{target // 60:02d}:{target % 60:02d}[/]",
+                    extra={"markup": True},
+                )
+                break
+            slots.append(slot)
+            target = slot.minutes + SEARCH_SLOT_MINUTES
+        return slots or [first]
+
+    def run(
+        self, slots: List[ThsrTime], session: PreparedSession = None
+    ) -> List[SlotResult]:
+        # The first slot goes through the flow's own client or prepared session.
+        clients = [session.client if session else self.client]
+        if len(slots) == 1:
+            return [self.search(slots[0], clients[0], session)]
+        logger.info(f"Search time slots {', '.join(slot.value for slot in slots)}")
+        clients += [HTTPRequest() for _ in slots[1:]]
+        sessions = [session] + [None] * (len(slots) - 1)
+        with ThreadPoolExecutor(
+            max_workers=len(slots), thread_name_prefix="slot-search"
+        ) as executor:
+            # Each search runs in a copy of this context, so that its spans
+            # nest under the running trace.
+            futures = [
+                executor.submit(copy_context().run, self.search, *args)
+                for args in zip(slots, clients, sessions)
+            ]
+            return [
+                self.result(slot, client, future)
+                for slot, client, future in zip(slots, clients, futures)
+            ]
+
+    def result(self, slot: ThsrTime, client: HTTPRequest, future: Future) -> SlotResult:
+        """The result of a slot search; a search that raised lists no trains."""
+        try:
+            return future.result()
+        except Exception as e:
+            error = Error(f"Search {slot.value} failed: {e}")
+            logger.warning(f"[gray37]{error.msg}[/]", extra={"markup": True})
+            return SlotResult(slot, client, ParsedPage.failed(error), {}, [])
+
+    def search(
+        self, slot: ThsrTime, client: HTTPRequest, session: PreparedSession | None
+    ) -> SlotResult:
+        conditions = self.conditions.model_copy(update={"thsr_time": slot.value})
+        page, passenger_info = InitPageFlow(client, conditions).run(session)
+        trains = [] if page.errors else self.parser.parse_trains(page.soup)
+        return SlotResult(slot, client, page, passenger_info, trains)
+
+    def choose(self, results: List[SlotResult]) -> Tuple[SlotResult, List[Train]]:
+        """
+        The trains of all the results, best first, and the result listing the
+        best one.
+        """
+        found = [result for result in results if not result.page.errors]
+        if not found:
+            return results[0], []
+        holders: Dict[int, SlotResult] = {}
+        trains: List[Train] = []
+        for result in found:
+            for train in result.trains:
+                if train.id not in holders:
+                    holders[train.id] = result
+                    trains.append(train)
+        trains.sort(key=lambda train: train.depart)
+        ranked = TrainSelector(self.conditions).rank(trains)
+        return (holders[ranked[0].id], ranked) if ranked else (found[0], [])
 
 
 class ConfirmTrainFlow(BaseFlow):
@@ -168,34 +374,88 @@ class ConfirmTrainFlow(BaseFlow):
         self,
         client: HTTPRequest,
         conditions: ConditionSettings,
-        booking_response: bytes,
+        train_list_page: ParsedPage,
+        trains: List[Train] = None,
+        ranked: List[Train] = None,
     ) -> None:
         super().__init__(client, conditions)
-        self.booking_response = booking_response
+        self.train_list_page = train_list_page
+        self.trains = trains
+        # The trains to fall back to, best first, when the chosen one fails.
+        self.ranked: List[Train] = ranked or []
+        self.selector = TrainSelector(conditions)
         self.parser = ConfirmTrainParser
 
-    def run(self) -> Tuple[bytes, ConfirmTrainModel | None]:
-        page = self.parser.html_to_soup(self.booking_response)
-        self.trains = self.parser.parse_trains(page)
+    def run(self, train: Train = None) -> Tuple[ParsedPage, ConfirmTrainModel | None]:
+        selected_train: Train = train or self.select_train()
+        if not selected_train:
+            return None, None
+        with timed("flow.ConfirmTrainFlow") as timer:
+            ticket_form_page, selected_train = self.confirm(selected_train)
+            record_page(timer, ticket_form_page, train=selected_train.id)
+        return ticket_form_page, selected_train
+
+    def confirm(
+        self, selected_train: Train, client: HTTPRequest = None
+    ) -> Tuple[ParsedPage, Train]:
+        """
+        Submit the train, then the next ranked ones while S2 rejects them.
+        The async flows run this in a thread, with their blocking `client`.
+        """
+        client = client or self.client
+        content = self.submit(selected_train, client)
+        ticket_form_page = ParsedPage(content, ConfirmTicketParser)
+        # A train that can't be booked any more gets the list back with an
+        # error; go down the ranking while the page still lists the trains.
+        tried = {selected_train.id}
+        while ticket_form_page.errors and len(tried) <= MAX_TRAIN_FALLBACKS:
+            train_list_page = ParsedPage(content, ConfirmTrainParser)
+            listed = {
+                train.id: train
+                for train in self.parser.parse_trains(train_list_page.soup)
+            }
+            fallback = next(
+                (
+                    listed[train.id]
+                    for train in self.ranked or [selected_train]
+                    if train.id in listed and train.id not in tried
+                ),
+                None,
+            )
+            if not fallback:
+                break
+            logger.warning(
+                f"[gray37]Train {selected_train.id} failed, try {fallback.id}[/]",
+                extra={"markup": True},
+            )
+            tried.add(fallback.id)
+            selected_train = fallback
+            content = self.submit(selected_train, client)
+            ticket_form_page = ParsedPage(content, ConfirmTicketParser)
+        return ticket_form_page, selected_train
+
+    def submit(self, train: Train, client: HTTPRequest) -> bytes:
+        dict_params = self.build_params(train)
+        return client.submit_train(dict_params).content
+
+    def select_train(self) -> Train | None:
+        if self.trains is None:
+            self.trains = self.parser.parse_trains(self.train_list_page.soup)
         selected_train: Train = self.choose_train()
         if not selected_train:
             logger.warning(
                 "[dodger_blue1]Error: No available train to select.",
                 extra={"markup": True},
             )
-            return None, None
-        confirm_model = ConfirmTrainModel(selected_train=selected_train.form_value)
-        dict_params = json.loads(confirm_model.json(by_alias=True))
-        confirm_response = self.client.submit_train(dict_params).content
-        return confirm_response, selected_train
+        return selected_train
+
+    def build_params(self, train: Train) -> str:
+        return train_form().render(selected_train=train.form_value)
 
-    def choose_train(self) -> Train:
-        for train in self.trains:
-            start_hour, end_hour = self.conditions.time_range
-            hour = int(train.depart.split(":")[0])
-            if start_hour <= hour <= end_hour:
-                return train
-        return None
+    def choose_train(self) -> Train | None:
+        """The best ranked train; the rest stay in `ranked` as fallbacks."""
+        self.ranked = self.selector.rank(self.trains)
+        return self.ranked[0] if self.ranked else None
 
 
 class ConfirmTicketFlow(BaseFlow):
@@ -204,32 +464,35 @@ class ConfirmTicketFlow(BaseFlow):
         client: HTTPRequest,
         conditions: ConditionSettings,
         user_settings: UserSettings,
-        train_response: bytes,
+        ticket_form_page: ParsedPage,
         passenger_info: Dict[PassengerType, int],
         train: Train,
     ) -> None:
         super().__init__(client, conditions)
         self.user_settings = user_settings
-        self.train_response = train_response
+        self.ticket_form_page = ticket_form_page
         self.passenger_info = passenger_info
         self.train = train
         self.parser = ConfirmTicketParser
 
-    def run(self) -> Tuple[bytes, Error | None]:
-        page = self.parser.html_to_soup(self.train_response)
-        ticket_model = ConfirmTicketModel(
-            personal_id=self.user_settings.personal_id,
-            phone_num=self.user_settings.phone_number,
-            member_radio=self.parser.parse_member_radio(page),
-        )
-        if email := self.user_settings.email:
-            ticket_model.email = email
+    def run(self) -> Tuple[ParsedPage, Error | None]:
+        if error := self.build_params():
+            return None, error
+        with timed("flow.ConfirmTicketFlow") as timer:
+            result_page = ParsedPage(
+                self.client.submit_ticket(self.params).content, BookingFlowParser
+            )
+            record_page(timer, result_page)
+        return result_page, None
 
-        self.params = json.loads(ticket_model.json(by_alias=True))
+    def build_params(self) -> Error | None:
+        page = self.ticket_form_page.soup
+        self.passenger_params: Dict[str, str] = {}
         if error := self.updated_passenger_id():
-            return None, error
-        ticket_response = self.client.submit_ticket(self.params).content
-        return ticket_response, None
+            return error
+        self.params = ticket_form(self.user_settings).render(
+            self.passenger_params, member_radio=self.parser.parse_member_radio(page)
+        )
 
     def updated_passenger_id(self) -> None:
         early_bird = EARLY_BIRD_KEY in self.train.discount_str
@@ -239,7 +502,7 @@ class ConfirmTicketFlow(BaseFlow):
 
         if early_bird or id_check_required:
             passenger_num = 0
-            self.params[
+            self.passenger_params[
                 f"TicketPassengerInfoInputPanel:passengerDataView:{passenger_num}:passengerDataView2:passengerDataInputChoice"
             ] = "0"
             for pass_type, passenger_count in self.passenger_info.items():
@@ -256,7 +519,7 @@ class ConfirmTicketFlow(BaseFlow):
 
                 for idx in range(passenger_count):
                     pass_id = pass_ids[idx] if use_pass_ids else ""
-                    self.params[
+                    self.passenger_params[
                         f"TicketPassengerInfoInputPanel:passengerDataView:{passenger_num}:passengerDataView2:passengerDataIdNumber"
                     ] = pass_id
 
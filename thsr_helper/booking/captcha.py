@@ -0,0 +1,200 @@
+from functools import cache
+from typing import Iterable, List, Tuple
+import io
+import logging
+import os
+import threading
+
+import numpy as np
+from PIL import Image
+
+from .constants import CAPTCHA_LENGTH, MODULE_DIR
+from .schema import CaptchaResult
+from thsr_helper.settings import settings
+
+logger = logging.getLogger(__name__)
+
+GLYPH_SIZE: Tuple[int, int] = (20, 24)
+
+_model_lock = threading.Lock()
+
+
+def to_gray(image: Image.Image) -> np.ndarray:
+    return np.asarray(image.convert("L"), dtype=np.float32) / 255.0
+
+
+def median_filter(gray: np.ndarray, size: int = 3) -> np.ndarray:
+    pad = size // 2
+    padded = np.pad(gray, pad, mode="edge")
+    windows = np.lib.stride_tricks.sliding_window_view(padded, (size, size))
+    return np.median(windows, axis=(-2, -1))
+
+
+def otsu_threshold(gray: np.ndarray) -> float:
+    hist, edges = np.histogram(gray, bins=256, range=(0.0, 1.0))
+    centers = (edges[:-1] + edges[1:]) / 2
+    weight_bg = np.cumsum(hist)
+    weight_fg = weight_bg[-1] - weight_bg
+    sum_bg = np.cumsum(hist * centers)
+    mean_bg = sum_bg / np.maximum(weight_bg, 1)
+    mean_fg = (sum_bg[-1] - sum_bg) / np.maximum(weight_fg, 1)
+    between = weight_bg * weight_fg * (mean_bg - mean_fg) ** 2
+    return float(centers[np.argmax(between)])
+
+
+def remove_arc(binary: np.ndarray, margin: float = 0.1, band: int = 2) -> np.ndarray:
+    """
+    Erase the thin arc drawn across the captcha.
+
+    The arc is first fitted with a parabola on the left and right margins, where
+    there are no characters, then refitted on the pixels close to it across the
+    whole width. Only thin vertical runs along the fitted curve are cleared.
+    """
+    height, width = binary.shape
+    xs_all = np.linspace(-1.0, 1.0, width)
+    edge = max(int(width * margin), 2)
+    cols = np.r_[0:edge, width - edge : width]
+    ys, xs = np.nonzero(binary[:, cols])
+    if len(np.unique(xs)) < 3:
+        return binary
+    curve = np.polyval(np.polyfit(xs_all[cols[xs]], ys, deg=2), xs_all)
+
+    rows = np.arange(height)[:, None]
+    for _ in range(2):
+        near = binary & (np.abs(rows - curve[None, :]) <= band * 2)
+        ys, xs = np.nonzero(near)
+        if len(np.unique(xs)) < 3:
+            break
+        curve = np.polyval(np.polyfit(xs_all[xs], ys, deg=2), xs_all)
+
+    distance = np.abs(rows - np.rint(curve)[None, :])
+    stroke = binary & (distance <= band)
+    # Characters cross the band with a thicker run than the arc itself.
+    thickness = (binary & (distance <= band * 3)).sum(axis=0)
+    thin = thickness <= stroke.sum(axis=0) + band
+    cleaned = binary.copy()
+    cleaned[stroke & thin[None, :]] = False
+    return cleaned
+
+
+def preprocess(image: Image.Image) -> np.ndarray:
+    gray = median_filter(to_gray(image))
+    binary = gray < otsu_threshold(gray)
+    binary = remove_arc(binary)
+    # Drop isolated noise pixels left by the threshold.
+    neighbours = median_filter(binary.astype(np.float32)) > 0.5
+    return binary & neighbours
+
+
+def _column_runs(mask: np.ndarray) -> List[Tuple[int, int]]:
+    padded = np.r_[False, mask, False].astype(np.int8)
+    changes = np.flatnonzero(np.diff(padded))
+    return list(zip(changes[::2], changes[1::2]))
+
+
+def segment(binary: np.ndarray, length: int = CAPTCHA_LENGTH) -> List[np.ndarray]:
+    runs = _column_runs(binary.sum(axis=0) > 0)
+    if not runs:
+        return []
+    # Merge the closest runs until there are not too many pieces.
+    while len(runs) > length:
+        gaps = [runs[i + 1][0] - runs[i][1] for i in range(len(runs) - 1)]
+        idx = int(np.argmin(gaps))
+        runs[idx : idx + 2] = [(runs[idx][0], runs[idx + 1][1])]
+    # Split the widest run in half until there are enough pieces.
+    while len(runs) < length:
+        idx = int(np.argmax([end - start for start, end in runs]))
+        start, end = runs[idx]
+        if end - start < 2:
+            break
+        middle = (start + end) // 2
+        runs[idx : idx + 1] = [(start, middle), (middle, end)]
+
+    glyphs = []
+    for start, end in runs:
+        piece = binary[:, start:end]
+        rows = np.flatnonzero(piece.any(axis=1))
+        if len(rows):
+            piece = piece[rows[0] : rows[-1] + 1]
+        glyph = Image.fromarray(piece.astype(np.uint8) * 255).resize(
+            GLYPH_SIZE, Image.BILINEAR
+        )
+        glyphs.append(np.asarray(glyph, dtype=np.float32).ravel() / 255.0)
+    return glyphs
+
+
+def _normalize(vectors: np.ndarray) -> np.ndarray:
+    vectors = vectors - vectors.mean(axis=-1, keepdims=True)
+    norms = np.linalg.norm(vectors, axis=-1, keepdims=True)
+    return vectors / np.maximum(norms, 1e-6)
+
+
+class CaptchaModel:
+    """Nearest-centroid classifier over segmented glyphs."""
+
+    def __init__(self, centroids: np.ndarray, labels: str) -> None:
+        self.centroids = _normalize(centroids)
+        self.labels = labels
+
+    @classmethod
+    def train(cls, samples: Iterable[Tuple[Image.Image, str]]) -> "CaptchaModel":
+        sums: dict[str, np.ndarray] = {}
+        counts: dict[str, int] = {}
+        for image, code in samples:
+            glyphs = segment(preprocess(image), len(code))
+            if len(glyphs) != len(code):
+                continue
+            for char, glyph in zip(code.upper(), glyphs):
+                sums[char] = sums.get(char, 0) + glyph
+                counts[char] = counts.get(char, 0) + 1
+        labels = "".join(sorted(sums))
+        centroids = np.stack([sums[char] / counts[char] for char in labels])
+        return cls(centroids, labels)
+
+    @classmethod
+    def load(cls, path: str) -> "CaptchaModel":
+        with np.load(path) as data:
+            return cls(data["centroids"], str(data["labels"]))
+
+    def save(self, path: str) -> None:
+        os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        np.savez_compressed(path, centroids=self.centroids, labels=self.labels)
+
+    def predict(self, image: Image.Image) -> CaptchaResult:
+        glyphs = segment(preprocess(image))
+        if not glyphs:
+            return CaptchaResult("", 0.0)
+        scores = _normalize(np.stack(glyphs)) @ self.centroids.T
+        best = np.argsort(scores, axis=1)[:, ::-1]
+        rows = np.arange(len(glyphs))
+        top = scores[rows, best[:, 0]]
+        # A model of one label has no runner-up to beat.
+        second = scores[rows, best[:, 1]] if len(self.labels) > 1 else 0.0
+        # Confidence of each char is how clearly it beats the runner-up.
+        char_confidence = np.clip((top - second) / np.maximum(top, 1e-6), 0, 1)
+        code = "".join(self.labels[idx] for idx in best[:, 0])
+        return CaptchaResult(code, float(char_confidence.min()))
+
+
+@cache
+def _load_captcha_model() -> CaptchaModel:
+    path = os.path.join(MODULE_DIR, settings.captcha_model_path)
+    if not os.path.exists(path):
+        raise FileNotFoundError(
+            f"Captcha model not found: {path}. Train one with "
+            "`python -m benchmarks.captcha_solver --save`, point "
+            "CAPTCHA_MODEL_PATH to it, or set is_manual = true."
+        )
+    return CaptchaModel.load(path)
+
+
+def get_captcha_model() -> CaptchaModel:
+    # The slot searches solve their captchas at once; load the model only once.
+    with _model_lock:
+        return _load_captcha_model()
+
+
+def solve_captcha(img_resp: bytes) -> CaptchaResult:
+    model = get_captcha_model()
+    with Image.open(io.BytesIO(img_resp)) as image:
+        return model.predict(image)
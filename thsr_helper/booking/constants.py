@@ -2,13 +2,22 @@ from enum import Enum, unique
 import os
 import pytz
 
+from thsr_helper.settings import settings
+
 
 class HTTPConfig:
-    BASE_URL = "https://irs.thsrc.com.tw"
-    BOOKING_PAGE_URL = "https://irs.thsrc.com.tw/IMINT/?locale=tw"
-    SUBMIT_FORM_URL = "https://irs.thsrc.com.tw/IMINT/;jsessionid={}?wicket:interface=:0:BookingS1Form::IFormSubmitListener"
-    CONFIRM_TRAIN_URL = "https://irs.thsrc.com.tw/IMINT/?wicket:interface=:1:BookingS2Form::IFormSubmitListener"
-    CONFIRM_TICKET_URL = "https://irs.thsrc.com.tw/IMINT/?wicket:interface=:2:BookingS3Form::IFormSubmitListener"
+    BASE_URL = settings.base_url
+    BOOKING_PAGE_URL = BASE_URL + "/IMINT/?locale=tw"
+    SUBMIT_FORM_URL = (
+        BASE_URL
+        + "/IMINT/;jsessionid={}?wicket:interface=:0:BookingS1Form::IFormSubmitListener"
+    )
+    CONFIRM_TRAIN_URL = (
+        BASE_URL + "/IMINT/?wicket:interface=:1:BookingS2Form::IFormSubmitListener"
+    )
+    CONFIRM_TICKET_URL = (
+        BASE_URL + "/IMINT/?wicket:interface=:2:BookingS3Form::IFormSubmitListener"
+    )
 
     class HTTPHeader:
         USER_AGENT = "Mozilla/5.0 (Macintosh; Intel Mac OS X 10_15_7) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/134.0.0.0 Safari/537.36"
@@ -50,6 +59,22 @@ STATION_MAP = {
     Stations.Zuouing: 12,
 }
 
+# Station names as they appear on the booking result page.
+STATION_NAME_MAP = {
+    Stations.Nangang: "南港",
+    Stations.Taipei: "台北",
+    Stations.Banqiao: "板橋",
+    Stations.Taoyuan: "桃園",
+    Stations.Hsinchu: "新竹",
+    Stations.Miaoli: "苗栗",
+    Stations.Taichung: "台中",
+    Stations.Changhua: "彰化",
+    Stations.Yunlin: "雲林",
+    Stations.Chiayi: "嘉義",
+    Stations.Tainan: "台南",
+    Stations.Zuouing: "左營",
+}
+
 
 @unique
 class PassengerType(Enum):
@@ -68,8 +93,28 @@ PASSENGER_TYPE_MAP = {
     PassengerType.COLLEGE: "P",
 }
 
+# Tickets go on sale this many days before the travel date, at midnight.
+BOOKING_WINDOW_DAYS = 28
+
+CAPTCHA_CHARS = "2345679ACFHKMNQRTYZ"
+CAPTCHA_LENGTH = 4
+
 CHECK_ID_TYPE = [PassengerType.DISABLED, PassengerType.ELDER]
 EARLY_BIRD_KEY = "早鳥"
+# Shown in the error panel when the booking system is overloaded.
+BUSY_KEY = "忙碌"
+SOLD_OUT_KEY = "查無可售車次"
+
+# `booking watch` polls this many times slower at night, Asia/Taipei hours.
+QUIET_HOURS = range(1, 6)
+QUIET_HOURS_FACTOR = 4
+
+# A search result page is taken to list the trains of this many minutes from
+# its time slot; covering a time_range takes at most this many searches.
+SEARCH_SLOT_MINUTES = 120
+MAX_SEARCH_SLOTS = 4
+# Other ranked trains tried when the S2 submit of the chosen one fails.
+MAX_TRAIN_FALLBACKS = 2
 
 
 @unique
@@ -113,6 +158,12 @@ class ThsrTime(str, Enum):
     P1100 = "1100P"
     P1130 = "1130P"
 
+    @property
+    def minutes(self) -> int:
+        """Minute of the day, e.g. 1201A -> 1, 1200N -> 720, 130P -> 810."""
+        hour, minute = divmod(int(self.value[:-1]), 100)
+        return (hour % 12 + (12 if self.value[-1] in "NP" else 0)) * 60 + minute
+
 
 @unique
 class TrainRequirement(str, Enum):
@@ -121,5 +172,68 @@ class TrainRequirement(str, Enum):
     NORMAL = "2"
 
 
+@unique
+class HTMLParserBackend(str, Enum):
+    HTML_PARSER = "html.parser"
+    LXML = "lxml"
+
+
+@unique
+class OutputFormat(str, Enum):
+    TABLE = "table"
+    JSONL = "jsonl"
+    CSV = "csv"
+
+
+@unique
+class MetricsFormat(str, Enum):
+    PROMETHEUS = "prometheus"
+    JSON = "json"
+
+
+@unique
+class TraceFormat(str, Enum):
+    CHROME = "chrome"
+    OTLP = "otlp"
+
+
+@unique
+class ImportFormat(str, Enum):
+    CSV = "csv"
+    JSONL = "jsonl"
+
+
+@unique
+class Endpoint(str, Enum):
+    BOOKING_PAGE = "booking_page"
+    CAPTCHA = "captcha"
+    S1 = "s1"
+    S2 = "s2"
+    S3 = "s3"
+
+
+# Requests per second and burst size allowed for each endpoint, shared by
+# every session of the process.
+RATE_LIMITS = {
+    Endpoint.BOOKING_PAGE: (2.0, 4),
+    Endpoint.CAPTCHA: (2.0, 4),
+    Endpoint.S1: (2.0, 4),
+    Endpoint.S2: (1.0, 2),
+    Endpoint.S3: (1.0, 2),
+}
+
+
+@unique
+class JobStatus(str, Enum):
+    BOOKED = "booked"
+    FAILED = "failed"
+
+
+@unique
+class HistoryBackend(str, Enum):
+    TINYDB = "tinydb"
+    SQLITE = "sqlite"
+
+
 MODULE_DIR = os.path.dirname(os.path.abspath(__file__ + "/.."))
 TIMEZONE = pytz.timezone("Asia/Taipei")
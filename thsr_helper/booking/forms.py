@@ -0,0 +1,110 @@
+from functools import lru_cache
+from typing import Any, List, Mapping, Tuple
+from urllib.parse import quote_plus, urlencode
+import json
+
+from pydantic import BaseModel
+
+from .constants import PASSENGER_TYPE_MAP, STATION_MAP, PassengerType
+from .schema import BookingModel, ConfirmTicketModel, ConfirmTrainModel
+from thsr_helper.config.settings import ConditionSettings, UserSettings
+from thsr_helper.config.validate import parse_date
+
+
+class FormTemplate:
+    """
+    A booking form with its static fields validated and URL-encoded up front.
+
+    `render` only encodes the dynamic fields and returns the query string the
+    requests would build from the form dict, fields in the model order.
+    """
+
+    def __init__(self, model: BaseModel, dynamic: Tuple[str, ...] = ()) -> None:
+        values = json.loads(model.json(by_alias=True))
+        # (prefix, dynamic field): static segments are encoded in full.
+        self.segments: List[Tuple[str, str | None]] = []
+        for name, field in type(model).model_fields.items():
+            alias = field.serialization_alias or name
+            if name in dynamic:
+                self.segments.append((f"{quote_plus(alias)}=", name))
+            else:
+                self.segments.append((urlencode({alias: values[alias]}), None))
+
+    def render(self, extra: Mapping[str, Any] = None, **values: Any) -> str:
+        parts = [
+            prefix if name is None else prefix + quote_plus(str(values[name]))
+            for prefix, name in self.segments
+        ]
+        if extra:
+            parts.append(urlencode(extra))
+        return "&".join(parts)
+
+
+def convert_ticket_num(ticket_num: int, passenger_type: PassengerType) -> str:
+    return f"{ticket_num}{PASSENGER_TYPE_MAP.get(passenger_type)}"
+
+
+@lru_cache(maxsize=32)
+def _booking_form(conditions_json: str) -> FormTemplate:
+    conditions = ConditionSettings.model_validate_json(conditions_json)
+    ticket_nums = {
+        f"{pass_type.value}_ticket_num": convert_ticket_num(
+            getattr(conditions, f"{pass_type.value}_ticket_num") or 0, pass_type
+        )
+        for pass_type in PassengerType
+    }
+    model = BookingModel(
+        start_station=STATION_MAP.get(conditions.start_station),
+        dest_station=STATION_MAP.get(conditions.dest_station),
+        outbound_time=conditions.thsr_time,
+        outbound_date=conditions.date,
+        train_requirement=int(conditions.train_requirement) or 0,
+        # Read from the booking page or the captcha, filled in by render.
+        seat_prefer="",
+        types_of_trip=0,
+        search_by="",
+        security_code="",
+        **ticket_nums,
+    )
+    return FormTemplate(
+        model, dynamic=("seat_prefer", "types_of_trip", "search_by", "security_code")
+    )
+
+
+@lru_cache(maxsize=32)
+def _ticket_form(user_json: str) -> FormTemplate:
+    user = UserSettings.model_validate_json(user_json)
+    model = ConfirmTicketModel(
+        personal_id=user.personal_id,
+        phone_num=user.phone_number,
+        member_radio="",
+    )
+    if user.email:
+        model.email = user.email
+    return FormTemplate(model, dynamic=("member_radio",))
+
+
+def booking_form(conditions: ConditionSettings) -> FormTemplate:
+    """S1 form; fill in seat_prefer, types_of_trip, search_by, security_code."""
+    try:
+        dated = parse_date(conditions.date) is not None
+    except ValueError:
+        dated = True  # BookingModel rejects it, nothing gets cached.
+    if not dated:
+        # BookingModel books today then, which a cached form would keep
+        # past midnight.
+        return _booking_form.__wrapped__(conditions.model_dump_json())
+    return _booking_form(conditions.model_dump_json())
+
+
+@lru_cache(maxsize=1)
+def train_form() -> FormTemplate:
+    """S2 form; fill in selected_train."""
+    return FormTemplate(
+        ConfirmTrainModel(selected_train=""), dynamic=("selected_train",)
+    )
+
+
+def ticket_form(user: UserSettings) -> FormTemplate:
+    """S3 form; fill in member_radio, passenger IDs go in `extra`."""
+    return _ticket_form(user.model_dump_json())
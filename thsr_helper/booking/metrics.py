@@ -0,0 +1,296 @@
+from bisect import bisect_left
+from contextlib import contextmanager
+from typing import Dict, Iterator, List, Tuple
+import json
+import logging
+import os
+import threading
+import time
+
+from .constants import MetricsFormat
+from .rate_limit import get_rate_limiter
+from .tracing import Span, start_span
+
+logger = logging.getLogger(__name__)
+
+# Upper bounds in seconds of the latency histogram buckets, +Inf implied.
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30)
+PREFIX = "thsr_helper_stage"
+RATE_LIMIT_PREFIX = "thsr_helper_rate_limit"
+
+
+class Histogram:
+    def __init__(self) -> None:
+        self.counts = [0] * (len(LATENCY_BUCKETS) + 1)
+        self.sum = 0.0
+        self.count = 0
+
+    def observe(self, seconds: float) -> None:
+        self.counts[bisect_left(LATENCY_BUCKETS, seconds)] += 1
+        self.sum += seconds
+        self.count += 1
+
+    def cumulative(self) -> List[Tuple[str, int]]:
+        """(le, count) pairs as Prometheus exposes them."""
+        pairs, total = [], 0
+        for bound, count in zip((*LATENCY_BUCKETS, "+Inf"), self.counts):
+            total += count
+            pairs.append((str(bound), total))
+        return pairs
+
+
+class Metrics:
+    """
+    Latency histograms, bytes and outcome counters per stage of an attempt:
+    `http.<endpoint>`, `parse.<parser>`, `captcha.solve` and `flow.<step>`.
+    The state of the shared rate limiter, if on, is exported with them.
+    """
+
+    def __init__(self) -> None:
+        self.latency: Dict[str, Histogram] = {}
+        self.bytes: Dict[str, int] = {}
+        self.outcomes: Dict[Tuple[str, str], int] = {}
+        self._lock = threading.Lock()
+
+    def record(
+        self, stage: str, seconds: float, outcome: str = "ok", size: int = 0
+    ) -> None:
+        with self._lock:
+            if stage not in self.latency:
+                self.latency[stage] = Histogram()
+                self.bytes[stage] = 0
+            self.latency[stage].observe(seconds)
+            self.bytes[stage] += size
+            self.outcomes[stage, outcome] = self.outcomes.get((stage, outcome), 0) + 1
+
+    def snapshot(self) -> dict[str, any]:
+        with self._lock:
+            stages = {}
+            for stage, histogram in sorted(self.latency.items()):
+                stages[stage] = {
+                    "count": histogram.count,
+                    "sum_seconds": histogram.sum,
+                    "buckets": dict(histogram.cumulative()),
+                    "bytes": self.bytes[stage],
+                    "outcomes": {
+                        outcome: count
+                        for (name, outcome), count in sorted(self.outcomes.items())
+                        if name == stage
+                    },
+                }
+        snapshot = {"created_at": time.time(), "stages": stages}
+        if rate_limiter := get_rate_limiter():
+            state = rate_limiter.snapshot()
+            snapshot["rate_limiter"] = {
+                "backoff_seconds": state.backoff,
+                "blocked_seconds": state.blocked_for,
+                "endpoints": {
+                    endpoint.value: endpoint_state._asdict()
+                    for endpoint, endpoint_state in state.endpoints.items()
+                },
+            }
+        return snapshot
+
+    def to_prometheus(self) -> str:
+        exported = self.snapshot()
+        snapshot = exported["stages"]
+        lines = [
+            f"# HELP {PREFIX}_seconds Time spent in a booking stage.",
+            f"# TYPE {PREFIX}_seconds histogram",
+        ]
+        for stage, data in snapshot.items():
+            for le, count in data["buckets"].items():
+                lines.append(
+                    f'{PREFIX}_seconds_bucket{{stage="{stage}",le="{le}"}} {count}'
+                )
+            lines.append(
+                f'{PREFIX}_seconds_sum{{stage="{stage}"}} {data["sum_seconds"]}'
+            )
+            lines.append(f'{PREFIX}_seconds_count{{stage="{stage}"}} {data["count"]}')
+        lines += [
+            f"# HELP {PREFIX}_bytes_total Response bytes received in a booking stage.",
+            f"# TYPE {PREFIX}_bytes_total counter",
+        ]
+        for stage, data in snapshot.items():
+            lines.append(f'{PREFIX}_bytes_total{{stage="{stage}"}} {data["bytes"]}')
+        lines += [
+            f"# HELP {PREFIX}_total Booking stages run, by outcome.",
+            f"# TYPE {PREFIX}_total counter",
+        ]
+        for stage, data in snapshot.items():
+            for outcome, count in data["outcomes"].items():
+                lines.append(
+                    f'{PREFIX}_total{{stage="{stage}",outcome="{outcome}"}} {count}'
+                )
+        if rate_limiter := exported.get("rate_limiter"):
+            lines += rate_limiter_lines(rate_limiter)
+        return "\n".join(lines) + "\n"
+
+    def export(self, path: str, output_format: MetricsFormat) -> None:
+        """Write the file whole, so a collector never reads half of it."""
+        if output_format == MetricsFormat.JSON:
+            content = json.dumps(self.snapshot(), indent=2)
+        else:
+            content = self.to_prometheus()
+        tmp_path = f"{path}.tmp"
+        with open(tmp_path, mode="wt", encoding="utf-8") as fp:
+            fp.write(content)
+        os.replace(tmp_path, path)
+
+
+def rate_limiter_lines(state: dict[str, any]) -> List[str]:
+    prefix = RATE_LIMIT_PREFIX
+    lines = [
+        f"# HELP {prefix}_backoff_seconds Pause doubled on every throttled response.",
+        f"# TYPE {prefix}_backoff_seconds gauge",
+        f"{prefix}_backoff_seconds {state['backoff_seconds']}",
+        f"# HELP {prefix}_blocked_seconds Time left before the next request may go.",
+        f"# TYPE {prefix}_blocked_seconds gauge",
+        f"{prefix}_blocked_seconds {state['blocked_seconds']}",
+    ]
+    for field, kind, help_text in (
+        ("tokens", "gauge", "Requests an endpoint may send right away."),
+        ("requests", "counter", "Requests paced by the rate limiter."),
+        ("throttled", "counter", "Throttled responses of an endpoint."),
+    ):
+        name = f"{prefix}_{field}" + ("_total" if kind == "counter" else "")
+        lines += [f"# HELP {name} {help_text}", f"# TYPE {name} {kind}"]
+        for endpoint, endpoint_state in state["endpoints"].items():
+            lines.append(f'{name}{{endpoint="{endpoint}"}} {endpoint_state[field]}')
+    return lines
+
+
+class Timer:
+    """
+    Time a stage, for the metrics and as a span of the running trace; set
+    `outcome` and `size` before it ends, and span attributes with `set`.
+    """
+
+    __slots__ = ("metrics", "span", "stage", "outcome", "size", "started")
+    enabled = True
+
+    def __init__(self, metrics: Metrics | None, span: Span | None, stage: str) -> None:
+        self.metrics = metrics
+        self.span = span
+        self.stage = stage
+        self.outcome = "ok"
+        self.size = 0
+
+    def set(self, key: str, value: any) -> None:
+        if self.span:
+            self.span.attributes[key] = value
+
+    def __enter__(self) -> "Timer":
+        if self.span:
+            self.span.start()
+        self.started = time.perf_counter()
+        return self
+
+    def __exit__(self, exc_type, exc, tb) -> None:
+        elapsed = time.perf_counter() - self.started
+        if exc_type is not None:
+            self.outcome = "error"
+        if self.metrics:
+            self.metrics.record(self.stage, elapsed, self.outcome, self.size)
+        if self.span:
+            self.span.attributes["outcome"] = self.outcome
+            if self.size:
+                self.span.attributes["size"] = self.size
+            self.span.end(exc)
+
+
+class _NoTimer:
+    """Stands in for Timer when nothing records; setting fields does nothing."""
+
+    __slots__ = ()
+    enabled = False
+
+    def set(self, key: str, value: any) -> None:
+        return None
+
+    def __enter__(self) -> "_NoTimer":
+        return self
+
+    def __exit__(self, exc_type, exc, tb) -> None:
+        return None
+
+    def __setattr__(self, name: str, value: any) -> None:
+        return None
+
+
+_NO_TIMER = _NoTimer()
+_metrics: Metrics | None = None
+
+
+def use_metrics(metrics: Metrics | None) -> None:
+    """Set the registry the stages record to; None (the default) turns it off."""
+    global _metrics
+    _metrics = metrics
+
+
+def get_metrics() -> Metrics | None:
+    return _metrics
+
+
+def timed(stage: str, root: bool = False) -> Timer | _NoTimer:
+    """Time a stage; a `root` stage starts a trace when there is none running."""
+    span = start_span(stage, root)
+    if _metrics is None and span is None:
+        return _NO_TIMER
+    return Timer(_metrics, span, stage)
+
+
+class MetricsExporter:
+    """Export the metrics every `interval` seconds and once more on stop."""
+
+    def __init__(
+        self,
+        metrics: Metrics,
+        path: str,
+        output_format: MetricsFormat,
+        interval: float = 60,
+    ) -> None:
+        self.metrics = metrics
+        self.path = path
+        self.output_format = output_format
+        self.interval = interval
+        self._stopped = threading.Event()
+        self._thread = threading.Thread(
+            target=self._run, name="metrics-exporter", daemon=True
+        )
+
+    def start(self) -> None:
+        self._thread.start()
+
+    def stop(self) -> None:
+        self._stopped.set()
+        self._thread.join()
+        self.metrics.export(self.path, self.output_format)
+
+    def _run(self) -> None:
+        while not self._stopped.wait(self.interval):
+            try:
+                self.metrics.export(self.path, self.output_format)
+            except OSError as e:
+                logger.warning(
+                    f"[gray37]Failed to export metrics: {e}[/]", extra={"markup": True}
+                )
+
+
+@contextmanager
+def export_metrics(
+    path: str | None, output_format: MetricsFormat, interval: float
+) -> Iterator[Metrics | None]:
+    """Record the stages run inside to `path`; without a path, record nothing."""
+    if not path:
+        yield None
+        return
+    metrics = Metrics()
+    exporter = MetricsExporter(metrics, path, output_format, interval)
+    use_metrics(metrics)
+    exporter.start()
+    try:
+        yield metrics
+    finally:
+        use_metrics(None)
+        exporter.stop()
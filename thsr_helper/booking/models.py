@@ -1,16 +1,110 @@
-from typing import Mapping, Iterable, Any
+from contextlib import closing, contextmanager
+from functools import reduce
+from typing import Iterator
+import abc
+import logging
+import operator
 import os
+import sqlite3
 
 from tinydb import TinyDB, Query
-from tinydb.database import Document
 import typer
 
-from thsr_helper.booking.constants import MODULE_DIR
+from thsr_helper.booking.constants import MODULE_DIR, HistoryBackend, OutputFormat
+from thsr_helper.settings import settings
 from .schema import Record
-from .utils import show_ticket
+from .utils import show_tickets, write_csv, write_jsonl
 
+logger = logging.getLogger(__name__)
 
-class TinyDBManager:
+
+class HistoryManager(metaclass=abc.ABCMeta):
+    """
+    Booking history storage.
+
+    `params` of get_history take `start_ts` and `end_ts`, and optionally
+    `ticket_id`, `station` (start or destination) and `train_id`.
+    """
+
+    def get_history(
+        self, params: dict[str], output_format: OutputFormat = OutputFormat.TABLE
+    ) -> None:
+        records = self.search(params)
+        if output_format == OutputFormat.JSONL:
+            write_jsonl(records)
+        elif output_format == OutputFormat.CSV:
+            write_csv(records)
+        else:
+            show_tickets(records)
+
+    @abc.abstractmethod
+    def search(self, params: dict[str]) -> Iterator[Record]:
+        """Yield the matching records as they are read."""
+
+    @abc.abstractmethod
+    def save(self, record: Record) -> None: ...
+
+
+class FingerprintIndex:
+    """
+    Fingerprints of the records in a TinyDB history file, kept in SQLite next
+    to it so a duplicate check doesn't have to load the history.
+
+    The index remembers the inode, size and mtime of the history file it
+    matches and is rebuilt when the file was changed by anything else; an
+    editor that saves by replacing the file gives it a new inode even when
+    the size and mtime come out the same.
+    """
+
+    schema = """
+        CREATE TABLE IF NOT EXISTS fingerprints (fingerprint TEXT PRIMARY KEY);
+        CREATE TABLE IF NOT EXISTS meta (key TEXT PRIMARY KEY, value TEXT);
+    """
+
+    def __init__(self, history_path: str) -> None:
+        self.history_path = history_path
+        self.path = os.path.splitext(history_path)[0] + ".fingerprints"
+
+    @contextmanager
+    def connect(self) -> Iterator[sqlite3.Connection]:
+        with closing(sqlite3.connect(self.path)) as conn, conn:
+            conn.executescript(self.schema)
+            self.sync(conn)
+            yield conn
+
+    def sync(self, conn: sqlite3.Connection) -> None:
+        row = conn.execute("SELECT value FROM meta WHERE key = 'stamp'").fetchone()
+        if row and row[0] == self.history_stamp():
+            return
+        conn.execute("DELETE FROM fingerprints")
+        if os.path.exists(self.history_path):
+            with TinyDB(self.history_path, access_mode="r") as db:
+                fingerprints = [(Record(**doc).fingerprint,) for doc in db.all()]
+            conn.executemany(
+                "INSERT OR IGNORE INTO fingerprints VALUES (?)", fingerprints
+            )
+        self.mark_synced(conn)
+
+    def add(self, conn: sqlite3.Connection, fingerprint: str) -> bool:
+        """Add a fingerprint; False if it was already there."""
+        cursor = conn.execute(
+            "INSERT OR IGNORE INTO fingerprints VALUES (?)", (fingerprint,)
+        )
+        return cursor.rowcount == 1
+
+    def mark_synced(self, conn: sqlite3.Connection) -> None:
+        conn.execute(
+            "INSERT OR REPLACE INTO meta VALUES ('stamp', ?)", (self.history_stamp(),)
+        )
+
+    def history_stamp(self) -> str:
+        if not os.path.exists(self.history_path):
+            return ""
+        stat = os.stat(self.history_path)
+        return f"{stat.st_ino}:{stat.st_size}:{stat.st_mtime_ns}"
+
+
+class TinyDBManager(HistoryManager):
     def __init__(self, db_path: str = None):
         if db_path is None:
             db_path = os.path.join(MODULE_DIR, ".db", "history.json")
@@ -18,32 +112,145 @@ class TinyDBManager:
         db_dir = db_path[: db_path.rfind("/")]
         if not os.path.exists(db_dir):
             os.makedirs(db_dir)
+        self.index = FingerprintIndex(db_path)
 
-    def get_history(self, params: dict[str]):
+    def search(self, params: dict[str]) -> Iterator[Record]:
+        q = Query()
+        conditions = [
+            q.date_ts > params.get("start_ts"),
+            q.date_ts < params.get("end_ts"),
+        ]
+        if ticket_id := params.get("ticket_id"):
+            conditions.append(q.id == ticket_id)
+        if station := params.get("station"):
+            conditions.append(
+                (q.start_station == station) | (q.dest_station == station)
+            )
+        if train_id := params.get("train_id"):
+            conditions.append(q.train_id == train_id)
+
+        query = reduce(operator.and_, conditions)
         with TinyDB(self.db_path, sort_keys=True, indent=4) as db:
-            q = Query()
-            docs = db.search(
-                (q.date_ts > params.get("start_ts"))
-                & (q.date_ts < params.get("end_ts"))
+            for doc in db:
+                if query(doc):
+                    yield Record(**doc)
+
+    def save(self, record: Record) -> None:
+        with self.index.connect() as conn:
+            if not self.index.add(conn, record.fingerprint):
+                return
+            with TinyDB(self.db_path, sort_keys=True, indent=4) as db:
+                db.insert(record._asdict())
+            self.index.mark_synced(conn)
+
+
+class SQLiteManager(HistoryManager):
+    """
+    Booking history in SQLite, indexed on the columns `booking ls` filters by.
+
+    When the database is first created, an existing TinyDB history is migrated
+    into it.
+    """
+
+    schema = """
+        CREATE TABLE IF NOT EXISTS history (
+            id TEXT NOT NULL,
+            price TEXT,
+            start_station TEXT,
+            dest_station TEXT,
+            train_id TEXT,
+            depart_time TEXT,
+            arrival_time TEXT,
+            date TEXT,
+            payment_deadline TEXT,
+            ticket_num_info TEXT,
+            personal_id TEXT NOT NULL,
+            date_ts REAL NOT NULL,
+            fingerprint TEXT NOT NULL UNIQUE
+        );
+        CREATE INDEX IF NOT EXISTS history_date_ts ON history (date_ts);
+        CREATE INDEX IF NOT EXISTS history_personal_id ON history (personal_id);
+        CREATE INDEX IF NOT EXISTS history_id ON history (id);
+        CREATE INDEX IF NOT EXISTS history_start_station ON history (start_station);
+        CREATE INDEX IF NOT EXISTS history_dest_station ON history (dest_station);
+        CREATE INDEX IF NOT EXISTS history_train_id ON history (train_id);
+    """
+    columns = ", ".join(Record._fields)
+    insert_sql = (
+        f"INSERT OR IGNORE INTO history ({columns}, fingerprint) "
+        f"VALUES ({', '.join('?' for _ in Record._fields)}, ?)"
+    )
+
+    def __init__(self, db_path: str = None, tinydb_path: str = None):
+        if db_path is None:
+            db_path = os.path.join(MODULE_DIR, ".db", "history.sqlite3")
+        if tinydb_path is None:
+            tinydb_path = os.path.join(MODULE_DIR, ".db", "history.json")
+        self.db_path = db_path
+        os.makedirs(os.path.dirname(os.path.abspath(db_path)), exist_ok=True)
+
+        created = not os.path.exists(db_path)
+        with self.connect() as conn:
+            conn.executescript(self.schema)
+        if created and os.path.exists(tinydb_path):
+            self.migrate(tinydb_path)
+
+    @contextmanager
+    def connect(self) -> Iterator[sqlite3.Connection]:
+        with closing(sqlite3.connect(self.db_path)) as conn, conn:
+            yield conn
+
+    def migrate(self, tinydb_path: str) -> int:
+        """Copy the records of a TinyDB history file, skipping duplicates."""
+        with TinyDB(tinydb_path, access_mode="r") as db:
+            records = [Record(**doc) for doc in db.all()]
+        with self.connect() as conn:
+            conn.executemany(
+                self.insert_sql, (record + (record.fingerprint,) for record in records)
             )
-            records: list[Record] = [Record(**doc) for doc in docs]
-            for record in records:
-                show_ticket(record)
-                typer.secho("=" * 80, fg=typer.colors.BRIGHT_WHITE)
+        typer.secho(
+            f"Migrated {len(records)} records from {tinydb_path}",
+            fg=typer.colors.BRIGHT_CYAN,
+            err=True,
+        )
+        return len(records)
+
+    def search(self, params: dict[str]) -> Iterator[Record]:
+        clauses = ["date_ts > ?", "date_ts < ?"]
+        args = [params.get("start_ts"), params.get("end_ts")]
+        if ticket_id := params.get("ticket_id"):
+            clauses.append("id = ?")
+            args.append(ticket_id)
+        if station := params.get("station"):
+            clauses.append("(start_station = ? OR dest_station = ?)")
+            args += [station, station]
+        if train_id := params.get("train_id"):
+            clauses.append("train_id = ?")
+            args.append(train_id)
+
+        sql = (
+            f"SELECT {self.columns} FROM history WHERE {' AND '.join(clauses)} "
+            "ORDER BY date_ts"
+        )
+        with self.connect() as conn:
+            for row in conn.execute(sql, args):
+                yield Record(*row)
 
     def save(self, record: Record) -> None:
-        data = record._asdict()
+        with self.connect() as conn:
+            conn.execute(self.insert_sql, record + (record.fingerprint,))
 
-        with TinyDB(self.db_path, sort_keys=True, indent=4) as db:
-            hist = db.search(Query().personal_id == record.personal_id)
-            if self._compare_history(data, hist) is None:
-                db.insert(data)
-
-    def _compare_history(
-        self, data: Mapping[str, Any], hist: Iterable[Document]
-    ) -> int:
-        for idx, h in enumerate(hist):
-            comp = [h[k] for k in data.keys() if h[k] == data[k]]
-            if len(comp) == len(data):
-                return idx
-        return None
+
+def get_history_manager() -> HistoryManager:
+    try:
+        backend = HistoryBackend(settings.history_backend)
+    except ValueError:
+        logger.warning(
+            f"[gray37]Unknown history backend: {settings.history_backend}, "
+            f"use {HistoryBackend.TINYDB.value} instead[/]",
+            extra={"markup": True},
+        )
+        backend = HistoryBackend.TINYDB
+    if backend == HistoryBackend.SQLITE:
+        return SQLiteManager()
+    return TinyDBManager()
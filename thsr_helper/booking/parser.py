@@ -1,17 +1,143 @@
 import abc
-from typing import Mapping, Any, List
+import codecs
+from functools import cache
+from html.parser import HTMLParser
+from importlib.util import find_spec
+from typing import Mapping, Any, List, Tuple, Type
+import logging
 
-from bs4 import BeautifulSoup
+from bs4 import BeautifulSoup, SoupStrainer
 from bs4.element import Tag
 
-from .constants import HTTPConfig
+from .constants import HTTPConfig, HTMLParserBackend
+from .metrics import timed
 from .schema import Train, Ticket, Error
+from thsr_helper.settings import settings
+
+logger = logging.getLogger(__name__)
+
+
+@cache
+def get_parser_backend() -> HTMLParserBackend:
+    try:
+        backend = HTMLParserBackend(settings.html_parser)
+    except ValueError:
+        logger.warning(
+            f"[gray37]Unknown HTML parser: {settings.html_parser}, "
+            f"use {HTMLParserBackend.HTML_PARSER.value} instead[/]",
+            extra={"markup": True},
+        )
+        return HTMLParserBackend.HTML_PARSER
+    if backend == HTMLParserBackend.LXML and find_spec("lxml") is None:
+        logger.warning(
+            "[gray37]lxml is not installed, "
+            f"use {HTMLParserBackend.HTML_PARSER.value} instead[/]",
+            extra={"markup": True},
+        )
+        return HTMLParserBackend.HTML_PARSER
+    return backend
+
+
+def _compile_fragment(
+    fragment: Mapping[str, Any],
+) -> Tuple[str | None, Tuple[Tuple[str, str], ...]]:
+    attrs = dict(fragment.get("attrs", {}))
+    if "id" in fragment:
+        attrs["id"] = fragment["id"]
+    return fragment.get("name"), tuple(attrs.items())
+
+
+def _match_attrs(
+    conditions: Tuple[Tuple[str, str], ...], attrs: Mapping[str, str]
+) -> bool:
+    for key, expected in conditions:
+        value = attrs.get(key)
+        if value is None:
+            return False
+        if key == "class":
+            if expected not in value.split():
+                return False
+        elif value != expected:
+            return False
+    return True
+
+
+@cache
+def get_strainer(parser: Type["BaseParser"]) -> SoupStrainer | None:
+    """
+    Build a strainer that keeps only the parser's fragments and the error panel.
+    """
+    if parser.fragments is None:
+        return None
+
+    plan: dict[str | None, list] = {}
+    for fragment in (BookingFlowParser.error_feedback, *parser.fragments):
+        name, conditions = _compile_fragment(fragment)
+        plan.setdefault(name, []).append(conditions)
+    any_tag = plan.pop(None, [])
+    plan = {name: conditions + any_tag for name, conditions in plan.items()}
+
+    def match(name: str, attrs: Mapping[str, str]) -> bool:
+        return any(
+            _match_attrs(conditions, attrs) for conditions in plan.get(name, any_tag)
+        )
+
+    return SoupStrainer(match)
+
+
+class PageScanner(HTMLParser):
+    """
+    Tokenize a page as it downloads, to tell when the element a parser reads
+    up to has been closed and the rest of the body can be dropped.
+    """
+
+    def __init__(self, until: Mapping[str, Any]) -> None:
+        super().__init__(convert_charrefs=False)
+        self.name, self.conditions = _compile_fragment(until)
+        self.decoder = codecs.getincrementaldecoder("utf-8")(errors="replace")
+        self.depth = 0
+        self.done = False
+
+    def scan(self, chunk: bytes) -> bool:
+        self.feed(self.decoder.decode(chunk))
+        return self.done
+
+    def pending(self) -> int:
+        """Bytes of a character the last chunk cut in half."""
+        return len(self.decoder.getstate()[0])
+
+    def handle_starttag(self, tag: str, attrs: List[Tuple[str, str]]) -> None:
+        if tag == self.name and (
+            self.depth or _match_attrs(self.conditions, dict(attrs))
+        ):
+            self.depth += 1
+
+    def handle_endtag(self, tag: str) -> None:
+        if tag == self.name and self.depth:
+            self.depth -= 1
+            self.done = not self.depth
 
 
 class BaseParser(metaclass=abc.ABCMeta):
+    # Fragments of a page the parser reads; None keeps the whole document.
+    fragments: List[Mapping[str, Any]] | None = None
+    # The element holding all the parser reads, the error panel included; a
+    # streamed response stops there, before the footer and scripts.
+    stream_until: Mapping[str, Any] | None = {"name": "main"}
+
     @classmethod
-    def html_to_soup(cls, content: bytes) -> BeautifulSoup:
-        return BeautifulSoup(content, features="html.parser")
+    def scanner(cls) -> PageScanner | None:
+        return PageScanner(cls.stream_until) if cls.stream_until else None
+
+    @classmethod
+    def html_to_soup(cls, content: bytes, partial: bool = False) -> BeautifulSoup:
+        with timed(f"parse.{cls.__name__}") as timer:
+            timer.size = len(content)
+            return BeautifulSoup(
+                content,
+                features=get_parser_backend().value,
+                parse_only=get_strainer(cls) if partial else None,
+            )
 
 
 class BookingFlowParser(BaseParser):
@@ -79,12 +205,30 @@ class BookingFlowParser(BaseParser):
         return [Error(item.text) for item in items]
 
 
+class ParsedPage:
+    """A response body parsed once and shared by the flow steps that read it."""
+
+    def __init__(self, content: bytes, parser: Type[BaseParser] = BaseParser) -> None:
+        self.soup: BeautifulSoup = parser.html_to_soup(content, partial=True)
+        self.errors: List[Error] = BookingFlowParser.parse_response_error(self.soup)
+
+    @classmethod
+    def failed(cls, error: Error) -> "ParsedPage":
+        """Stands in for the page of a request that got no response."""
+        page = cls.__new__(cls)
+        page.soup = BeautifulSoup("", features=get_parser_backend().value)
+        page.errors = [error]
+        return page
+
+
 class InitPageParser(BaseParser):
     booking_page: Mapping[str, Any] = {
         "security_code_img": {"id": "BookingS1Form_homeCaptcha_passCode"},
         "seat_prefer_radio": {"id": "BookingS1Form_seatCon_seatRadioGroup"},
         "types_of_trip": {"id": "BookingS1Form_tripCon_typesoftrip"},
+        "search_by": {"name": "input", "attrs": {"name": "bookingMethod"}},
     }
+    fragments = list(booking_page.values())
 
     @classmethod
     def parse_captcha_img_url(cls, page: BeautifulSoup) -> str:
@@ -106,7 +250,7 @@ class InitPageParser(BaseParser):
 
     @classmethod
     def parse_search_by(cls, page: BeautifulSoup) -> str:
-        candidates = page.find_all("input", {"name": "bookingMethod"})
+        candidates = page.find_all(**cls.booking_page["search_by"])
         tag = next((cand for cand in candidates if "checked" in cand.attrs))
         return tag.attrs["value"]
 
@@ -125,6 +269,7 @@ class ConfirmTrainParser(BaseParser):
             "attrs": {"name": "TrainQueryDataViewPanel:TrainGroup"},
         },
     }
+    fragments = [{"name": "label", **train_attr["from_html"]}]
 
     @classmethod
     def _parse_discount(cls, item: Tag) -> str:
@@ -171,6 +316,7 @@ class ConfirmTicketParser(BaseParser):
             "name": "TicketMemberSystemInputPanel:TakerMemberSystemDataView:memberSystemRadioGroup"
         },
     }
+    fragments = [ticket_attr]
 
     @classmethod
     def parse_member_radio(cls, page: BeautifulSoup):
@@ -0,0 +1,132 @@
+from typing import Callable, Mapping, Tuple
+import logging
+import random
+import threading
+import time
+
+from .constants import RATE_LIMITS, Endpoint
+from .schema import EndpointState, RateLimiterState
+
+logger = logging.getLogger(__name__)
+
+
+class TokenBucket:
+    def __init__(self, rate: float, burst: int, now: float) -> None:
+        self.rate = rate
+        self.burst = burst
+        self.tokens = float(burst)
+        self.updated = now
+
+    def reserve(self, now: float) -> float:
+        """
+        Take a token and return how long to wait before using it. Tokens may
+        go negative, which queues the callers behind each other.
+        """
+        self.tokens = min(self.tokens + (now - self.updated) * self.rate, self.burst)
+        self.updated = now
+        self.tokens -= 1
+        return max(-self.tokens / self.rate, 0.0)
+
+
+class RateLimiter:
+    """
+    Per-endpoint token buckets shared by every session of the process, with a
+    common backoff: a throttled response (429, 5xx, timeout or a busy error
+    panel) pauses all endpoints, doubling the pause each time up to
+    `max_backoff`; every normal response halves it again.
+    """
+
+    def __init__(
+        self,
+        budgets: Mapping[Endpoint, Tuple[float, int]] = RATE_LIMITS,
+        min_backoff: float = 1.0,
+        max_backoff: float = 30.0,
+        clock: Callable[[], float] = time.monotonic,
+        sleep: Callable[[float], None] = time.sleep,
+    ) -> None:
+        self.min_backoff = min_backoff
+        self.max_backoff = max_backoff
+        self.clock = clock
+        self.sleep = sleep
+        now = clock()
+        self.buckets = {
+            endpoint: TokenBucket(rate, burst, now)
+            for endpoint, (rate, burst) in budgets.items()
+        }
+        self.requests = {endpoint: 0 for endpoint in budgets}
+        self.throttled = {endpoint: 0 for endpoint in budgets}
+        self.backoff = 0.0
+        self.blocked_until = now
+        self._lock = threading.Lock()
+
+    def acquire(self, endpoint: Endpoint) -> None:
+        with self._lock:
+            now = self.clock()
+            wait = max(self.blocked_until - now, self.buckets[endpoint].reserve(now))
+            self.requests[endpoint] += 1
+        if wait > 0:
+            self.sleep(wait)
+
+    def record(self, endpoint: Endpoint, throttled: bool) -> None:
+        with self._lock:
+            if not throttled:
+                self.backoff = (
+                    self.backoff / 2 if self.backoff > self.min_backoff else 0
+                )
+                return
+            self.throttled[endpoint] += 1
+            self.backoff = min(
+                max(self.backoff * 2, self.min_backoff), self.max_backoff
+            )
+            # Jitter keeps the sessions from retrying in lockstep.
+            pause = self.backoff * random.uniform(1.0, 1.2)
+            self.blocked_until = max(self.blocked_until, self.clock() + pause)
+        logger.warning(
+            f"[gray37]Throttled on {endpoint.value}, back off {pause:.1f}s[/]",
+            extra={"markup": True},
+        )
+
+    def snapshot(self) -> RateLimiterState:
+        with self._lock:
+            now = self.clock()
+            endpoints = {
+                endpoint: EndpointState(
+                    rate=bucket.rate,
+                    burst=bucket.burst,
+                    tokens=min(
+                        bucket.tokens + (now - bucket.updated) * bucket.rate,
+                        bucket.burst,
+                    ),
+                    requests=self.requests[endpoint],
+                    throttled=self.throttled[endpoint],
+                )
+                for endpoint, bucket in self.buckets.items()
+            }
+            return RateLimiterState(
+                backoff=self.backoff,
+                blocked_for=max(self.blocked_until - now, 0.0),
+                endpoints=endpoints,
+            )
+
+
+def burst_budgets(
+    sessions: int, budgets: Mapping[Endpoint, Tuple[float, int]] = RATE_LIMITS
+) -> dict[Endpoint, Tuple[float, int]]:
+    """The budgets with buckets deep enough for every session at once."""
+    return {
+        endpoint: (rate, max(burst, sessions))
+        for endpoint, (rate, burst) in budgets.items()
+    }
+
+
+_rate_limiter: RateLimiter | None = RateLimiter()
+
+
+def use_rate_limiter(rate_limiter: RateLimiter | None) -> None:
+    """Set the limiter every new HTTPRequest uses; None turns limiting off."""
+    global _rate_limiter
+    _rate_limiter = rate_limiter
+
+
+def get_rate_limiter() -> RateLimiter | None:
+    return _rate_limiter
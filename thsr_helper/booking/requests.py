@@ -1,16 +1,85 @@
-from typing import Mapping, Any
+from typing import List, Mapping, Any, Type
+import asyncio
+import logging
+import re
 
 from requests import Session
-from requests.adapters import HTTPAdapter
+from requests.adapters import BaseAdapter
+from requests.exceptions import ConnectionError, Timeout
 from requests.models import Response
 
-from .constants import HTTPConfig
+from .constants import BUSY_KEY, Endpoint, HTTPConfig
+from .metrics import timed
+from .parser import (
+    BaseParser,
+    BookingFlowParser,
+    ConfirmTicketParser,
+    ConfirmTrainParser,
+    InitPageParser,
+    PageScanner,
+)
+from .rate_limit import RateLimiter, get_rate_limiter
+from .transport import connect_stats, get_connection_pool, get_transport
+from thsr_helper.settings import settings
+
+logger = logging.getLogger(__name__)
+
+# A busy message in the error panel, matched on the raw bytes before parsing.
+BUSY_PANEL = re.compile(rb'feedbackPanelERROR">[^<]*' + BUSY_KEY.encode("utf-8"))
+STREAM_CHUNK_SIZE = 4096
+
+
+def read_until(response: Response, scanner: PageScanner) -> bool:
+    """
+    Read the body until the scanner has seen all the parser needs and drop
+    the rest, with the connection it came on. True if the body was cut.
+    """
+    chunks = []
+    for chunk in response.iter_content(STREAM_CHUNK_SIZE):
+        chunks.append(chunk)
+        if scanner.scan(chunk):
+            break
+    else:
+        # The element never closed: the whole body was read, keep it.
+        response._content = b"".join(chunks)
+        return False
+    # A cut multi-byte character would throw off the charset detection.
+    content = b"".join(chunks)
+    response._content = content[: len(content) - scanner.pending()]
+    response.close()
+    return True
+
+
+def log_connect_time(clients: List["HTTPRequest"]) -> None:
+    """The requests and new connections of all the sessions of an attempt."""
+    logger.info(
+        f"{sum(client.requests for client in clients)} requests on "
+        f"{len(clients)} sessions, "
+        f"{sum(client.new_connections for client in clients)} new connections, "
+        f"connect time {sum(client.connect_time for client in clients) * 1000:.1f} ms"
+    )
 
 
 class HTTPRequest:
-    def __init__(self, max_retries: int = 3) -> None:
+    def __init__(
+        self,
+        max_retries: int = 3,
+        transport: BaseAdapter = None,
+        rate_limiter: RateLimiter = None,
+    ) -> None:
         self.session = Session()
-        self.session.mount("https://", HTTPAdapter(max_retries=max_retries))
+        self.rate_limiter = rate_limiter or get_rate_limiter()
+        # Record or replay go through their own adapter, live requests share
+        # one pool of warm connections.
+        transport = transport or get_transport() or get_connection_pool(max_retries)
+        self.session.mount("https://", transport)
+        self.session.mount("http://", transport)
+        # Stream the pages and stop reading them once the parser has what it
+        # needs; a cut response can't give its connection back to the pool.
+        self.stream = settings.stream_responses
+        self.requests = 0
+        self.new_connections = 0
+        self.connect_time = 0.0
         self.common_header: dict = {
             "User-Agent": HTTPConfig.HTTPHeader.USER_AGENT,
             "Accept": HTTPConfig.HTTPHeader.ACCEPT_HTML,
@@ -27,41 +96,132 @@ class HTTPRequest:
         }
         self.timeout: int = 5
 
+    def _send(
+        self,
+        endpoint: Endpoint,
+        method: str,
+        url: str,
+        parser: Type[BaseParser] = None,
+        **kwargs,
+    ) -> Response:
+        if self.rate_limiter:
+            self.rate_limiter.acquire(endpoint)
+        count, seconds = connect_stats()
+        scanner = parser.scanner() if parser and self.stream else None
+        with timed(f"http.{endpoint.value}") as timer:
+            try:
+                response = self.session.request(
+                    method, url, stream=scanner is not None, **kwargs
+                )
+                if scanner:
+                    timer.set("cut", read_until(response, scanner))
+            except (ConnectionError, Timeout):
+                if self.rate_limiter:
+                    self.rate_limiter.record(endpoint, throttled=True)
+                raise
+            finally:
+                new_count, new_seconds = connect_stats()
+                self.requests += 1
+                self.new_connections += new_count - count
+                self.connect_time += new_seconds - seconds
+            if not (self.rate_limiter or timer.enabled):
+                return response
+            throttled = (
+                response.status_code == 429
+                or response.status_code >= 500
+                or BUSY_PANEL.search(response.content) is not None
+            )
+            timer.size = len(response.content)
+            timer.outcome = "throttled" if throttled else "ok"
+            timer.set("status_code", response.status_code)
+        if self.rate_limiter:
+            self.rate_limiter.record(endpoint, throttled)
+        return response
+
     def booking_page(self) -> Response:
-        return self.session.get(
+        return self._send(
+            Endpoint.BOOKING_PAGE,
+            "GET",
             HTTPConfig.BOOKING_PAGE_URL,
+            parser=InitPageParser,
             headers=self.common_header,
             allow_redirects=True,
             timeout=self.timeout,
         )
 
+    def ping(self) -> Response:
+        return self.session.head(
+            HTTPConfig.BASE_URL, headers=self.common_header, timeout=self.timeout
+        )
+
     def get_captcha_img(self, img_url: str) -> Response:
-        return self.session.get(img_url, headers=self.common_header, timeout=self.timeout)
+        return self._send(
+            Endpoint.CAPTCHA,
+            "GET",
+            img_url,
+            headers=self.common_header,
+            timeout=self.timeout,
+        )
 
-    def submit_booking_form(self, params: Mapping[str, Any]) -> Response:
+    def submit_booking_form(self, params: Mapping[str, Any] | str) -> Response:
         url = HTTPConfig.SUBMIT_FORM_URL.format(self.session.cookies["JSESSIONID"])
-        return self.session.post(
+        return self._send(
+            Endpoint.S1,
+            "POST",
             url,
+            parser=ConfirmTrainParser,
             headers=self.common_header,
             params=params,
             allow_redirects=True,
             timeout=self.timeout,
         )
 
-    def submit_train(self, params: Mapping[str, Any]) -> Response:
-        return self.session.post(
+    def submit_train(self, params: Mapping[str, Any] | str) -> Response:
+        return self._send(
+            Endpoint.S2,
+            "POST",
             HTTPConfig.CONFIRM_TRAIN_URL,
+            parser=ConfirmTicketParser,
             headers=self.common_header,
             params=params,
             allow_redirects=True,
             timeout=self.timeout,
         )
 
-    def submit_ticket(self, params: Mapping[str, Any]) -> Response:
-        return self.session.post(
+    def submit_ticket(self, params: Mapping[str, Any] | str) -> Response:
+        return self._send(
+            Endpoint.S3,
+            "POST",
             HTTPConfig.CONFIRM_TICKET_URL,
+            parser=BookingFlowParser,
             headers=self.common_header,
             params=params,
             allow_redirects=True,
             timeout=self.timeout,
         )
+
+
+class AsyncHTTPRequest:
+    """Asyncio counterpart of HTTPRequest.
+
+    Each instance owns its own blocking session; the calls run in worker threads
+    so that several independent sessions can be in flight at the same time.
+    """
+
+    def __init__(self, client: HTTPRequest = None, max_retries: int = 3) -> None:
+        self.client = client or HTTPRequest(max_retries=max_retries)
+
+    async def booking_page(self) -> Response:
+        return await asyncio.to_thread(self.client.booking_page)
+
+    async def get_captcha_img(self, img_url: str) -> Response:
+        return await asyncio.to_thread(self.client.get_captcha_img, img_url)
+
+    async def submit_booking_form(self, params: Mapping[str, Any] | str) -> Response:
+        return await asyncio.to_thread(self.client.submit_booking_form, params)
+
+    async def submit_train(self, params: Mapping[str, Any] | str) -> Response:
+        return await asyncio.to_thread(self.client.submit_train, params)
+
+    async def submit_ticket(self, params: Mapping[str, Any] | str) -> Response:
+        return await asyncio.to_thread(self.client.submit_ticket, params)
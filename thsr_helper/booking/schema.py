@@ -1,11 +1,14 @@
+import hashlib
+import json
 import re
 from collections import namedtuple
 
-from datetime import date, datetime
+from datetime import date
 from typer import BadParameter
 from pydantic import BaseModel, Field, validator
 
 from .constants import Stations, ThsrTime
+from thsr_helper.config.validate import parse_date
 
 Error = namedtuple("Error", "msg")
 
@@ -25,7 +28,45 @@ Ticket = namedtuple(
     ],
 )
 
-Record = namedtuple("Record", Ticket._fields + ("personal_id", "date_ts"))
+
+class Record(namedtuple("Record", Ticket._fields + ("personal_id", "date_ts"))):
+    __slots__ = ()
+
+    @property
+    def fingerprint(self) -> str:
+        """Stable hash of the record content; equal records share it."""
+        values = self._replace(date_ts=float(self.date_ts))
+        content = json.dumps(values, ensure_ascii=False)
+        return hashlib.sha1(content.encode("utf-8")).hexdigest()
+
+
+CaptchaResult = namedtuple("CaptchaResult", "code confidence")
+
+# An HTTP session whose booking page is fetched and captcha already solved.
+PreparedSession = namedtuple("PreparedSession", "client page security_code created_at")
+
+# The S1 search of one time slot, on its own session.
+SlotResult = namedtuple("SlotResult", "slot client page passenger_info trains")
+
+# A listed train with its times in minutes of the day, and its ranking cost.
+TrainCandidate = namedtuple("TrainCandidate", "train depart arrive duration cost")
+
+# A config validated once, shared by the attempts booked with it.
+ConfigSnapshot = namedtuple("ConfigSnapshot", "config user conditions")
+
+# One booking of a batch config; `config` is the snapshot of its own "user"
+# and "conditions".
+Job = namedtuple("Job", "name priority execution_times config")
+
+# `detail` is the ticket ID when booked, otherwise the last error.
+JobResult = namedtuple("JobResult", "job status attempts elapsed detail")
+
+# A row of a bulk job import that failed to validate, by its line in the file.
+RowError = namedtuple("RowError", "line message")
+ImportSummary = namedtuple("ImportSummary", "rows jobs errors")
+
+EndpointState = namedtuple("EndpointState", "rate burst tokens requests throttled")
+RateLimiterState = namedtuple("RateLimiterState", "backoff blocked_for endpoints")
 
 
 class BookingModel(BaseModel):
@@ -72,18 +113,7 @@ class BookingModel(BaseModel):
     @validator("outbound_date")
     def check_date(cls, date_str):
         try:
-            if matched := re.match(r"\d{8}", date_str):  # 20240101
-                target_date = datetime.strptime(matched.string, "%Y%m%d").date()
-            elif matched := re.match(
-                r"\d{4}-[0]?\d+-[0]?\d+", date_str
-            ):  # 2024-01-01, 2024-1-1
-                target_date = datetime.strptime(matched.string, "%Y-%m-%d").date()
-            elif matched := re.match(
-                r"\d{4}/[0]?\d+/[0]?\d+", date_str
-            ):  # 2024/01/01, 2024/10/1
-                target_date = datetime.strptime(matched.string, "%Y/%m/%d").date()
-            else:
-                target_date = date.today()
+            target_date = parse_date(date_str) or date.today()
             return target_date.strftime("%Y/%m/%d")
         except Exception:
             raise BadParameter(f"Unknown date format: {date_str}")
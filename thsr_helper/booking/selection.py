@@ -0,0 +1,81 @@
+from typing import Iterable, List
+import re
+
+from typer import BadParameter
+
+from .constants import EARLY_BIRD_KEY
+from .schema import Train, TrainCandidate
+from thsr_helper.config.settings import ConditionSettings
+
+COLLEGE_KEY = "大學生"
+# "早鳥65折" is 35% off, "大學生5折" 50% off.
+DISCOUNT_PATTERN = re.compile(r"(\S+?)(\d{1,2})折")
+
+
+def to_minutes(clock: str) -> int:
+    """Minutes of the day of "HH:MM", or of "H:MM" for a travel time."""
+    hour, _, minute = clock.partition(":")
+    return int(hour) * 60 + int(minute)
+
+
+def discount_percent(discount_str: str, college: bool) -> int:
+    """
+    The best discount of a train in percent off. The college discount only
+    counts when college tickets are booked.
+    """
+    best = 0
+    for name, rate in DISCOUNT_PATTERN.findall(discount_str):
+        if EARLY_BIRD_KEY in name or (college and COLLEGE_KEY in name):
+            rate = int(rate) * 10 if len(rate) == 1 else int(rate)
+            best = max(best, 100 - rate)
+    return best
+
+
+class TrainSelector:
+    """
+    Rank trains by the weighted cost of their times and discount, out of the
+    ones inside `time_range` (whole hours) and the selection bounds.
+
+    The default weights rank by departure, the first train in range first.
+    """
+
+    def __init__(self, conditions: ConditionSettings) -> None:
+        selection = conditions.selection
+        self.weights = selection
+        try:
+            depart_after = to_minutes(selection.depart_after or "0:00")
+            arrive_by = to_minutes(selection.arrive_by or "24:00")
+        except ValueError:
+            raise BadParameter(
+                f"Unknown selection time: {selection.depart_after!r} or "
+                f"{selection.arrive_by!r}, use HH:MM"
+            )
+        start_hour, end_hour = conditions.time_range
+        self.depart_after = max(start_hour * 60, depart_after)
+        # Hours are inclusive: an end hour of 12 still takes 12:59.
+        self.depart_before = end_hour * 60 + 59
+        self.arrive_by = arrive_by
+        self.college = bool(conditions.college_ticket_num)
+
+    def candidate(self, train: Train) -> TrainCandidate:
+        depart, arrive = to_minutes(train.depart), to_minutes(train.arrive)
+        duration = to_minutes(train.travel_time)
+        discount = discount_percent(train.discount_str, self.college)
+        cost = (
+            self.weights.depart_weight * depart
+            + self.weights.arrival_weight * arrive
+            + self.weights.duration_weight * duration
+            - self.weights.discount_weight * discount / 10
+        )
+        return TrainCandidate(train, depart, arrive, duration, cost)
+
+    def rank(self, trains: Iterable[Train]) -> List[Train]:
+        """Trains in range, best first; equal costs keep the listed order."""
+        candidates = [
+            candidate
+            for candidate in map(self.candidate, trains)
+            if self.depart_after <= candidate.depart <= self.depart_before
+            and candidate.arrive <= self.arrive_by
+        ]
+        candidates.sort(key=lambda candidate: candidate.cost)
+        return [candidate.train for candidate in candidates]
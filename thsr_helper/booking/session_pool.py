@@ -0,0 +1,111 @@
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+import logging
+import threading
+import time
+
+from .booking_flow import InitPageFlow
+from .schema import PreparedSession
+from thsr_helper.booking.requests import HTTPRequest
+from thsr_helper.config.settings import ConditionSettings
+
+logger = logging.getLogger(__name__)
+
+
+class SessionPool:
+    """
+    Keep sessions ready in the background, each with its booking page fetched
+    and its captcha solved, so an attempt can start at the S1 submit.
+
+    Sessions older than `ttl` seconds are dropped and replaced before the
+    server side expires them.
+    """
+
+    def __init__(
+        self,
+        conditions: ConditionSettings,
+        size: int,
+        ttl: float = 180,
+        refresh_interval: float = 1,
+    ) -> None:
+        self.conditions = conditions
+        self.size = size
+        self.ttl = ttl
+        self.refresh_interval = refresh_interval
+        self._sessions: deque[PreparedSession] = deque()
+        self._pending = 0
+        self._closed = False
+        self._cond = threading.Condition()
+        self._executor = ThreadPoolExecutor(
+            max_workers=size, thread_name_prefix="session-pool"
+        )
+        self._refresher = threading.Thread(target=self._refresh_loop, daemon=True)
+
+    def __enter__(self) -> "SessionPool":
+        self.start()
+        return self
+
+    def __exit__(self, *args) -> None:
+        self.close()
+
+    def start(self) -> None:
+        self._refresher.start()
+
+    def close(self) -> None:
+        with self._cond:
+            self._closed = True
+            self._cond.notify_all()
+        self._executor.shutdown(wait=False, cancel_futures=True)
+
+    def acquire(self, timeout: float = 10) -> PreparedSession | None:
+        """
+        Take the oldest ready session, waiting up to `timeout` seconds for one.
+        """
+        deadline = time.monotonic() + timeout
+        with self._cond:
+            while not self._closed:
+                self._evict_expired()
+                if self._sessions:
+                    session = self._sessions.popleft()
+                    self._cond.notify_all()
+                    return session
+                remaining = deadline - time.monotonic()
+                if remaining <= 0 or not self._cond.wait(remaining):
+                    return None
+        return None
+
+    def _evict_expired(self) -> None:
+        now = time.monotonic()
+        while self._sessions and now - self._sessions[0].created_at > self.ttl:
+            self._sessions.popleft()
+
+    def _refresh_loop(self) -> None:
+        while True:
+            with self._cond:
+                if self._closed:
+                    return
+                self._evict_expired()
+                missing = self.size - len(self._sessions) - self._pending
+                self._pending += max(missing, 0)
+            for _ in range(missing):
+                self._executor.submit(self._prepare)
+            with self._cond:
+                self._cond.wait(self.refresh_interval)
+
+    def _prepare(self) -> None:
+        session = None
+        try:
+            client = HTTPRequest()
+            page, security_code = InitPageFlow(client, self.conditions).prepare()
+            session = PreparedSession(client, page, security_code, time.monotonic())
+        except Exception as e:
+            logger.warning(
+                f"[gray37]Failed to prepare session: {e}[/]", extra={"markup": True}
+            )
+            # Back off before the refresher asks for a replacement.
+            time.sleep(self.refresh_interval)
+        with self._cond:
+            self._pending -= 1
+            if session and not self._closed:
+                self._sessions.append(session)
+            self._cond.notify_all()
@@ -0,0 +1,67 @@
+from typing import Callable
+import logging
+import threading
+
+from pydantic import ValidationError
+from tomli import TOMLDecodeError
+from typer import BadParameter
+import typer
+
+from .forms import booking_form, ticket_form
+from .schema import ConfigSnapshot
+from .selection import TrainSelector
+from thsr_helper.config.settings import ConditionSettings, UserSettings
+from thsr_helper.config.utils import ConfigManager
+
+logger = logging.getLogger(__name__)
+
+
+def load_snapshot(config: dict[str, any]) -> ConfigSnapshot:
+    """
+    Validate the user and conditions of a config, with the static form fields
+    and the train selection, rather than on the first submit.
+    """
+    user = UserSettings(**config.get("user"))
+    conditions = ConditionSettings(**config.get("conditions"))
+    booking_form(conditions)
+    ticket_form(user)
+    TrainSelector(conditions)
+    return ConfigSnapshot(config, user, conditions)
+
+
+class ConfigReloader:
+    """
+    The snapshot of the config file, reloaded when the file changes.
+
+    Callers take the snapshot once per attempt, so a reload only applies
+    between attempts. A file that fails to parse or validate is reported and
+    the previous snapshot kept.
+    """
+
+    def __init__(
+        self, load: Callable[[], dict[str, any] | None] = ConfigManager.get_config
+    ) -> None:
+        self.load = load
+        self.snapshot: ConfigSnapshot | None = None
+        self._lock = threading.Lock()
+
+    def get(self) -> ConfigSnapshot | None:
+        with self._lock:
+            try:
+                config = self.load()
+                # The same dict comes back while the file is unchanged.
+                if config is None or (self.snapshot and config is self.snapshot.config):
+                    return self.snapshot
+                snapshot = load_snapshot(config)
+            except (OSError, TOMLDecodeError, ValidationError, BadParameter) as e:
+                if self.snapshot is None:
+                    raise
+                logger.warning(
+                    f"[gray37]Failed to reload the config, keep the last one: {e}[/]",
+                    extra={"markup": True},
+                )
+                return self.snapshot
+            if self.snapshot:
+                typer.secho("Reload the config", fg=typer.colors.BRIGHT_CYAN)
+            self.snapshot = snapshot
+            return snapshot
@@ -0,0 +1,204 @@
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timedelta
+from email.utils import parsedate_to_datetime
+from typing import Callable, List
+import asyncio
+import logging
+import math
+import time
+
+import typer
+
+from .async_booking_flow import AsyncBookingFlow, BookingCoordinator
+from .booking_flow import InitPageFlow
+from .constants import BOOKING_WINDOW_DAYS, TIMEZONE
+from .rate_limit import (
+    RateLimiter,
+    burst_budgets,
+    get_rate_limiter,
+    use_rate_limiter,
+)
+from .schema import PreparedSession
+from .transport import get_transport, own_connection_pool
+from thsr_helper.booking.requests import HTTPRequest
+from thsr_helper.config.settings import ConditionSettings
+from thsr_helper.config.validate import parse_date
+
+logger = logging.getLogger(__name__)
+
+
+def booking_window_opens(date_str: str) -> datetime:
+    """When booking opens for a travel date, in any format the config takes."""
+    try:
+        travel_date = parse_date(date_str)
+    except ValueError:
+        travel_date = None
+    if travel_date is None:
+        raise typer.BadParameter(
+            f"Unknown date: {date_str}, use YYYY-MM-DD, YYYY/MM/DD or YYYYMMDD."
+        )
+    opens = datetime.combine(travel_date, datetime.min.time())
+    return TIMEZONE.localize(opens - timedelta(days=BOOKING_WINDOW_DAYS))
+
+
+def estimate_clock_offset(
+    client: HTTPRequest,
+    samples: int = 5,
+    clock: Callable[[], float] = time.time,
+    sleep: Callable[[float], None] = time.sleep,
+) -> float:
+    """
+    Estimate how many seconds the server clock is ahead of the local clock.
+
+    The Date header only has a one-second resolution, so each sample bounds the
+    offset to an interval; the samples are spread over sub-second phases and
+    their intervals intersected.
+    """
+    low, high = -math.inf, math.inf
+    for idx in range(samples):
+        if idx:
+            sleep(1 / samples + 0.05)
+        sent = clock()
+        response = client.ping()
+        received = clock()
+        if not (date := response.headers.get("Date")):
+            continue
+        server = parsedate_to_datetime(date).timestamp()
+        low = max(low, server - received)
+        high = min(high, server + 1 - sent)
+    if math.isinf(low) or math.isinf(high):
+        logger.warning(
+            "[gray37]No Date header from the server, assume no clock offset[/]",
+            extra={"markup": True},
+        )
+        return 0.0
+    return (low + high) / 2
+
+
+class SniperCoordinator(BookingCoordinator):
+    """Fire staged sessions at given local times; the first ticket wins."""
+
+    def __init__(
+        self,
+        config: dict[str, any],
+        sessions: List[PreparedSession | None],
+        fire_times: List[float],
+        clock: Callable[[], float] = time.time,
+    ) -> None:
+        super().__init__(config, len(sessions))
+        self.sessions = sessions
+        self.fire_times = fire_times
+        self.clock = clock
+
+    async def worker(self, idx: int) -> bool:
+        await asyncio.sleep(max(self.fire_times[idx] - self.clock(), 0))
+        if self.booked.is_set():
+            return False
+        try:
+            flow = AsyncBookingFlow(self.config, self, self.sessions[idx])
+            return bool(await flow.run())
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            logger.warning(f"Worker {idx}: {e}")
+            return False
+
+
+class Sniper:
+    """
+    Book at the instant the booking window opens.
+
+    Sessions are staged up to the S1 submit `lead` seconds before `fire_at`
+    (server time), kept alive, then fired one after another over `burst`
+    seconds starting at `fire_at`.
+    """
+
+    def __init__(
+        self,
+        config: dict[str, any],
+        fire_at: datetime,
+        sessions: int = 1,
+        burst: float = 0.5,
+        lead: float = 30,
+        keepalive: float = 15,
+        clock: Callable[[], float] = time.time,
+        sleep: Callable[[float], None] = time.sleep,
+    ) -> None:
+        self.config = config
+        self.conditions = ConditionSettings(**config.get("conditions"))
+        self.fire_at = fire_at
+        self.sessions = sessions
+        self.burst = burst
+        self.lead = lead
+        self.keepalive = keepalive
+        self.clock = clock
+        self.sleep = sleep
+
+    def run(self) -> bool:
+        offset = estimate_clock_offset(
+            HTTPRequest(), clock=self.clock, sleep=self.sleep
+        )
+        fire_local = self.fire_at.timestamp() - offset
+        typer.secho(
+            f"Fire at {self.fire_at.isoformat()} (server clock {offset:+.3f}s)",
+            fg=typer.colors.BRIGHT_YELLOW,
+        )
+
+        self.sleep_until(fire_local - self.lead)
+        sessions = self.stage()
+        self.keep_alive(sessions, fire_local)
+
+        step = self.burst / (len(sessions) - 1) if len(sessions) > 1 else 0
+        fire_times = [fire_local + idx * step for idx in range(len(sessions))]
+        coordinator = SniperCoordinator(self.config, sessions, fire_times, self.clock)
+        rate_limiter = get_rate_limiter()
+        if rate_limiter:
+            self.use_fire_limiter(sessions)
+        try:
+            return asyncio.run(coordinator.run())
+        finally:
+            use_rate_limiter(rate_limiter)
+
+    def use_fire_limiter(self, sessions: List[PreparedSession | None]) -> None:
+        """
+        The shared budgets would spread the fire over seconds; fire through
+        buckets that let a request of every session through at once, still
+        backing off when throttled.
+        """
+        rate_limiter = RateLimiter(burst_budgets(len(sessions)))
+        use_rate_limiter(rate_limiter)
+        for session in filter(None, sessions):
+            session.client.rate_limiter = rate_limiter
+
+    def sleep_until(self, moment: float) -> None:
+        if (remaining := moment - self.clock()) > 0:
+            self.sleep(remaining)
+
+    def stage(self) -> List[PreparedSession | None]:
+        def prepare(_) -> PreparedSession | None:
+            try:
+                # Each staged session keeps its own connection warm.
+                client = HTTPRequest(transport=get_transport() or own_connection_pool())
+                page, code = InitPageFlow(client, self.conditions).prepare()
+                return PreparedSession(client, page, code, time.monotonic())
+            except Exception as e:
+                logger.warning(
+                    f"[gray37]Failed to stage session: {e}[/]", extra={"markup": True}
+                )
+                return None
+
+        # Manual captchas have to be typed one after another.
+        workers = 1 if self.conditions.is_manual else self.sessions
+        with ThreadPoolExecutor(max_workers=workers) as executor:
+            return list(executor.map(prepare, range(self.sessions)))
+
+    def keep_alive(self, sessions: List[PreparedSession | None], until: float) -> None:
+        while until - self.clock() > self.keepalive:
+            self.sleep(self.keepalive)
+            for session in filter(None, sessions):
+                try:
+                    session.client.ping()
+                except Exception as e:
+                    logger.warning(
+                        f"[gray37]Keep-alive failed: {e}[/]", extra={"markup": True}
+                    )
@@ -0,0 +1,216 @@
+from contextlib import contextmanager
+from contextvars import ContextVar, Token
+from typing import Dict, Iterator, List
+import json
+import os
+import random
+import threading
+import time
+
+from .constants import TraceFormat
+
+SERVICE_NAME = "thsr-helper"
+
+
+class Span:
+    """One timed step of a trace, nested under the span that was current."""
+
+    __slots__ = (
+        "tracer",
+        "name",
+        "trace_id",
+        "span_id",
+        "parent_id",
+        "attributes",
+        "start_ns",
+        "end_ns",
+        "thread",
+        "error",
+        "token",
+    )
+
+    def __init__(
+        self, tracer: "Tracer", name: str, trace_id: str, parent_id: str | None
+    ) -> None:
+        self.tracer = tracer
+        self.name = name
+        self.trace_id = trace_id
+        self.span_id = f"{random.getrandbits(64):016x}"
+        self.parent_id = parent_id
+        self.attributes: Dict[str, any] = {}
+        self.error = False
+
+    def start(self) -> None:
+        self.thread = threading.current_thread().name
+        self.token: Token = _current_span.set(self)
+        self.start_ns = time.time_ns()
+
+    def end(self, exc: BaseException | None = None) -> None:
+        self.end_ns = time.time_ns()
+        _current_span.reset(self.token)
+        if exc is not None:
+            self.error = True
+            self.attributes["error"] = repr(exc)
+        self.tracer.add(self)
+
+
+class Tracer:
+    """
+    Keep the spans of sampled traces in memory, to be exported as a Chrome
+    trace (chrome://tracing, Perfetto) or as OTLP JSON when the run ends.
+
+    A trace is sampled or not as a whole, when its root span starts.
+    """
+
+    def __init__(self, sample_rate: float = 1.0) -> None:
+        self.sample_rate = sample_rate
+        self.spans: List[Span] = []
+        self._lock = threading.Lock()
+
+    def sample(self) -> bool:
+        return random.random() < self.sample_rate
+
+    def add(self, span: Span) -> None:
+        with self._lock:
+            self.spans.append(span)
+
+    def to_chrome(self) -> dict[str, any]:
+        # Every trace gets a track per thread, so the spans of the slots
+        # searched at once don't overlap on one track.
+        pid = os.getpid()
+        tracks: Dict[tuple[str, str], int] = {}
+        events = []
+        with self._lock:
+            spans = sorted(self.spans, key=lambda span: span.start_ns)
+        for span in spans:
+            track = (span.trace_id, span.thread)
+            if track not in tracks:
+                tracks[track] = len(tracks) + 1
+                events.append(
+                    {
+                        "name": "thread_name",
+                        "ph": "M",
+                        "pid": pid,
+                        "tid": tracks[track],
+                        "args": {"name": f"{span.trace_id[:8]} {span.thread}"},
+                    }
+                )
+            events.append(
+                {
+                    "name": span.name,
+                    "cat": span.name.partition(".")[0],
+                    "ph": "X",
+                    "ts": span.start_ns / 1000,
+                    "dur": (span.end_ns - span.start_ns) / 1000,
+                    "pid": pid,
+                    "tid": tracks[track],
+                    "args": {
+                        "trace_id": span.trace_id,
+                        "span_id": span.span_id,
+                        "parent_id": span.parent_id,
+                        **span.attributes,
+                    },
+                }
+            )
+        return {"traceEvents": events, "displayTimeUnit": "ms"}
+
+    def to_otlp(self) -> dict[str, any]:
+        with self._lock:
+            spans = list(self.spans)
+        return {
+            "resourceSpans": [
+                {
+                    "resource": {
+                        "attributes": otlp_attributes({"service.name": SERVICE_NAME})
+                    },
+                    "scopeSpans": [
+                        {
+                            "scope": {"name": __name__},
+                            "spans": [
+                                {
+                                    "traceId": span.trace_id,
+                                    "spanId": span.span_id,
+                                    "parentSpanId": span.parent_id or "",
+                                    "name": span.name,
+                                    # CLIENT for requests, INTERNAL otherwise.
+                                    "kind": 3 if span.name.startswith("http.") else 1,
+                                    "startTimeUnixNano": str(span.start_ns),
+                                    "endTimeUnixNano": str(span.end_ns),
+                                    "attributes": otlp_attributes(span.attributes),
+                                    "status": {"code": 2 if span.error else 0},
+                                }
+                                for span in spans
+                            ],
+                        }
+                    ],
+                }
+            ]
+        }
+
+    def export(self, path: str, output_format: TraceFormat) -> None:
+        if output_format == TraceFormat.OTLP:
+            content = self.to_otlp()
+        else:
+            content = self.to_chrome()
+        tmp_path = f"{path}.tmp"
+        with open(tmp_path, mode="wt", encoding="utf-8") as fp:
+            json.dump(content, fp, ensure_ascii=False)
+        os.replace(tmp_path, path)
+
+
+def otlp_attributes(attributes: Dict[str, any]) -> List[dict[str, any]]:
+    def value(item: any) -> dict[str, any]:
+        if isinstance(item, bool):
+            return {"boolValue": item}
+        if isinstance(item, int):
+            return {"intValue": str(item)}
+        if isinstance(item, float):
+            return {"doubleValue": item}
+        return {"stringValue": str(item)}
+
+    return [{"key": key, "value": value(item)} for key, item in attributes.items()]
+
+
+_current_span: ContextVar[Span | None] = ContextVar("current_span", default=None)
+_tracer: Tracer | None = None
+
+
+def use_tracer(tracer: Tracer | None) -> None:
+    """Set the tracer the stages record spans to; None (the default) turns it off."""
+    global _tracer
+    _tracer = tracer
+
+
+def get_tracer() -> Tracer | None:
+    return _tracer
+
+
+def start_span(name: str, root: bool = False) -> Span | None:
+    """
+    A span under the current one. Without a current span, only a root starts
+    a new trace, if it is sampled; other stages are then not traced.
+    """
+    if _tracer is None:
+        return None
+    if parent := _current_span.get():
+        return Span(_tracer, name, parent.trace_id, parent.span_id)
+    if root and _tracer.sample():
+        return Span(_tracer, name, f"{random.getrandbits(128):032x}", None)
+    return None
+
+
+@contextmanager
+def export_traces(
+    path: str | None, output_format: TraceFormat, sample_rate: float
+) -> Iterator[Tracer | None]:
+    """Trace the booking attempts run inside to `path`; without a path, don't."""
+    if not path:
+        yield None
+        return
+    tracer = Tracer(sample_rate)
+    use_tracer(tracer)
+    try:
+        yield tracer
+    finally:
+        use_tracer(None)
+        tracer.export(path, output_format)
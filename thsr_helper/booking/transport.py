@@ -0,0 +1,303 @@
+from functools import cache
+from http import HTTPStatus
+from http.client import HTTPResponse as HTTPClientResponse
+from typing import Any, List, Mapping, Tuple
+from urllib.parse import parse_qsl, urlencode, urlsplit
+import base64
+import io
+import json
+import os
+import random
+import threading
+import time
+
+from requests.adapters import BaseAdapter, HTTPAdapter
+from requests.exceptions import ConnectionError
+from requests.models import PreparedRequest, Response
+from urllib3 import HTTPConnectionPool, HTTPResponse, HTTPSConnectionPool
+from urllib3.connection import HTTPConnection, HTTPSConnection
+
+# Query parameters that identify an endpoint; the rest (form fields sent as
+# params, anti-cache tokens) differ between runs.
+KEY_PARAMS = ("wicket:interface", "locale")
+# The S1 form field the solved captcha is sent in, recorded with the URL.
+CAPTCHA_CODE_PARAM = "homeCaptcha:securityCode"
+# Headers that no longer describe the stored body, which is already decoded.
+DROPPED_HEADERS = ("content-encoding", "content-length", "transfer-encoding")
+# Keep-alive connections kept per host, enough for concurrent sessions.
+POOL_MAXSIZE = 32
+
+_transport: BaseAdapter | None = None
+
+
+def use_transport(transport: BaseAdapter | None) -> None:
+    """Set the transport every new HTTPRequest is mounted with."""
+    global _transport
+    _transport = transport
+
+
+def get_transport() -> BaseAdapter | None:
+    return _transport
+
+
+_connects = threading.local()
+
+
+def connect_stats() -> Tuple[int, float]:
+    """Connections opened by the current thread so far, and seconds spent."""
+    return getattr(_connects, "count", 0), getattr(_connects, "seconds", 0.0)
+
+
+class _TimedConnect:
+    def connect(self) -> None:
+        started = time.perf_counter()
+        super().connect()
+        count, seconds = connect_stats()
+        _connects.count = count + 1
+        _connects.seconds = seconds + time.perf_counter() - started
+
+
+class TimedHTTPConnection(_TimedConnect, HTTPConnection):
+    pass
+
+
+class TimedHTTPSConnection(_TimedConnect, HTTPSConnection):
+    pass
+
+
+class TimedHTTPConnectionPool(HTTPConnectionPool):
+    ConnectionCls = TimedHTTPConnection
+
+
+class TimedHTTPSConnectionPool(HTTPSConnectionPool):
+    ConnectionCls = TimedHTTPSConnection
+
+
+class PooledAdapter(HTTPAdapter):
+    """HTTPAdapter whose connections record how long they took to open."""
+
+    def init_poolmanager(self, *args, **kwargs) -> None:
+        super().init_poolmanager(*args, **kwargs)
+        self.poolmanager.pool_classes_by_scheme = {
+            "http": TimedHTTPConnectionPool,
+            "https": TimedHTTPSConnectionPool,
+        }
+
+
+@cache
+def get_connection_pool(max_retries: int) -> PooledAdapter:
+    """
+    One adapter for every live session, so its keep-alive connections (and
+    their TLS handshakes) carry over from one booking attempt to the next.
+    Cookies live on each Session, so attempts still start clean.
+    """
+    return PooledAdapter(max_retries=max_retries, pool_maxsize=POOL_MAXSIZE)
+
+
+def own_connection_pool(max_retries: int = 3) -> PooledAdapter:
+    """
+    An adapter with a pool of its own, for a session whose connection has to
+    stay warm until it is used: in the shared pool, which hands out the last
+    connection returned, sessions pinged one after another would all reuse
+    the same one and let the others idle out.
+    """
+    return PooledAdapter(max_retries=max_retries, pool_maxsize=1)
+
+
+def interaction_key(method: str, url: str) -> str:
+    parts = urlsplit(url)
+    path = parts.path.split(";")[0]
+    query = urlencode([(k, v) for k, v in parse_qsl(parts.query) if k in KEY_PARAMS])
+    return f"{method.upper()} {path}?{query}"
+
+
+class Cassette:
+    """Request/response pairs stored as a JSON file."""
+
+    def __init__(self, path: str, interactions: List[Mapping[str, Any]] = None):
+        self.path = path
+        self.interactions = interactions or []
+
+    @classmethod
+    def load(cls, path: str) -> "Cassette":
+        with open(path, mode="rt", encoding="utf-8") as fp:
+            return cls(path, json.load(fp)["interactions"])
+
+    def save(self) -> None:
+        os.makedirs(os.path.dirname(os.path.abspath(self.path)), exist_ok=True)
+        with open(self.path, mode="wt", encoding="utf-8") as fp:
+            json.dump(
+                {"interactions": self.interactions}, fp, ensure_ascii=False, indent=1
+            )
+
+    def captcha_codes(self) -> List[str]:
+        """The captcha codes sent with the S1 submits, in order."""
+        return [
+            value
+            for interaction in self.interactions
+            for key, value in parse_qsl(
+                urlsplit(interaction["request"]["url"]).query, keep_blank_values=True
+            )
+            if key == CAPTCHA_CODE_PARAM
+        ]
+
+    def append(self, request: PreparedRequest, response: Response) -> None:
+        try:
+            body = {"body": response.content.decode("utf-8")}
+        except UnicodeDecodeError:
+            body = {"body_base64": base64.b64encode(response.content).decode("ascii")}
+        headers = [
+            [name, value]
+            for name, value in response.raw.headers.items()
+            if name.lower() not in DROPPED_HEADERS
+        ]
+        self.interactions.append(
+            {
+                "request": {"method": request.method, "url": request.url},
+                "response": {
+                    "status": response.status_code,
+                    "headers": headers,
+                    **body,
+                },
+            }
+        )
+
+
+class RecordingAdapter(HTTPAdapter):
+    """Send requests live and append every exchange to a cassette."""
+
+    def __init__(self, cassette: Cassette, **kwargs) -> None:
+        super().__init__(**kwargs)
+        self.cassette = cassette
+        self._lock = threading.Lock()
+
+    def send(self, request: PreparedRequest, **kwargs) -> Response:
+        response = super().send(request, **kwargs)
+        with self._lock:
+            self.cassette.append(request, response)
+            self.cassette.save()
+        return response
+
+
+class ReplayAdapter(HTTPAdapter):
+    """
+    Answer requests from a cassette without touching the network.
+
+    Interactions with the same endpoint are replayed in order; once they run
+    out the last one is repeated, so a cassette can drive many attempts.
+    Bodies are read at `bandwidth` bytes per second, if given.
+    """
+
+    def __init__(
+        self,
+        cassette: Cassette,
+        latency: float = 0.0,
+        jitter: float = 0.0,
+        bandwidth: float | None = None,
+    ) -> None:
+        super().__init__()
+        self.latency = latency
+        self.jitter = jitter
+        self.bandwidth = bandwidth
+        self._lock = threading.Lock()
+        self._positions: dict[str, int] = {}
+        self._responses: dict[str, list] = {}
+        for interaction in cassette.interactions:
+            request = interaction["request"]
+            key = interaction_key(request["method"], request["url"])
+            self._responses.setdefault(key, []).append(interaction["response"])
+
+    def send(self, request: PreparedRequest, **kwargs) -> Response:
+        key = interaction_key(request.method, request.url)
+        if key not in self._responses:
+            raise ConnectionError(f"No recorded response for {key}", request=request)
+        with self._lock:
+            position = self._positions.get(key, 0)
+            self._positions[key] = position + 1
+        recorded = self._responses[key]
+        data = recorded[min(position, len(recorded) - 1)]
+
+        if delay := self.latency + random.uniform(-self.jitter, self.jitter):
+            time.sleep(max(delay, 0))
+        return self.build_response(request, self._to_urllib3(request, data))
+
+    def _to_urllib3(
+        self, request: PreparedRequest, data: Mapping[str, Any]
+    ) -> HTTPResponse:
+        """
+        Rebuild the response the way urllib3 would have read it off a socket,
+        so requests handles it (cookies included) exactly like a live one.
+        """
+        if "body_base64" in data:
+            body = base64.b64decode(data["body_base64"])
+        else:
+            body = data["body"].encode("utf-8")
+        status = HTTPStatus(data["status"])
+        lines = [f"HTTP/1.1 {status.value} {status.phrase}"]
+        lines += [f"{name}: {value}" for name, value in data["headers"]]
+        lines.append(f"Content-Length: {len(body)}")
+        raw = "\r\n".join(lines).encode("latin-1") + b"\r\n\r\n" + body
+
+        response = HTTPClientResponse(
+            _RecordedSocket(raw, self.bandwidth), method=request.method
+        )
+        response.begin()
+        return HTTPResponse(
+            body=response,
+            headers=response.msg.items(),
+            status=response.status,
+            reason=response.reason,
+            preload_content=False,
+            decode_content=False,
+            original_response=response,
+            request_method=request.method,
+            request_url=request.url,
+        )
+
+
+class ReplayedCaptchas:
+    """
+    Solve the captchas of a replay with the codes the cassette was recorded
+    with, without the model or a prompt. Like the responses, the codes are
+    handed out in order and the last one is repeated.
+    """
+
+    def __init__(self, codes: List[str]) -> None:
+        self.codes = codes or [""]
+        self._position = 0
+        self._lock = threading.Lock()
+
+    def __call__(self, img: bytes) -> str:
+        with self._lock:
+            code = self.codes[min(self._position, len(self.codes) - 1)]
+            self._position += 1
+        return code
+
+
+class _RecordedSocket:
+    def __init__(self, data: bytes, bandwidth: float | None = None) -> None:
+        self.data = data
+        self.bandwidth = bandwidth
+
+    def makefile(self, *args, **kwargs) -> io.BytesIO:
+        if self.bandwidth:
+            return _ThrottledStream(self.data, self.bandwidth)
+        return io.BytesIO(self.data)
+
+
+class _ThrottledStream(io.BytesIO):
+    """A body that takes as long to read as it would at `bandwidth` bytes/s."""
+
+    def __init__(self, data: bytes, bandwidth: float) -> None:
+        super().__init__(data)
+        self.bandwidth = bandwidth
+
+    def read(self, size: int | None = -1) -> bytes:
+        data = super().read(size)
+        time.sleep(len(data) / self.bandwidth)
+        return data
+
+    def readinto(self, buffer) -> int:
+        size = super().readinto(buffer)
+        time.sleep(size / self.bandwidth)
+        return size
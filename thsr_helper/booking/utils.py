@@ -1,14 +1,41 @@
+from typing import Callable, Iterable, List, TextIO, Tuple
+import csv
 import io
+import json
+import logging
+import sys
 
-from PIL import Image
 from rich.console import Console
 from rich.table import Table
 import typer
 
+from .metrics import timed
 from .schema import Record
 
+logger = logging.getLogger(__name__)
+
+_captcha_solver: Callable[[bytes], str] | None = None
+
+
+def use_captcha_solver(solver: Callable[[bytes], str] | None) -> None:
+    """Set what solves every captcha; None (the default) asks the model or user."""
+    global _captcha_solver
+    _captcha_solver = solver
+
+
+def get_captcha_solver() -> Callable[[bytes], str] | None:
+    return _captcha_solver
+
 
 def fill_code(img_resp: bytes, manual: bool = True) -> str:
+    if _captcha_solver:
+        return _captcha_solver(img_resp)
+
+    # PIL and the numpy solver are only needed once a captcha comes in.
+    from PIL import Image
+
+    from .captcha import solve_captcha
+
     if manual:
         typer.secho(
             "Please enter the verification code: ", fg=typer.colors.BRIGHT_YELLOW
@@ -17,29 +44,40 @@ def fill_code(img_resp: bytes, manual: bool = True) -> str:
             image.show()
             return input()
     else:
-        # Implement image recognition here by yourself
-        return ""
+        with timed("captcha.solve") as timer:
+            result = solve_captcha(img_resp)
+            timer.set("confidence", round(float(result.confidence), 3))
+        logger.info(f"Captcha: {result.code} (confidence {result.confidence:.2f})")
+        return result.code
 
 
-def show_ticket(record: Record) -> None:
-    console = Console()
-    typer.secho(f"繳費期限: {record.payment_deadline}", fg=typer.colors.BRIGHT_CYAN)
-    typer.secho(f"訂票身分證: {record.personal_id}", fg=typer.colors.BRIGHT_CYAN)
-    typer.secho(f"票數: {record.ticket_num_info}", fg=typer.colors.BRIGHT_CYAN)
-    typer.secho(f"總價: {record.price}", fg=typer.colors.BRIGHT_CYAN)
+# (header, style) of the ticket columns; the history adds the rest of a record.
+TICKET_COLUMNS = (
+    ("日期", "light_yellow3"),
+    ("訂位代號", "dark_red"),
+    ("起程站", ""),
+    ("到達站", ""),
+    ("出發時間", ""),
+    ("到達時間", ""),
+    ("車次", ""),
+)
+HISTORY_COLUMNS = TICKET_COLUMNS + (
+    ("票數", "bright_cyan"),
+    ("總價", "bright_cyan"),
+    ("繳費期限", "bright_cyan"),
+    ("訂票身分證", "bright_cyan"),
+)
+
+
+def ticket_table(columns: Tuple[Tuple[str, str], ...]) -> Table:
     table = Table(show_header=True, header_style="bold dark_magenta")
-    cols = [
-        {"field": "日期", "style": "light_yellow3"},
-        {"field": "訂位代號", "style": "dark_red"},
-        {"field": "起程站", "style": ""},
-        {"field": "到達站", "style": ""},
-        {"field": "出發時間", "style": ""},
-        {"field": "到達時間", "style": ""},
-        {"field": "車次", "style": ""},
-    ]
-    for col in cols:
-        table.add_column(col.get("field"), style=col.get("style"), justify="right")
-    table.add_row(
+    for field, style in columns:
+        table.add_column(field, style=style, justify="right")
+    return table
+
+
+def ticket_row(record: Record) -> List[str]:
+    return [
         record.date,
         record.id,
         record.start_station,
@@ -47,5 +85,41 @@ def show_ticket(record: Record) -> None:
         record.depart_time,
         record.arrival_time,
         record.train_id,
-    )
+    ]
+
+
+def show_ticket(record: Record) -> None:
+    console = Console()
+    typer.secho(f"繳費期限: {record.payment_deadline}", fg=typer.colors.BRIGHT_CYAN)
+    typer.secho(f"訂票身分證: {record.personal_id}", fg=typer.colors.BRIGHT_CYAN)
+    typer.secho(f"票數: {record.ticket_num_info}", fg=typer.colors.BRIGHT_CYAN)
+    typer.secho(f"總價: {record.price}", fg=typer.colors.BRIGHT_CYAN)
+    table = ticket_table(TICKET_COLUMNS)
+    table.add_row(*ticket_row(record))
     console.print(table)
+
+
+def show_tickets(records: Iterable[Record]) -> None:
+    """Render records in one table, adding the rows as the history is read."""
+    table = ticket_table(HISTORY_COLUMNS)
+    for record in records:
+        table.add_row(
+            *ticket_row(record),
+            record.ticket_num_info,
+            record.price,
+            record.payment_deadline,
+            record.personal_id,
+        )
+    Console().print(table)
+
+
+def write_jsonl(records: Iterable[Record], stream: TextIO = None) -> None:
+    stream = stream or sys.stdout
+    for record in records:
+        stream.write(json.dumps(record._asdict(), ensure_ascii=False) + "\n")
+
+
+def write_csv(records: Iterable[Record], stream: TextIO = None) -> None:
+    writer = csv.writer(stream or sys.stdout)
+    writer.writerow(Record._fields)
+    writer.writerows(records)
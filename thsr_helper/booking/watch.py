@@ -0,0 +1,135 @@
+from datetime import datetime
+from typing import Callable, Iterable, List
+import hashlib
+import logging
+import random
+import time
+
+import typer
+
+from .booking_flow import BookingFlow
+from .constants import (
+    QUIET_HOURS,
+    QUIET_HOURS_FACTOR,
+    SOLD_OUT_KEY,
+    TIMEZONE,
+)
+from .schema import Record, SlotResult, Train
+from .snapshot import ConfigReloader
+
+logger = logging.getLogger(__name__)
+
+
+def train_fingerprint(trains: Iterable[Train]) -> str:
+    """Hash of the listed trains, regardless of the session's form values."""
+    listed = sorted(
+        f"{train.id}|{train.depart}|{train.arrive}|{train.discount_str}"
+        for train in trains
+    )
+    return hashlib.sha1("\n".join(listed).encode("utf-8")).hexdigest()
+
+
+def is_sold_out(result: SlotResult) -> bool:
+    return any(SOLD_OUT_KEY in error.msg for error in result.page.errors)
+
+
+class Watcher:
+    """
+    Poll the train list for seats freed by cancellations and book as soon as
+    a train worth booking shows up.
+
+    A poll stops at the S1 search, and the trains it lists are hashed; the
+    selection only runs when the hash changes, or when a booking from the
+    last list fell through. The interval halves after a change and grows by
+    half after each unchanged poll, between the bounds, and is longer during
+    the quiet hours of the night. Changes to the config file apply from the
+    next poll.
+    """
+
+    def __init__(
+        self,
+        reloader: ConfigReloader,
+        min_interval: float = 5,
+        max_interval: float = 120,
+        until: float | None = None,
+        clock: Callable[[], float] = time.time,
+        sleep: Callable[[float], None] = time.sleep,
+    ) -> None:
+        self.reloader = reloader
+        self.min_interval = min_interval
+        self.max_interval = max_interval
+        self.until = until
+        self.clock = clock
+        self.sleep = sleep
+        self.interval = min_interval
+        self.fingerprint: str | None = None
+        self.polls = 0
+        self.changes = 0
+
+    def run(self) -> Record | None:
+        while self.until is None or self.clock() < self.until:
+            flow = BookingFlow(self.reloader.get())
+            self.polls += 1
+            try:
+                record = self.check(flow, flow.search())
+            except Exception as e:
+                logger.warning(f"[gray37]Poll failed: {e}[/]", extra={"markup": True})
+                self.wait(changed=False)
+                continue
+
+            if record:
+                return record
+        typer.secho(
+            f"Stop watching after {self.polls} polls, {self.changes} changes",
+            fg=typer.colors.BRIGHT_YELLOW,
+        )
+        return None
+
+    def check(self, flow: BookingFlow, results: List[SlotResult]) -> Record | None:
+        """Book through the polled sessions if the train list has changed."""
+        # A sold-out search is a valid, empty list; other errors (a wrong
+        # captcha, a busy site) say nothing about the trains.
+        if failed := [
+            result
+            for result in results
+            if result.page.errors and not is_sold_out(result)
+        ]:
+            flow.errors = [error for result in failed for error in result.page.errors]
+            flow.show_error()
+            self.wait(changed=False)
+            return None
+
+        fingerprint = train_fingerprint(
+            train for result in results for train in result.trains
+        )
+        changed = fingerprint != self.fingerprint
+        if changed:
+            self.changes += 1
+            trains = len({train.id for result in results for train in result.trains})
+            typer.secho(
+                f"[{self.polls}] Train list changed: {trains} trains",
+                fg=typer.colors.BRIGHT_CYAN,
+            )
+            result, ranked = flow.choose(results)
+            if ranked and flow.confirm(result, ranked):
+                return flow.record
+            # The list is only taken as seen when nothing in it is worth
+            # booking; after a failed booking the next poll tries it again.
+            self.fingerprint = None if ranked else fingerprint
+        self.wait(changed)
+        return None
+
+    def wait(self, changed: bool) -> None:
+        if changed:
+            self.interval = max(self.interval / 2, self.min_interval)
+        else:
+            self.interval = min(self.interval * 1.5, self.max_interval)
+        interval = self.interval
+        if datetime.fromtimestamp(self.clock(), TIMEZONE).hour in QUIET_HOURS:
+            interval *= QUIET_HOURS_FACTOR
+        # Jitter keeps several watchers from polling in step.
+        interval *= random.uniform(0.9, 1.1)
+        logger.info(f"Poll {self.polls}: next in {interval:.1f}s")
+        if self.until is not None:
+            interval = min(interval, max(self.until - self.clock(), 0))
+        self.sleep(interval)
@@ -1,11 +1,42 @@
 import sys
 import importlib
 
+import click
 import typer
-from typing import Optional
+from typer.core import TyperGroup
+from typing import List, Optional
 from thsr_helper import __app_name__, __version__
 
-app = typer.Typer(help="A CLI for thsr-helper")
+# Subcommand modules of thsr_helper.cli and their help.
+COMMANDS: dict[str, str] = {
+    "config": "Check or update config file",
+    "booking": "Booking or check the ticket",
+}
+
+
+class LazyGroup(TyperGroup):
+    """
+    Import a subcommand module only when that subcommand is looked up, so
+    `--version` or `config ls` don't pay for the booking modules.
+    """
+
+    def list_commands(self, ctx: click.Context) -> List[str]:
+        return [
+            *self.commands,
+            *(name for name in COMMANDS if name not in self.commands),
+        ]
+
+    def get_command(self, ctx: click.Context, name: str) -> click.Command | None:
+        if name in COMMANDS and name not in self.commands:
+            module = importlib.import_module(f"thsr_helper.cli.{name}")
+            group = typer.main.get_group(module.app)
+            group.name = name
+            group.help = COMMANDS[name]
+            self.add_command(group, name)
+        return super().get_command(ctx, name)
+
+
+app = typer.Typer(help="A CLI for thsr-helper", cls=LazyGroup)
 
 
 def _version_callback(value: bool) -> None:
@@ -28,23 +59,9 @@ def handle_callback(
     return
 
 
-def register_commands(app: typer.Typer):
-    """
-    GO
-    """
-    modules: dict[str, str] = {
-        "config": "Check or update config file",
-        "booking": "Booking or check the ticket",
-    }
-    for file_name, description in modules.items():
-        module = importlib.import_module(f"thsr_helper.cli.{file_name}")
-        app.add_typer(module.app, name=file_name, help=description)
-
-
 def main():
     """
     Main entry point for the CLI application.
     """
-    register_commands(app)
     app(prog_name="thsr_helper")
     sys.exit()
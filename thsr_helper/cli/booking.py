@@ -1,13 +1,26 @@
 import time
 from datetime import datetime, timedelta
+from typing import TYPE_CHECKING
 import logging
 
 import typer
 
-from thsr_helper.booking.booking_flow import BookingFlow
-from thsr_helper.booking.models import TinyDBManager
+from thsr_helper.booking.constants import (
+    QUIET_HOURS_FACTOR,
+    STATION_NAME_MAP,
+    TIMEZONE,
+    MetricsFormat,
+    OutputFormat,
+    Stations,
+    TraceFormat,
+)
 from thsr_helper.config.utils import ConfigManager
 
+# The booking modules pull in requests, bs4, pydantic, numpy and PIL, so the
+# commands import them when they run rather than when the CLI starts.
+if TYPE_CHECKING:
+    from thsr_helper.booking.session_pool import SessionPool
+
 logger = logging.getLogger(__name__)
 
 app = typer.Typer()
@@ -23,6 +36,17 @@ def ls(
     end_date: datetime = typer.Option(
         datetime.now(), formats=["%Y-%m-%d"], help="End date"
     ),
+    ticket_id: str = typer.Option(None, "--id", help="Ticket ID (訂位代號)"),
+    station: Stations = typer.Option(
+        None, case_sensitive=False, help="Start or destination station"
+    ),
+    train_id: str = typer.Option(None, "--train", help="Train number"),
+    output_format: OutputFormat = typer.Option(
+        OutputFormat.TABLE,
+        "--format",
+        case_sensitive=False,
+        help="Print a table, or write JSON lines or CSV to stdout",
+    ),
 ):
     """
     Check the booking history
@@ -34,24 +58,172 @@ def ls(
     query_params = {
         "start_ts": int(start_ts),
         "end_ts": int(end_ts),
+        "ticket_id": ticket_id,
+        "station": STATION_NAME_MAP.get(station),
+        "train_id": train_id,
     }
-    db = TinyDBManager()
-    db.get_history(query_params)
+    from thsr_helper.booking.models import get_history_manager
+
+    db = get_history_manager()
+    db.get_history(query_params, output_format)
 
 
 @app.command(name="order")
 def order(
+    ctx: typer.Context,
     execution_times: int = typer.Option(
         1, help="How many times to execute ordering ticket."
     ),
+    concurrency: int = typer.Option(
+        1, min=1, help="How many booking sessions to run at once."
+    ),
+    pool_size: int = typer.Option(
+        0,
+        min=0,
+        help="How many sessions to keep ready with the captcha already solved.",
+    ),
+    at: datetime = typer.Option(
+        None,
+        formats=["%Y-%m-%d %H:%M:%S", "%Y-%m-%dT%H:%M:%S"],
+        help="Fire the booking at this time (Asia/Taipei).",
+    ),
+    at_window: bool = typer.Option(
+        False, help="Fire the booking when the window for the config date opens."
+    ),
+    burst: float = typer.Option(
+        0.5, min=0, help="Seconds to spread the fired sessions over."
+    ),
+    workers: int = typer.Option(
+        4, min=1, help="How many jobs of a batch config to run at once."
+    ),
+    record: str = typer.Option(
+        None, help="Record every request and response to this cassette file."
+    ),
+    replay: str = typer.Option(
+        None, help="Replay responses from this cassette file instead of the site."
+    ),
+    replay_latency: float = typer.Option(
+        0.0, min=0, help="Seconds to wait before each replayed response."
+    ),
+    replay_jitter: float = typer.Option(
+        0.0, min=0, help="Random +/- seconds added to the replay latency."
+    ),
+    replay_bandwidth: float = typer.Option(
+        None, min=1, help="KB per second to read the replayed responses at."
+    ),
+    rate_limit: bool = typer.Option(
+        True, help="Pace the requests of all sessions and back off when throttled."
+    ),
+    metrics: str = typer.Option(
+        None, help="Export per-stage latency and outcome metrics to this file."
+    ),
+    metrics_format: MetricsFormat = typer.Option(
+        MetricsFormat.PROMETHEUS, case_sensitive=False
+    ),
+    metrics_interval: float = typer.Option(
+        60, min=1, help="Seconds between two exports of the metrics file."
+    ),
+    trace: str = typer.Option(
+        None, help="Export a trace of every booking attempt to this file."
+    ),
+    trace_format: TraceFormat = typer.Option(TraceFormat.CHROME, case_sensitive=False),
+    trace_sample_rate: float = typer.Option(
+        1.0, min=0, max=1, help="Share of the booking attempts to trace."
+    ),
 ):
     """
     Booking the ticket
     """
-    if config := ConfigManager().get_config():
+    import asyncio
+
+    from thsr_helper.booking.async_booking_flow import BookingCoordinator
+    from thsr_helper.booking.batch import BatchRunner, load_jobs, show_job_results
+    from thsr_helper.booking.booking_flow import BookingFlow
+    from thsr_helper.booking.metrics import export_metrics
+    from thsr_helper.booking.rate_limit import use_rate_limiter
+    from thsr_helper.booking.snapshot import ConfigReloader
+    from thsr_helper.booking.sniper import Sniper, booking_window_opens
+    from thsr_helper.booking.tracing import export_traces
+    from thsr_helper.booking.transport import (
+        Cassette,
+        RecordingAdapter,
+        ReplayAdapter,
+        ReplayedCaptchas,
+        use_transport,
+    )
+    from thsr_helper.booking.utils import use_captcha_solver
+
+    if not (config := ConfigManager().get_config()):
+        logger.warning(
+            "[red] Failed to get the config file. Creating the default one. "
+            "Remember to update the configuration. [/]",
+            extra={"markup": True},
+        )
+        return
+
+    if record and replay:
+        raise typer.BadParameter("Use either --record or --replay, not both.")
+    if record:
+        use_transport(RecordingAdapter(Cassette(record)))
+    elif replay:
+        cassette = Cassette.load(replay)
+        use_transport(
+            ReplayAdapter(
+                cassette,
+                replay_latency,
+                replay_jitter,
+                replay_bandwidth * 1024 if replay_bandwidth else None,
+            )
+        )
+        # A replay is offline all the way: the captchas get the codes sent
+        # when the cassette was recorded.
+        use_captcha_solver(ReplayedCaptchas(cassette.captcha_codes()))
+    # Replayed attempts don't need to be spaced out.
+    retry_interval = 0 if replay else 1
+    if replay or not rate_limit:
+        use_rate_limiter(None)
+
+    ctx.with_resource(export_metrics(metrics, metrics_format, metrics_interval))
+    ctx.with_resource(export_traces(trace, trace_format, trace_sample_rate))
+    if config.get("jobs") or config.get("jobs_file"):
+        if at or at_window:
+            raise typer.BadParameter("--at and --at-window don't apply to batch jobs.")
+        jobs = load_jobs(config, execution_times)
+        if not replay and not all(job.config.conditions.is_manual for job in jobs):
+            require_captcha_model()
+        show_job_results(BatchRunner(jobs, workers, retry_interval).run())
+        return
+
+    if not replay and not config.get("conditions", {}).get("is_manual", True):
+        require_captcha_model()
+
+    if at or at_window:
+        fire_at = (
+            TIMEZONE.localize(at)
+            if at
+            else booking_window_opens(config["conditions"]["date"])
+        )
+        sniper = Sniper(config, fire_at, sessions=concurrency, burst=burst)
+        if sniper.run():
+            logger.info("Get ticket!")
+        return
+
+    pool = create_session_pool(config, pool_size)
+    try:
+        if concurrency > 1:
+            coordinator = BookingCoordinator(
+                config, concurrency, execution_times, pool, retry_interval
+            )
+            if asyncio.run(coordinator.run()):
+                logger.info("Get ticket!")
+            return
+
+        # Edits to the config file apply from the next attempt on.
+        reloader = ConfigReloader()
         for _ in range(execution_times):
             try:
-                flow = BookingFlow(config)
+                session = pool.acquire() if pool else None
+                flow = BookingFlow(reloader.get(), session=session)
                 get_ticket: bool = flow.run()
                 if get_ticket:
                     logger.info("Get ticket!")
@@ -59,10 +231,94 @@ def order(
             except Exception as e:
                 logger.warning(e)
             finally:
-                time.sleep(1)
-    else:
+                time.sleep(retry_interval)
+    finally:
+        if pool:
+            pool.close()
+
+
+@app.command(name="watch")
+def watch(
+    ctx: typer.Context,
+    min_interval: float = typer.Option(
+        5, min=1, help="Shortest seconds between two polls."
+    ),
+    max_interval: float = typer.Option(
+        120,
+        min=1,
+        help=f"Longest seconds between two polls, {QUIET_HOURS_FACTOR}x at night.",
+    ),
+    until: datetime = typer.Option(
+        None,
+        formats=["%Y-%m-%d %H:%M:%S", "%Y-%m-%dT%H:%M:%S"],
+        help="Stop watching at this time (Asia/Taipei).",
+    ),
+    metrics: str = typer.Option(
+        None, help="Export per-stage latency and outcome metrics to this file."
+    ),
+    metrics_format: MetricsFormat = typer.Option(
+        MetricsFormat.PROMETHEUS, case_sensitive=False
+    ),
+    metrics_interval: float = typer.Option(
+        60, min=1, help="Seconds between two exports of the metrics file."
+    ),
+):
+    """
+    Watch the train list for cancellations and book a matching train
+    """
+    from thsr_helper.booking.metrics import export_metrics
+    from thsr_helper.booking.snapshot import ConfigReloader
+    from thsr_helper.booking.watch import Watcher
+
+    reloader = ConfigReloader()
+    if not (snapshot := reloader.get()):
+        return
+    if snapshot.conditions.is_manual:
+        raise typer.BadParameter("Watching needs is_manual = false in the config.")
+    require_captcha_model()
+    if min_interval > max_interval:
+        raise typer.BadParameter("--min-interval is longer than --max-interval.")
+
+    watcher = Watcher(
+        reloader,
+        min_interval,
+        max_interval,
+        until=TIMEZONE.localize(until).timestamp() if until else None,
+    )
+    ctx.with_resource(export_metrics(metrics, metrics_format, metrics_interval))
+    try:
+        if watcher.run():
+            logger.info("Get ticket!")
+    except KeyboardInterrupt:
+        typer.secho(
+            f"Stop watching after {watcher.polls} polls, {watcher.changes} changes",
+            fg=typer.colors.BRIGHT_YELLOW,
+        )
+
+
+def require_captcha_model() -> None:
+    """Stop before the first request when the captchas can't be solved."""
+    from thsr_helper.booking.captcha import get_captcha_model
+
+    try:
+        get_captcha_model()
+    except FileNotFoundError as e:
+        raise typer.BadParameter(str(e))
+
+
+def create_session_pool(config: dict[str, any], size: int) -> "SessionPool | None":
+    from thsr_helper.booking.session_pool import SessionPool
+    from thsr_helper.config.settings import ConditionSettings
+
+    if not size:
+        return None
+    conditions = ConditionSettings(**config.get("conditions"))
+    if conditions.is_manual:
         logger.warning(
-            "[red] Failed to get the config file. Creating the default one. "
-            "Remember to update the configuration. [/]",
+            "[gray37]The session pool needs is_manual = false, ignore it[/]",
             extra={"markup": True},
         )
+        return None
+    pool = SessionPool(conditions, size)
+    pool.start()
+    return pool
@@ -2,11 +2,17 @@ from collections import defaultdict
 from datetime import datetime
 from typing import Tuple
 import logging
+import os
 
 import typer
 from tomlkit import dumps
 
-from thsr_helper.booking.constants import ThsrTime, Stations, TrainRequirement
+from thsr_helper.booking.constants import (
+    ImportFormat,
+    ThsrTime,
+    Stations,
+    TrainRequirement,
+)
 from thsr_helper.config.utils import ConfigManager
 from thsr_helper.config.validate import (
     validate_personal_id,
@@ -124,3 +130,50 @@ def update(
                 options[table_name][attr_name] = attr_val
 
     ConfigManager().update_config(options)
+
+
+@app.command(name="import")
+def import_file(
+    file: str = typer.Argument(..., help="CSV or JSONL file of jobs, one a row"),
+    output: str = typer.Option(
+        "jobs.jsonl", help="Job store to write, relative like the config file"
+    ),
+    input_format: ImportFormat = typer.Option(
+        None,
+        "--format",
+        case_sensitive=False,
+        help="Format of the file, by default from its extension",
+    ),
+):
+    """
+    Import batch jobs from a CSV or JSONL file into a job store
+    """
+    from thsr_helper.config.importer import import_jobs, job_store_path
+
+    if input_format is None:
+        extension = os.path.splitext(file)[1].lower()
+        input_format = ImportFormat.CSV if extension == ".csv" else ImportFormat.JSONL
+    config = ConfigManager.get_config() or {}
+    store = job_store_path(output)
+
+    def report(error):
+        typer.secho(
+            f"Line {error.line}: {error.message}", fg=typer.colors.RED, err=True
+        )
+
+    try:
+        summary = import_jobs(file, store, input_format, config, report)
+    except FileNotFoundError as e:
+        raise typer.BadParameter(str(e), param_hint="FILE")
+    if summary.errors:
+        typer.secho(
+            f"{summary.errors} of {summary.rows} rows are invalid, {store} is unchanged",
+            fg=typer.colors.BRIGHT_RED,
+        )
+        raise typer.Exit(code=1)
+    typer.secho(f"Import {summary.jobs} jobs to {store}", fg=typer.colors.BRIGHT_BLUE)
+    if config.get("jobs_file") != output:
+        typer.secho(
+            f'Set jobs_file = "{output}" in the config to book them',
+            fg=typer.colors.BRIGHT_YELLOW,
+        )
@@ -0,0 +1,235 @@
+from typing import Callable, Dict, Iterable, Iterator, TextIO, Tuple
+import csv
+import json
+import os
+
+from typer import BadParameter
+
+from thsr_helper.booking.constants import MODULE_DIR, ImportFormat, TrainRequirement
+from thsr_helper.booking.schema import ImportSummary, RowError
+from .validate import (
+    parse_time_range,
+    validate_date,
+    validate_email,
+    validate_ids,
+    validate_personal_id,
+    validate_phone_number,
+    validate_station,
+    validate_thsr_time,
+)
+
+TRUE_VALUES = ("1", "true", "yes")
+FALSE_VALUES = ("0", "false", "no")
+
+
+def to_text(validate: Callable[[str], str]) -> Callable[[any], str]:
+    return lambda value: validate(str(value).strip())
+
+
+def to_int(value: any) -> int:
+    try:
+        return int(value)
+    except (TypeError, ValueError):
+        raise BadParameter(f"Not a number: {value}")
+
+
+def to_count(value: any) -> int:
+    if (count := to_int(value)) < 0:
+        raise BadParameter(f"Must not be negative: {value}")
+    return count
+
+
+def to_times(value: any) -> int:
+    if (times := to_int(value)) < 1:
+        raise BadParameter(f"Must be at least 1: {value}")
+    return times
+
+
+def to_bool(value: any) -> bool:
+    if isinstance(value, bool):
+        return value
+    if (text := str(value).strip().lower()) in TRUE_VALUES:
+        return True
+    if text in FALSE_VALUES:
+        return False
+    raise BadParameter(f"Not a boolean: {value}")
+
+
+def to_time_range(value: any) -> list[int]:
+    # "6-12" in a CSV cell, [6, 12] in JSON.
+    if isinstance(value, list):
+        value = "-".join(map(str, value))
+    return list(parse_time_range(str(value).strip()))
+
+
+def to_train_requirement(value: any) -> str:
+    try:
+        return TrainRequirement(str(value).strip()).value
+    except ValueError:
+        raise BadParameter(f"Unknown train requirement: {value}")
+
+
+# Column -> config section of the job (None for the job itself) and the
+# validator that converts the cell.
+FIELDS: Dict[str, Tuple[str | None, Callable[[any], any]]] = {
+    "name": (None, to_text(str)),
+    "priority": (None, to_int),
+    "execution_times": (None, to_times),
+    "personal_id": ("user", to_text(validate_personal_id)),
+    "phone_number": ("user", to_text(validate_phone_number)),
+    "email": ("user", to_text(validate_email)),
+    "start_station": ("conditions", to_text(validate_station)),
+    "dest_station": ("conditions", to_text(validate_station)),
+    "date": ("conditions", to_text(validate_date)),
+    "thsr_time": ("conditions", to_text(validate_thsr_time)),
+    "time_range": ("conditions", to_time_range),
+    "train_requirement": ("conditions", to_train_requirement),
+    "adult_ticket_num": ("conditions", to_count),
+    "adult_ids": ("conditions", to_text(validate_ids)),
+    "child_ticket_num": ("conditions", to_count),
+    "disabled_ticket_num": ("conditions", to_count),
+    "disabled_ids": ("conditions", to_text(validate_ids)),
+    "elder_ticket_num": ("conditions", to_count),
+    "elder_ids": ("conditions", to_text(validate_ids)),
+    "college_ticket_num": ("conditions", to_count),
+    "is_manual": ("conditions", to_bool),
+}
+
+# What a booking can't do without, from the row or the config defaults.
+REQUIRED = (
+    ("user", "personal_id"),
+    ("user", "phone_number"),
+    ("conditions", "start_station"),
+    ("conditions", "dest_station"),
+    ("conditions", "date"),
+    ("conditions", "thsr_time"),
+)
+
+Row = Iterable[Tuple[str, any]]
+
+
+def csv_rows(fp: TextIO) -> Iterator[Tuple[int, Row | RowError]]:
+    """The cells of each row by column, with the line the row starts on."""
+    reader = csv.reader(fp)
+    header = [column.strip() for column in next(reader, [])]
+    if unknown := [column for column in header if column not in FIELDS]:
+        raise BadParameter(f"Unknown columns: {', '.join(unknown)}")
+    line = reader.line_num
+    for values in reader:
+        # A quoted cell can span lines, so a row ends on the reader's line.
+        start, line = line + 1, reader.line_num
+        if not values:
+            continue
+        if len(values) != len(header):
+            yield (
+                start,
+                RowError(start, f"Expected {len(header)} columns, got {len(values)}"),
+            )
+            continue
+        yield start, zip(header, values)
+
+
+def jsonl_rows(fp: TextIO) -> Iterator[Tuple[int, Row | RowError]]:
+    """The fields of each JSON object, one a line."""
+    for line, text in enumerate(fp, 1):
+        if not text.strip():
+            continue
+        try:
+            row = json.loads(text)
+        except json.JSONDecodeError as e:
+            yield line, RowError(line, f"Invalid JSON: {e.msg}")
+            continue
+        if not isinstance(row, dict):
+            yield line, RowError(line, "Not a JSON object")
+            continue
+        if unknown := [key for key in row if key not in FIELDS]:
+            yield line, RowError(line, f"Unknown fields: {', '.join(unknown)}")
+            continue
+        yield line, row.items()
+
+
+def to_job(row: Row, defaults: dict[str, any]) -> dict[str, any]:
+    """
+    The `[[jobs]]` entry of a row, with the empty cells left out so the
+    config defaults apply. Every invalid cell of the row is reported at once.
+    """
+    job: dict[str, any] = {}
+    errors = []
+    for column, value in row:
+        if value is None or value == "":
+            continue
+        section, convert = FIELDS[column]
+        try:
+            value = convert(value)
+        except BadParameter as e:
+            errors.append(f"{column}: {e.message}")
+            continue
+        if section:
+            job.setdefault(section, {})[column] = value
+        else:
+            job[column] = value
+    for section, key in REQUIRED:
+        if key not in job.get(section, {}) and not defaults.get(section, {}).get(key):
+            errors.append(f"{key}: missing")
+    conditions = {**defaults.get("conditions", {}), **job.get("conditions", {})}
+    start_station = conditions.get("start_station")
+    if start_station and start_station == conditions.get("dest_station"):
+        errors.append("dest_station: same as start_station")
+    if errors:
+        raise BadParameter("; ".join(errors))
+    return job
+
+
+def job_store_path(file_name: str) -> str:
+    """A job store path of the config, relative to the module like the config."""
+    return os.path.join(MODULE_DIR, file_name)
+
+
+def import_jobs(
+    source: str,
+    store: str,
+    input_format: ImportFormat,
+    defaults: dict[str, any],
+    report: Callable[[RowError], None],
+) -> ImportSummary:
+    """
+    Validate the rows of `source` one at a time and write the valid ones to
+    the job store, a compact JSON object a line. Each bad row is reported as
+    it is read; if there are any, the store is left as it was.
+    """
+    read_rows = csv_rows if input_format == ImportFormat.CSV else jsonl_rows
+    rows = jobs = errors = 0
+    tmp_path = f"{store}.tmp"
+    try:
+        with (
+            open(source, mode="rt", encoding="utf-8-sig", newline="") as src,
+            open(tmp_path, mode="wt", encoding="utf-8") as out,
+        ):
+            for line, row in read_rows(src):
+                rows += 1
+                if isinstance(row, RowError):
+                    errors += 1
+                    report(row)
+                    continue
+                try:
+                    job = to_job(row, defaults)
+                except BadParameter as e:
+                    errors += 1
+                    report(RowError(line, e.message))
+                    continue
+                out.write(json.dumps(job, ensure_ascii=False, separators=(",", ":")))
+                out.write("\n")
+                jobs += 1
+        if not errors:
+            os.replace(tmp_path, store)
+    finally:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+    return ImportSummary(rows, jobs, errors)
+
+
+def read_job_store(path: str) -> Iterator[dict[str, any]]:
+    with open(path, mode="rt", encoding="utf-8") as fp:
+        for line in fp:
+            if line.strip():
+                yield json.loads(line)
@@ -1,15 +1,37 @@
-from pydantic import BaseModel
+from pydantic import BaseModel, ConfigDict
 from typing import List
 from typing import Optional
 
 
 class UserSettings(BaseModel):
+    model_config = ConfigDict(frozen=True)
+
     personal_id: str = ""
     phone_number: Optional[str] = None
     email: Optional[str] = None
 
 
+class TrainSelection(BaseModel):
+    """
+    How to rank the trains listed by the search. Each weight is a cost per
+    minute of departure, arrival or travel time; `discount_weight` is the
+    minutes a 10% discount is worth. `depart_after` and `arrive_by` ("HH:MM")
+    leave out the trains outside them.
+    """
+
+    model_config = ConfigDict(frozen=True)
+
+    depart_weight: float = 1.0
+    arrival_weight: float = 0.0
+    duration_weight: float = 0.0
+    discount_weight: float = 0.0
+    depart_after: str = ""
+    arrive_by: str = ""
+
+
 class ConditionSettings(BaseModel):
+    model_config = ConfigDict(frozen=True)
+
     adult_ticket_num: Optional[int] = None
     adult_ids: Optional[str] = None
     child_ticket_num: Optional[int] = None
@@ -25,3 +47,4 @@ class ConditionSettings(BaseModel):
     start_station: str = ""
     dest_station: str = ""
     is_manual: bool = True
+    selection: TrainSelection = TrainSelection()
@@ -1,6 +1,8 @@
+import hashlib
 import logging
 import os
-from typing import Optional
+import threading
+from typing import Optional, Tuple
 
 import typer
 import tomli
@@ -13,6 +15,10 @@ logger = logging.getLogger(__name__)
 
 
 class ConfigManager:
+    # Path, mtime and hash of the file last read, and the config read from it.
+    _cache: Tuple[str, int, str, dict[str, any]] | None = None
+    _cache_lock = threading.Lock()
+
     @classmethod
     def _get_config_path(cls):
         return os.path.join(MODULE_DIR, settings.config_file_path)
@@ -55,10 +61,26 @@ class ConfigManager:
 
     @classmethod
     def get_config(cls) -> Optional[dict[str, any]]:
+        """
+        The parsed config file. The file is only read again once its mtime
+        has changed, and only parsed again if its content has; until then
+        the same dict is returned, which callers must not modify.
+        """
         config_file_path = cls._get_config_path()
         try:
-            with open(config_file_path, mode="rb") as fp:
-                config = tomli.load(fp)
+            mtime = os.stat(config_file_path).st_mtime_ns
+            with cls._cache_lock:
+                cached = cls._cache
+                if cached and cached[:2] == (config_file_path, mtime):
+                    return cached[3]
+                with open(config_file_path, mode="rb") as fp:
+                    content = fp.read()
+                digest = hashlib.sha1(content).hexdigest()
+                if cached and cached[0] == config_file_path and cached[2] == digest:
+                    config = cached[3]
+                else:
+                    config = tomli.loads(content.decode("utf-8"))
+                cls._cache = (config_file_path, mtime, digest, config)
                 return config
         except FileNotFoundError as e:
             logger.warning(
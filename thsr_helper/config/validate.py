@@ -1,11 +1,24 @@
 import re
+from datetime import date, datetime
 from typing import Tuple
 from typer import BadParameter
 
+from thsr_helper.booking.constants import Stations, ThsrTime
+
+# Compiled once, as the bulk import runs them for every row.
+PERSONAL_ID_PATTERN = re.compile(r"^[a-zA-Z][0-9]{9}$")
+PHONE_NUMBER_PATTERN = re.compile(r"^09[0-9]{8}$")
+EMAIL_PATTERN = re.compile(r"^[\w\.-]+@[\w\.-]+\.\w+$")
+ID_PATTERN = re.compile(r"^[A-Za-z]\d{9}$")
+TIME_RANGE_PATTERN = re.compile(r"^(\d{1,2})\s*-\s*(\d{1,2})$")
+
+# Case-insensitive lookups of the names the config takes.
+STATION_NAMES = {station.value.lower(): station.value for station in Stations}
+THSR_TIMES = {thsr_time.value.upper(): thsr_time.value for thsr_time in ThsrTime}
+
 
 def validate_personal_id(value: str):
-    pattern = r"^[a-zA-Z][0-9]{9}$"
-    if value and not re.match(pattern, value):
+    if value and not PERSONAL_ID_PATTERN.match(value):
         raise BadParameter(
             "Personal ID must start with an English character and be exactly 10 characters long."
         )
@@ -13,8 +26,7 @@ def validate_personal_id(value: str):
 
 
 def validate_phone_number(value: str):
-    pattern = r"^09[0-9]{8}$"
-    if value and not re.match(pattern, value):
+    if value and not PHONE_NUMBER_PATTERN.match(value):
         raise BadParameter(
             "Phone number must begin with the digits '09' and be exactly 10 characters long."
         )
@@ -22,17 +34,15 @@ def validate_phone_number(value: str):
 
 
 def validate_email(value: str):
-    pattern = r"^[\w\.-]+@[\w\.-]+\.\w+$"
-    if value and not re.match(pattern, value):
+    if value and not EMAIL_PATTERN.match(value):
         raise BadParameter("Wrong email format.")
     return value
 
 
 def validate_ids(value: str):
-    pattern = r"^[A-Za-z]\d{9}$"
     if value:
         for id in value.split(","):
-            if not re.match(pattern, id):
+            if not ID_PATTERN.match(id):
                 raise BadParameter("Wrong id format.")
     return value
 
@@ -43,3 +53,48 @@ def validate_time_range(value: Tuple[int, int]):
         if not start_hour <= end_hour:
             raise BadParameter("End hour must be greater than or equal to start hour.")
     return value
+
+
+def validate_station(value: str) -> str:
+    if station := STATION_NAMES.get(value.lower()):
+        return station
+    raise BadParameter(f"Unknown station: {value}")
+
+
+def validate_thsr_time(value: str) -> str:
+    if thsr_time := THSR_TIMES.get(value.upper()):
+        return thsr_time
+    raise BadParameter(f"Unknown time: {value}")
+
+
+def parse_date(date_str: str) -> date | None:
+    """
+    The date of a config `date`, None for a format it doesn't take; raises
+    ValueError for a date that doesn't exist.
+    """
+    if matched := re.match(r"\d{8}", date_str):  # 20240101
+        return datetime.strptime(matched.string, "%Y%m%d").date()
+    if matched := re.match(r"\d{4}-[0]?\d+-[0]?\d+", date_str):  # 2024-1-1
+        return datetime.strptime(matched.string, "%Y-%m-%d").date()
+    if matched := re.match(r"\d{4}/[0]?\d+/[0]?\d+", date_str):  # 2024/10/1
+        return datetime.strptime(matched.string, "%Y/%m/%d").date()
+    return None
+
+
+def validate_date(value: str) -> str:
+    """A date in any format the config takes, as YYYY-MM-DD."""
+    try:
+        if parsed := parse_date(value):
+            return parsed.isoformat()
+    except ValueError:
+        pass
+    raise BadParameter(f"Wrong date, use YYYY-MM-DD, YYYY/MM/DD or YYYYMMDD: {value}")
+
+
+def parse_time_range(value: str) -> Tuple[int, int]:
+    """Start and end hour from "6-12"."""
+    if matched := TIME_RANGE_PATTERN.match(value):
+        start_hour, end_hour = map(int, matched.groups())
+        if start_hour <= end_hour <= 24:
+            return start_hour, end_hour
+    raise BadParameter(f"Time range must be two hours 0-24, start first: {value}")
@@ -5,7 +5,7 @@ import logging
 from rich.logging import RichHandler
 
 logging.basicConfig(
-    level="WARNING",
+    level=os.getenv("LOG_LEVEL", "WARNING").upper(),
     format="%(message)s",
     datefmt="[%X]",
     handlers=[RichHandler(rich_tracebacks=True, tracebacks_suppress=[click])],
@@ -18,6 +18,13 @@ class Settings:
 
     def load_from_env(self):
         self.config_file_path = os.getenv("CONFIG_FILE_PATH", "config.toml")
+        self.base_url = os.getenv("THSR_BASE_URL", "https://irs.thsrc.com.tw")
+        self.html_parser = os.getenv("HTML_PARSER", "html.parser")
+        self.stream_responses = os.getenv("STREAM_RESPONSES", "0") in ("1", "true")
+        self.captcha_model_path = os.getenv(
+            "CAPTCHA_MODEL_PATH", os.path.join(".model", "captcha.npz")
+        )
+        self.history_backend = os.getenv("HISTORY_BACKEND", "tinydb")
 
 
 settings = Settings()